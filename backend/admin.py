@@ -5,7 +5,7 @@ Provides administrative functionality for user management
 """
 
 from flask import Blueprint, request, jsonify
-from mongodb_client import get_database
+from mongodb_client import get_database, has_face_image, HAS_FACE_IMAGE_FILTER
 import gridfs
 from bson import ObjectId
 from datetime import datetime
@@ -34,7 +34,7 @@ def get_all_users():
         
         # Get all users from database
         users_collection = db.db.users
-        users_cursor = users_collection.find({})
+        users_cursor = users_collection.find({}, {"face_image_blob": 0})
         
         users_list = []
         for user in users_cursor:
@@ -46,6 +46,7 @@ def get_all_users():
                 'phone': user.get('phone', ''),
                 'created_at': user.get('created_at', '').isoformat() if user.get('created_at') else None,
                 'face_image_id': str(user.get('face_image_id', '')) if user.get('face_image_id') else None,
+                'face_image_inline': user.get('face_image_inline', False),
                 'fingerprint_template': bool(user.get('fingerprint_template')),  # Don't send actual template
                 'registration_complete': user.get('registration_complete', False),
                 'face_updated_at': user.get('face_updated_at', '').isoformat() if user.get('face_updated_at') else None,
@@ -85,7 +86,7 @@ def delete_user(username):
         users_collection = db.db.users
         
         # First, get user data to retrieve face image ID
-        user = users_collection.find_one({"name": username})
+        user = users_collection.find_one({"name": username}, {"face_image_blob": 0})
         
         if not user:
             return jsonify({
@@ -93,8 +94,8 @@ def delete_user(username):
                 'error': f'User "{username}" not found'
             }), 404
         
-        # Delete face image from GridFS if exists
-        if user.get('face_image_id'):
+        # Delete face image from GridFS if exists (inline images go with the user record)
+        if user.get('face_image_id') and not user.get('face_image_inline'):
             try:
                 db.fs.delete(user['face_image_id'])
                 print(f"✅ Deleted face image for user: {username}")
@@ -103,6 +104,7 @@ def delete_user(username):
         
         # Delete user record
         result = users_collection.delete_one({"name": username})
+        db.invalidate_user(username)
         
         if result.deleted_count > 0:
             print(f"✅ User deleted: {username}")
@@ -157,8 +159,9 @@ def get_user_details(username):
             'registration_complete': user.get('registration_complete', False),
             'biometric_data': {
                 'face_image': {
-                    'exists': bool(user.get('face_image_id')),
+                    'exists': has_face_image(user),
                     'image_id': str(user.get('face_image_id', '')) if user.get('face_image_id') else None,
+                    'inline': user.get('face_image_inline', False),
                     'updated_at': user.get('face_updated_at', '').isoformat() if user.get('face_updated_at') else None
                 },
                 'fingerprint': {
@@ -202,24 +205,25 @@ def get_admin_stats():
         total_users = users_collection.count_documents({})
         
         # Get complete registration count
-        complete_registrations = users_collection.count_documents({
-            'registration_complete': True,
-            'face_image_id': {'$ne': None},
-            'fingerprint_template': {'$ne': None}
-        })
+        complete_registrations = users_collection.count_documents(dict(
+            HAS_FACE_IMAGE_FILTER,
+            registration_complete=True,
+            fingerprint_template={'$ne': None}
+        ))
         
         # Get incomplete registrations
         incomplete_registrations = total_users - complete_registrations
         
         # Get users with only face data
-        face_only = users_collection.count_documents({
-            'face_image_id': {'$ne': None},
-            'fingerprint_template': None
-        })
+        face_only = users_collection.count_documents(dict(
+            HAS_FACE_IMAGE_FILTER,
+            fingerprint_template=None
+        ))
         
         # Get users with only fingerprint data
         fingerprint_only = users_collection.count_documents({
             'face_image_id': None,
+            'face_image_inline': {'$ne': True},
             'fingerprint_template': {'$ne': None}
         })
         
@@ -19,7 +19,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'face', 'match'))
 from face_match import DatabaseFaceMatcher
 
 # Import MongoDB client
-from mongodb_client import get_database
+from mongodb_client import get_database, has_face_image, HAS_FACE_IMAGE_FILTER
 
 # Import admin blueprint
 from admin import admin_bp
@@ -70,12 +70,10 @@ def register_user():
         # Get database connection
         db = get_database()
         
-        # Check if user already exists
-        if db.user_exists(user_name):
+        # Create user in MongoDB (one round-trip; refuses existing names)
+        user_id, created = db.create_user_if_absent(user_name, email, phone)
+        if created is False:
             return jsonify({"error": f"User '{user_name}' already exists"}), 409
-        
-        # Create user in MongoDB
-        user_id = db.create_user(user_name, email, phone)
         if not user_id:
             return jsonify({"error": "Failed to create user"}), 500
         
@@ -93,8 +91,8 @@ def register_user():
         try:
             email_service = get_email_service()
             if email and email_service.mailjet:
-                email_result = email_service.send_registration_email(user_name, email)
-                print(f"[INFO] Registration email sent to {email}: {email_result.get('message', 'Success')}")
+                email_service.send_in_background(email_service.send_registration_email, user_name, email)
+                print(f"[INFO] Registration email queued for {email}")
             else:
                 print(f"[INFO] Email service unavailable or no email provided for {user_name}")
         except Exception as e:
@@ -155,7 +153,7 @@ def capture_photo():
         photo_data = photo.read()
         
         # Save face image to MongoDB (will automatically create steganographic version if fingerprint key exists)
-        success = db.save_face_image(user_name, photo_data, "face_001.jpg")
+        success = db.save_face_image(user_name, photo_data, filename="face_001.jpg")
         
         if not success:
             return jsonify({"error": "Failed to save photo to database"}), 500
@@ -184,12 +182,13 @@ def capture_photo():
             if user_data and user_data.get('email'):
                 email_service = get_email_service()
                 if email_service.mailjet:
-                    email_result = email_service.send_enrollment_completion_email(
+                    email_service.send_in_background(
+                        email_service.send_enrollment_completion_email,
                         user_name, 
                         user_data['email'], 
                         enrollment_type="Face Recognition"
                     )
-                    print(f"[INFO] Face enrollment email sent to {user_data['email']}: {email_result.get('message', 'Success')}")
+                    print(f"[INFO] Face enrollment email queued for {user_data['email']}")
                 else:
                     print(f"[INFO] Email service unavailable for face enrollment notification")
             else:
@@ -251,7 +250,7 @@ def capture_fingerprint():
             db = get_database()
             user_data = db.get_user_info(user_name)
             
-            if user_data and user_data.get('face_image_id') and not user_data.get('has_steganographic_image'):
+            if user_data and has_face_image(user_data) and not user_data.get('has_steganographic_image'):
                 print(f"[INFO] User {user_name} has face image but no steganographic version. Creating now...")
                 
                 try:
@@ -294,6 +293,7 @@ def capture_fingerprint():
                                         }
                                     }
                                 )
+                                db.invalidate_user(user_name)
                                 
                                 print(f"[INFO] ✅ Steganographic image created automatically for existing user: {user_name}")
                             else:
@@ -316,12 +316,13 @@ def capture_fingerprint():
                     if email_service.mailjet:
                         # Check if both face and fingerprint are now complete
                         enrollment_type = "Complete" if user_data.get('face_complete') else "Fingerprint"
-                        email_result = email_service.send_enrollment_completion_email(
+                        email_service.send_in_background(
+                            email_service.send_enrollment_completion_email,
                             user_name, 
                             user_data['email'], 
                             enrollment_type=enrollment_type
                         )
-                        print(f"[INFO] Fingerprint enrollment email sent to {user_data['email']}: {email_result.get('message', 'Success')}")
+                        print(f"[INFO] Fingerprint enrollment email queued for {user_data['email']}")
                     else:
                         print(f"[INFO] Email service unavailable for fingerprint enrollment notification")
                 else:
@@ -383,8 +384,7 @@ def capture_with_status_updates(user_name):
     # Create user directory
     save_path = "../dataset/face"
     user_folder = os.path.join(save_path, user_name)
-    if not os.path.exists(user_folder):
-        os.makedirs(user_folder)
+    os.makedirs(user_folder, exist_ok=True)
     
     # Initialize camera
     cap = cv2.VideoCapture(0)
@@ -483,10 +483,7 @@ def get_users_for_selection():
         # Get all users with complete registration
         users_collection = db.db.users
         users = users_collection.find(
-            {
-                "registration_complete": True,
-                "face_image_id": {"$ne": None}
-            },
+            dict(HAS_FACE_IMAGE_FILTER, registration_complete=True),
             {
                 "name": 1, 
                 "email": 1, 
@@ -555,13 +552,14 @@ def manual_login():
                 email_service = get_email_service()
                 if email_service.mailjet:
                     print(f"[DEBUG] Sending manual login notification to: {user_data['email']}")
-                    email_result = email_service.send_login_notification(
+                    email_service.send_in_background(
+                        email_service.send_login_notification,
                         username, 
                         user_data['email'], 
                         confidence_score=1.0,  # Manual selection = 100% confidence
                         login_method=f"Manual Selection ({login_method})"
                     )
-                    print(f"[INFO] Manual login email sent to {user_data['email']}: {email_result.get('message', 'Success')}")
+                    print(f"[INFO] Manual login email queued for {user_data['email']}")
                 else:
                     print(f"[INFO] Email service unavailable for manual login notification")
             else:
@@ -608,13 +606,14 @@ def verify_user_identity():
             if user_data and user_data.get('email'):
                 email_service = get_email_service()
                 if email_service.mailjet:
-                    email_result = email_service.send_login_notification(
+                    email_service.send_in_background(
+                        email_service.send_login_notification,
                         username, 
                         user_data['email'], 
                         confidence_score=confidence,
                         login_method="Face Recognition (Confirmed)"
                     )
-                    print(f"[INFO] Confirmed login email sent to {user_data['email']}")
+                    print(f"[INFO] Confirmed login email queued for {user_data['email']}")
             
             return jsonify({
                 "success": True,
@@ -667,11 +666,15 @@ def match_face():
         return response
         
     try:
+        # Preview window is shown unless the client asks for headless matching
+        data = request.get_json(silent=True) or {}
+        headless = bool(data.get('headless', False))
+        
         # Initialize face matcher
         face_matcher = DatabaseFaceMatcher()
         
         # Perform face matching from webcam
-        result = face_matcher.match_face_from_webcam(duration_seconds=10)
+        result = face_matcher.match_face_from_webcam(duration_seconds=10, headless=headless)
         
         if result['success']:
             # Send login notification email
@@ -694,13 +697,14 @@ def match_face():
                     email_service = get_email_service()
                     if email_service.mailjet:
                         print(f"[DEBUG] Sending login notification to: {user_data['email']}")
-                        email_result = email_service.send_login_notification(
+                        email_service.send_in_background(
+                            email_service.send_login_notification,
                             username, 
                             user_data['email'], 
                             confidence_score=confidence,
                             login_method="Face Recognition"
                         )
-                        print(f"[INFO] Login email sent to {user_data['email']}: {email_result.get('message', 'Success')}")
+                        print(f"[INFO] Login email queued for {user_data['email']}")
                     else:
                         print(f"[INFO] Email service unavailable for login notification")
                 else:
@@ -813,13 +817,14 @@ def authenticate_user():
                     email_service = get_email_service()
                     if email_service.mailjet:
                         print(f"[DEBUG] Sending login notification to: {user_data['email']}")
-                        email_result = email_service.send_login_notification(
+                        email_service.send_in_background(
+                            email_service.send_login_notification,
                             username, 
                             user_data['email'], 
                             confidence_score=confidence/100.0,  # Convert to percentage
                             login_method="Fingerprint Authentication"
                         )
-                        print(f"[INFO] Login email sent to {user_data['email']}: {email_result.get('message', 'Success')}")
+                        print(f"[INFO] Login email queued for {user_data['email']}")
                     else:
                         print(f"[INFO] Email service unavailable for login notification")
                 else:
@@ -7,11 +7,41 @@ but don't have steganographic images yet.
 
 import sys
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(__file__))
 
-from mongodb_client import get_database
+from mongodb_client import get_database, HAS_FACE_IMAGE_FILTER
 from steganography import BiometricSteganography
 
+# Face images downloaded ahead of the user currently being processed
+PREFETCH_DEPTH = 4
+
+def save_stego_image(db, username, stego_data):
+    """Store a steganographic image in GridFS and link it to the user; returns the file id"""
+    stego_image_id = db.fs.put(
+        stego_data,
+        filename=f"{username}_steganographic_face_001.jpg",
+        content_type="image/png",
+        metadata={
+            "user_name": username,
+            "type": "face_image_steganographic",
+            "has_embedded_key": True
+        }
+    )
+    
+    db.db.users.update_one(
+        {"name": username},
+        {
+            "$set": {
+                "face_stego_image_id": stego_image_id,
+                "has_steganographic_image": True
+            }
+        }
+    )
+    db.invalidate_user(username)
+    return stego_image_id
+
 def create_steganographic_for_existing_users():
     """
     Find users with face images and fingerprint keys but no steganographic images.
@@ -30,16 +60,22 @@ def create_steganographic_for_existing_users():
     users_collection = db.db.users
     
     query = {
-        "face_image_id": {"$exists": True},
         "fingerprint_algorithm": "sha256",
-        "$or": [
-            {"has_steganographic_image": {"$exists": False}},
-            {"has_steganographic_image": False},
-            {"face_stego_image_id": {"$exists": False}}
+        "$and": [
+            HAS_FACE_IMAGE_FILTER,
+            {"$or": [
+                {"has_steganographic_image": {"$exists": False}},
+                {"has_steganographic_image": False},
+                {"face_stego_image_id": {"$exists": False}}
+            ]}
         ]
     }
     
-    users_needing_stego = list(users_collection.find(query))
+    # Materialized on purpose: every user is listed and confirmed before processing starts.
+    # The projection keeps each document small (no image bytes).
+    users_needing_stego = list(
+        users_collection.find(query, {"name": 1, "fingerprint_key": 1, "fingerprint_template": 1})
+    )
     
     print(f"\n📊 Found {len(users_needing_stego)} users needing steganographic images:\n")
     
@@ -70,7 +106,18 @@ def create_steganographic_for_existing_users():
     success_count = 0
     error_count = 0
     
-    for user in users_needing_stego:
+    # Each user's upload is independent; run them in the background while the next user is embedded
+    write_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+    saves = []  # (username, future, key verified)
+    
+    # Keep a few face-image downloads in flight while the current user is embedded and saved
+    pending = deque(db.prefetch_face_image(user['name']) for user in users_needing_stego[:PREFETCH_DEPTH])
+    
+    for i, user in enumerate(users_needing_stego):
+        if i + PREFETCH_DEPTH < len(users_needing_stego):
+            pending.append(db.prefetch_face_image(users_needing_stego[i + PREFETCH_DEPTH]['name']))
+        face_image_future = pending.popleft()
+        
         username = user['name']
         print(f"\n📝 Processing: {username}")
         print("-" * 40)
@@ -87,7 +134,7 @@ def create_steganographic_for_existing_users():
             print(f"✅ Found fingerprint key: {fingerprint_key[:8]}...{fingerprint_key[-8:]}")
             
             # Get original face image
-            face_image_data = db.get_face_image(username)
+            face_image_data = face_image_future.result()
             
             if not face_image_data:
                 print(f"❌ No face image found for {username}")
@@ -107,48 +154,41 @@ def create_steganographic_for_existing_users():
             
             print(f"✅ Steganographic image created ({len(stego_data)} bytes)")
             
-            # Save steganographic image to GridFS
+            # Save steganographic image to GridFS (in the background)
             print("💾 Saving to database...")
-            stego_image_id = db.fs.put(
-                stego_data,
-                filename=f"{username}_steganographic_face_001.jpg",
-                content_type="image/png",
-                metadata={
-                    "user_name": username,
-                    "type": "face_image_steganographic",
-                    "has_embedded_key": True
-                }
-            )
-            
-            # Update user document
-            users_collection.update_one(
-                {"name": username},
-                {
-                    "$set": {
-                        "face_stego_image_id": stego_image_id,
-                        "has_steganographic_image": True
-                    }
-                }
-            )
-            
-            print(f"✅ Steganographic image saved for {username}")
-            print(f"   - Image ID: {stego_image_id}")
+            save_future = write_pool.submit(save_stego_image, db, username, stego_data)
             
-            # Verify the embedded key
+            # Verify the embedded key while the upload runs
             print("🔍 Verifying embedded key...")
             verification = steg.verify_key_in_image(stego_data, fingerprint_key)
             
             if verification:
                 print("✅ Key verification successful!")
-                success_count += 1
             else:
                 print("⚠️ Warning: Key verification failed!")
-                error_count += 1
+            saves.append((username, save_future, verification))
             
         except Exception as e:
             print(f"❌ Error processing {username}: {e}")
             error_count += 1
     
+    # Wait for the uploads and report them
+    write_pool.shutdown(wait=True)
+    for username, save_future, verification in saves:
+        try:
+            stego_image_id = save_future.result()
+        except Exception as e:
+            print(f"❌ Error saving steganographic image for {username}: {e}")
+            error_count += 1
+            continue
+        
+        print(f"✅ Steganographic image saved for {username}")
+        print(f"   - Image ID: {stego_image_id}")
+        if verification:
+            success_count += 1
+        else:
+            error_count += 1
+    
     # Final summary
     print("\n" + "=" * 60)
     print("📊 Processing Complete!")
@@ -184,7 +224,7 @@ def list_steganographic_images():
     
     for i, user in enumerate(users_with_stego, 1):
         print(f"{i}. {user['name']}")
-        print(f"   - Face Image ID: {user.get('face_image_id')}")
+        print(f"   - Face Image ID: {'inline' if user.get('face_image_inline') else user.get('face_image_id')}")
         print(f"   - Stego Image ID: {user.get('face_stego_image_id')}")
         print(f"   - Fingerprint Key: {user.get('fingerprint_key', '')[:8]}...{user.get('fingerprint_key', '')[-8:]}")
         print()
@@ -4,9 +4,13 @@ Dashboard Module for Biometric Authentication System
 Provides user profile information and photo retrieval endpoints
 """
 
-from flask import Blueprint, request, jsonify, send_file
-from mongodb_client import get_database
+from flask import Blueprint, Response, request, jsonify, send_file
+from mongodb_client import get_database, has_face_image
+from steganography import image_mimetype
+from werkzeug.http import dump_options_header
+from urllib.parse import quote
 import io
+import unicodedata
 from datetime import datetime
 from bson import ObjectId
 
@@ -17,6 +21,20 @@ def get_dashboard_database():
     """Get database instance for dashboard operations"""
     return get_database()
 
+def content_disposition(disposition, filename):
+    """Build a Content-Disposition header value the way send_file does
+    
+    The filename is quoted as needed; non-ASCII names get an ASCII fallback plus an
+    RFC 5987 filename* parameter, since header values must be latin-1.
+    """
+    try:
+        filename.encode("ascii")
+        options = {"filename": filename}
+    except UnicodeEncodeError:
+        ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        options = {"filename": ascii_name, "filename*": f"UTF-8''{quote(filename, safe='')}"}
+    return dump_options_header(disposition, options)
+
 @dashboard_bp.route('/user/<username>', methods=['GET'])
 def get_user_info(username):
     """
@@ -51,9 +69,9 @@ def get_user_info(username):
             'registration_complete': user.get('registration_complete', False),
             
             # Biometric data status
-            'has_face_image': bool(user.get('face_image_id')),
+            'has_face_image': has_face_image(user),
             'has_fingerprint': bool(user.get('fingerprint_template')),
-            'has_photo': bool(user.get('face_image_id')),  # For photo display
+            'has_photo': has_face_image(user),  # For photo display
             
             # Last updated timestamps
             'face_updated_at': user.get('face_updated_at', '').isoformat() if user.get('face_updated_at') else None,
@@ -93,24 +111,19 @@ def get_user_photo(username):
                 'error': 'Database connection failed'
             }), 500
         
-        # Get face image data
-        image_data = db.get_face_image(username)
+        # Stream the face image straight from GridFS, one chunk at a time
+        image_chunks = db.iter_face_image(username)
         
-        if not image_data:
+        if image_chunks is None:
             return jsonify({
                 'success': False,
                 'error': f'No photo found for user "{username}"'
             }), 404
         
-        # Create BytesIO object for sending image
-        image_buffer = io.BytesIO(image_data)
-        image_buffer.seek(0)
-        
-        return send_file(
-            image_buffer,
+        return Response(
+            image_chunks,
             mimetype='image/png',  # PNG for steganography
-            as_attachment=False,
-            download_name=f'{username}_photo.png'
+            headers={'Content-Disposition': content_disposition('inline', f'{username}_photo.png')}
         )
         
     except Exception as e:
@@ -156,13 +169,17 @@ def download_steganographic_photo(username):
         image_buffer = io.BytesIO(stego_image_data)
         image_buffer.seek(0)
         
+        # Newer steganographic images may be stored as lossless WebP (or JPEG with the key in metadata)
+        mimetype = image_mimetype(stego_image_data)
+        extension = mimetype.split('/')[1].replace('jpeg', 'jpg')
+        
         # Generate descriptive filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        download_name = f'{username}_steganographic_{timestamp}.png'
+        download_name = f'{username}_steganographic_{timestamp}.{extension}'
         
         return send_file(
             image_buffer,
-            mimetype='image/png',
+            mimetype=mimetype,
             as_attachment=True,  # Force download
             download_name=download_name
         )
@@ -397,7 +414,7 @@ def calculate_enrollment_percentage(user):
     total_biometrics = 2  # Face + Fingerprint
     enrolled_count = 0
     
-    if user.get('face_image_id'):
+    if has_face_image(user):
         enrolled_count += 1
     if user.get('fingerprint_template'):
         enrolled_count += 1
@@ -428,7 +445,7 @@ def calculate_security_score(user):
     score += 20
     
     # Score for face image
-    if user.get('face_image_id'):
+    if has_face_image(user):
         score += 40
     
     # Score for fingerprint
@@ -476,7 +493,7 @@ def assess_data_quality(user):
         quality_score += 1
     
     # Check face image
-    if user.get('face_image_id'):
+    if has_face_image(user):
         quality_score += 1
     
     # Check fingerprint
@@ -21,11 +21,7 @@ class FaceCapture:
         """
         # Create user directory
         user_folder = os.path.join(save_path, user_name)
-        if not os.path.exists(user_folder):
-            os.makedirs(user_folder)
-            print(f"Created directory for user: {user_name}")
-        else:
-            print(f"Directory already exists for user: {user_name}")
+        os.makedirs(user_folder, exist_ok=True)
             
         # Initialize camera
         cap = cv2.VideoCapture(0)
@@ -8,22 +8,105 @@ import cv2
 import numpy as np
 import os
 import sys
-from sklearn.metrics.pairwise import cosine_similarity
 import io
+import json
+import queue
+import threading
+import time
+from collections import deque
 from PIL import Image
 
+# FAISS is optional; without it matching falls back to a NumPy scan
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
 # Add parent directories to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from mongodb_client import get_database
+from mongodb_client import get_database, HAS_FACE_IMAGE_FILTER
+
+# On-disk cache of database face encodings, keyed by each user's face image id
+ENCODING_CACHE_VERSION = 3
+
+# Face images fetched ahead of the one being encoded while loading the database
+FACE_PREFETCH_DEPTH = 8
+ENCODING_CACHE_PATH = os.path.join(os.path.dirname(__file__), '.face_encodings.npz')
+ENCODING_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), '.face_encodings.json')
+FAISS_INDEX_PATH = os.path.join(os.path.dirname(__file__), '.face_encodings.faiss')
+
+# YuNet ONNX model (from the OpenCV model zoo) used when MediaPipe is unavailable; not shipped
+# with the repo, see installation.md. Set YUNET_MODEL_PATH to keep it somewhere else.
+YUNET_MODEL_URL = ('https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/'
+                   'face_detection_yunet_2023mar.onnx')
+YUNET_MODEL_PATH = os.environ.get(
+    'YUNET_MODEL_PATH',
+    os.path.join(os.path.dirname(__file__), 'face_detection_yunet_2023mar.onnx')
+)
+
+def normalize_rows(matrix):
+    """L2-normalize a vector or each row of a matrix, leaving zero rows untouched"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+# Numba is optional; it fuses the prefix-cosine fallback into one pass without copies
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _prefix_cosine_kernel(matrix, query):
+        length = query.shape[0]
+        out = np.empty(matrix.shape[0], dtype=np.float32)
+        for i in prange(matrix.shape[0]):
+            dot = 0.0
+            norm = 0.0
+            for j in range(length):
+                value = matrix[i, j]
+                dot += value * query[j]
+                norm += value * value
+            out[i] = dot / np.sqrt(norm) if norm > 0 else 0.0
+        return out
+
+def prefix_cosine(matrix, query):
+    """Cosine similarity of a normalized query against the first len(query) columns of each row"""
+    if njit is not None:
+        return _prefix_cosine_kernel(matrix, query)
+    return normalize_rows(matrix[:, :len(query)]) @ query
 
 class DatabaseFaceMatcher:
+    # Use an IVF index once the database is large enough for a linear scan to dominate
+    FAISS_MIN_ENCODINGS = 1000
+    FAISS_NPROBE = 8
+    FAISS_TOP_K = 5
+    
+    # Webcam matching: run detection about 6-7 times a second, redraw at up to 30 FPS
+    DETECTION_INTERVAL = 0.15
+    DISPLAY_INTERVAL = 1 / 30
+    
     def __init__(self):
         self.face_cascade = None
+        self.yunet = None
+        self.detector_backend = None
         self.known_encodings = []
         self.known_names = []
         self.db = None
         
+        # Normalized encoding matrices used for vectorized matching
+        self._db_groups = []
+        self._index = None
+        
+        # Reusable color-conversion buffers for full-frame detection
+        self._rgb_buf = None
+        self._gray_buf = None
+        
+        # Gabor filter bank is fixed, build it once instead of per face
+        self.gabor_kernels = self.build_gabor_kernels()
+        
         # Initialize face detection
         self.setup_face_detection()
         
@@ -31,7 +114,7 @@ class DatabaseFaceMatcher:
         self.connect_database()
     
     def setup_face_detection(self):
-        """Setup face detection using OpenCV Haar Cascades"""
+        """Setup face detection: MediaPipe, then OpenCV YuNet, then Haar Cascades"""
         try:
             # Try MediaPipe first (if available)
             try:
@@ -48,15 +131,32 @@ class DatabaseFaceMatcher:
                     refine_landmarks=True, 
                     min_detection_confidence=0.7
                 )
+                self.detector_backend = "mediapipe"
                 print("[INFO] Using MediaPipe for face detection")
                 return
             except ImportError:
                 pass
             
-            # Fallback to OpenCV Haar Cascades
+            # Fallback to OpenCV YuNet when its model file is available
+            if hasattr(cv2, 'FaceDetectorYN') and os.path.exists(YUNET_MODEL_PATH):
+                try:
+                    self.yunet = cv2.FaceDetectorYN.create(
+                        YUNET_MODEL_PATH, '', (640, 480), score_threshold=0.6
+                    )
+                    self.detector_backend = "yunet"
+                    print("[INFO] Using OpenCV YuNet for face detection")
+                    return
+                except cv2.error as e:
+                    print(f"[WARNING] Could not load YuNet model: {e}")
+                    self.yunet = None
+            elif hasattr(cv2, 'FaceDetectorYN'):
+                print(f"[INFO] YuNet model not found at {YUNET_MODEL_PATH} (download: {YUNET_MODEL_URL})")
+            
+            # Last resort: OpenCV Haar Cascades
             self.face_cascade = cv2.CascadeClassifier(
                 cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
             )
+            self.detector_backend = "haar"
             print("[INFO] Using OpenCV Haar Cascades for face detection")
             
         except Exception as e:
@@ -78,14 +178,12 @@ class DatabaseFaceMatcher:
         """Extract deep features from face using multiple methods"""
         features = []
         
-        # Convert to grayscale
-        if len(face_image.shape) == 3:
-            gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+        # Resize to standard size once, then convert only the small image to grayscale
+        resized = cv2.resize(face_image, (112, 112), interpolation=cv2.INTER_AREA)
+        if len(resized.shape) == 3:
+            gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
         else:
-            gray = face_image
-        
-        # Resize to standard size
-        gray = cv2.resize(gray, (112, 112))
+            gray = resized
         
         try:
             # Method 1: LBP (Local Binary Patterns)
@@ -149,15 +247,23 @@ class DatabaseFaceMatcher:
         """Extract Gabor filter features"""
         features = []
         
+        for kernel in self.gabor_kernels:
+            filtered = cv2.filter2D(gray_image, cv2.CV_8UC3, kernel)
+            features.extend([filtered.mean(), filtered.std()])
+        
+        return features
+    
+    def build_gabor_kernels(self):
+        """Build the Gabor filter bank once; inputs are always resized to 112x112"""
+        kernels = []
+        
         # Multiple Gabor kernels
         for theta in range(0, 180, 45):  # 4 orientations
             for frequency in [0.1, 0.3]:  # 2 frequencies
-                kernel = cv2.getGaborKernel((21, 21), 5, np.radians(theta), 
-                                          2*np.pi*frequency, 0.5, 0, ktype=cv2.CV_32F)
-                filtered = cv2.filter2D(gray_image, cv2.CV_8UC3, kernel)
-                features.extend([filtered.mean(), filtered.std()])
+                kernels.append(cv2.getGaborKernel((21, 21), 5, np.radians(theta), 
+                                                  2*np.pi*frequency, 0.5, 0, ktype=cv2.CV_32F))
         
-        return features
+        return kernels
     
     def extract_mediapipe_features(self, face_image):
         """Extract MediaPipe facial landmarks"""
@@ -166,6 +272,7 @@ class DatabaseFaceMatcher:
                 return None
                 
             rgb_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+            rgb_image.flags.writeable = False
             results = self.face_mesh.process(rgb_image)
             
             if results.multi_face_landmarks:
@@ -200,6 +307,18 @@ class DatabaseFaceMatcher:
         
         return features
     
+    def to_rgb(self, image):
+        """Convert a BGR frame to RGB into a reused buffer (reallocated only on size change)"""
+        if self._rgb_buf is None or self._rgb_buf.shape != image.shape:
+            self._rgb_buf = np.empty(image.shape, dtype=np.uint8)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+    
+    def to_gray(self, image):
+        """Convert a BGR frame to grayscale into a reused buffer (reallocated only on size change)"""
+        if self._gray_buf is None or self._gray_buf.shape != image.shape[:2]:
+            self._gray_buf = np.empty(image.shape[:2], dtype=np.uint8)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
+    
     def detect_faces(self, image):
         """Detect faces in image"""
         faces = []
@@ -207,8 +326,14 @@ class DatabaseFaceMatcher:
         try:
             if hasattr(self, 'face_detector') and self.face_detector is not None:
                 # Use MediaPipe
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                results = self.face_detector.process(rgb_image)
+                rgb_image = self.to_rgb(image)
+                
+                # A read-only array lets MediaPipe wrap the reused buffer instead of copying it
+                rgb_image.flags.writeable = False
+                try:
+                    results = self.face_detector.process(rgb_image)
+                finally:
+                    rgb_image.flags.writeable = True
                 
                 if results.detections:
                     h, w, _ = image.shape
@@ -219,9 +344,17 @@ class DatabaseFaceMatcher:
                         width = int(bbox.width * w)
                         height = int(bbox.height * h)
                         faces.append((x, y, width, height))
+            elif self.yunet is not None:
+                # Use OpenCV YuNet
+                h, w = image.shape[:2]
+                self.yunet.setInputSize((w, h))
+                _, detections = self.yunet.detect(image)
+                
+                if detections is not None:
+                    faces = [(int(d[0]), int(d[1]), int(d[2]), int(d[3])) for d in detections]
             else:
                 # Use OpenCV Haar Cascades
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                gray = self.to_gray(image)
                 detected = self.face_cascade.detectMultiScale(gray, 1.1, 4)
                 faces = [(x, y, w, h) for (x, y, w, h) in detected]
         except Exception as e:
@@ -236,18 +369,35 @@ class DatabaseFaceMatcher:
             
             # Get all users with face images
             users_collection = self.db.db.users
-            users_with_faces = users_collection.find({
-                'face_image_id': {'$ne': None},
-                'registration_complete': True
-            })
+            users_with_faces = list(users_collection.find(
+                dict(HAS_FACE_IMAGE_FILTER, registration_complete=True),
+                {'name': 1, 'face_image_id': 1, 'face_updated_at': 1}
+            ))
+            
+            # Reuse cached encodings if no face image changed since they were built
+            manifest = self.build_cache_manifest(users_with_faces)
+            if self.load_encoding_cache(manifest):
+                self.build_match_index(load_index=True)
+                print(f"[INFO] Loaded {len(self.known_encodings)} face encodings from cache")
+                return len(self.known_encodings) > 0
             
             self.known_encodings = []
             self.known_names = []
             
-            for user in users_with_faces:
+            # Keep a few downloads in flight so network waits overlap feature extraction
+            pending = deque(
+                self.db.prefetch_face_image(user['name'])
+                for user in users_with_faces[:FACE_PREFETCH_DEPTH]
+            )
+            
+            for i, user in enumerate(users_with_faces):
+                next_index = i + FACE_PREFETCH_DEPTH
+                if next_index < len(users_with_faces):
+                    pending.append(self.db.prefetch_face_image(users_with_faces[next_index]['name']))
+                
                 try:
-                    # Get face image from GridFS
-                    face_image_data = self.db.get_face_image(user['name'])
+                    # Get face image (fetched in the background)
+                    face_image_data = pending.popleft().result()
                     
                     if face_image_data is None:
                         print(f"[WARNING] No face image found for {user['name']}")
@@ -292,6 +442,9 @@ class DatabaseFaceMatcher:
                     print(f"[ERROR] Failed to process face for {user['name']}: {e}")
                     continue
             
+            self.build_match_index()
+            self.save_encoding_cache(manifest)
+            
             print(f"[INFO] Loaded {len(self.known_encodings)} face encodings from database")
             return len(self.known_encodings) > 0
             
@@ -299,8 +452,175 @@ class DatabaseFaceMatcher:
             print(f"[ERROR] Failed to load database faces: {e}")
             return False
     
-    def match_face_from_webcam(self, duration_seconds=10):
-        """Capture from webcam and try to match face"""
+    def build_cache_manifest(self, users):
+        """Describe the database state the encoding cache is valid for"""
+        return {
+            "version": ENCODING_CACHE_VERSION,
+            "detector": self.detector_backend,
+            # Inline images have no GridFS id; their upload time changes with every new image
+            "users": {user['name']: str(user.get('face_image_id') or user.get('face_updated_at')) for user in users}
+        }
+    
+    def load_encoding_cache(self, manifest):
+        """Load encodings from disk if the stored manifest matches, returns True on a cache hit"""
+        try:
+            if not os.path.exists(ENCODING_MANIFEST_PATH) or not os.path.exists(ENCODING_CACHE_PATH):
+                return False
+            
+            with open(ENCODING_MANIFEST_PATH, 'r') as f:
+                if json.load(f) != manifest:
+                    return False
+            
+            with np.load(ENCODING_CACHE_PATH, allow_pickle=False) as data:
+                names = data['names'].tolist()
+                lengths = data['lengths']
+                matrix = data['encodings']
+            
+            self.known_names = names
+            self.known_encodings = [matrix[i, :lengths[i]] for i in range(len(names))]
+            return True
+            
+        except Exception as e:
+            print(f"[WARNING] Could not read face encoding cache: {e}")
+            return False
+    
+    def save_encoding_cache(self, manifest):
+        """Write encodings (zero-padded to a common length) and the manifest they belong to"""
+        try:
+            lengths = np.array([len(e) for e in self.known_encodings], dtype=np.int32)
+            width = int(lengths.max()) if len(lengths) > 0 else 0
+            matrix = np.zeros((len(self.known_encodings), width), dtype=np.float32)
+            for i, encoding in enumerate(self.known_encodings):
+                matrix[i, :len(encoding)] = encoding
+            
+            with open(ENCODING_CACHE_PATH, 'wb') as f:
+                np.savez(f, names=np.array(self.known_names, dtype=str), lengths=lengths, encodings=matrix)
+            
+            if self._index is not None:
+                faiss.write_index(self._index, FAISS_INDEX_PATH)
+            elif os.path.exists(FAISS_INDEX_PATH):
+                os.remove(FAISS_INDEX_PATH)
+            
+            # Manifest is written last so a partial write never looks valid
+            with open(ENCODING_MANIFEST_PATH, 'w') as f:
+                json.dump(manifest, f)
+                
+        except Exception as e:
+            print(f"[WARNING] Could not write face encoding cache: {e}")
+    
+    def load_faiss_index(self):
+        """Read the persisted FAISS index if it matches the loaded encodings"""
+        if faiss is None or not os.path.exists(FAISS_INDEX_PATH):
+            return None
+        
+        try:
+            index = faiss.read_index(FAISS_INDEX_PATH)
+            if index.ntotal != len(self.known_names):
+                return None
+            index.nprobe = self.FAISS_NPROBE
+            return index
+        except Exception as e:
+            print(f"[WARNING] Could not read FAISS index: {e}")
+            return None
+    
+    def build_match_index(self, load_index=False):
+        """Stack known encodings into L2-normalized float32 matrices, one per feature length"""
+        groups = {}
+        for i, encoding in enumerate(self.known_encodings):
+            if len(encoding) > 0:
+                groups.setdefault(len(encoding), []).append(i)
+        
+        self._db_groups = []
+        for length, indices in groups.items():
+            matrix = np.stack([self.known_encodings[i] for i in indices]).astype(np.float32)
+            self._db_groups.append((length, np.array(indices), normalize_rows(matrix)))
+        
+        self._index = self.load_faiss_index() if load_index else None
+        if self._index is None:
+            self._index = self.build_faiss_index()
+    
+    def build_faiss_index(self):
+        """Build an inner-product IVF index when FAISS is available and all encodings share one length"""
+        if faiss is None or len(self._db_groups) != 1:
+            return None
+        
+        length, indices, matrix = self._db_groups[0]
+        if len(indices) < self.FAISS_MIN_ENCODINGS or len(indices) != len(self.known_names):
+            return None
+        
+        try:
+            nlist = max(1, int(4 * np.sqrt(len(indices))))
+            quantizer = faiss.IndexFlatIP(length)
+            # 8-bit scalar quantization stores a quarter of the float32 bytes per encoding
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, length, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            data = np.ascontiguousarray(matrix)
+            index.train(data)
+            index.add(data)
+            index.nprobe = self.FAISS_NPROBE
+            print(f"[INFO] Built FAISS IVF-SQ8 index ({len(indices)} encodings, {nlist} lists)")
+            return index
+        except Exception as e:
+            print(f"[WARNING] FAISS index build failed, using linear scan: {e}")
+            return None
+    
+    def compute_similarities(self, features):
+        """Cosine similarity of a feature vector against every known encoding
+        
+        Encodings are compared over their common prefix, matching the
+        truncation rule used when feature lengths differ.
+        """
+        similarities = np.zeros(len(self.known_names), dtype=np.float32)
+        query = np.asarray(features, dtype=np.float32)
+        
+        if self._index is not None and len(query) == self._index.d:
+            k = min(self.FAISS_TOP_K, self._index.ntotal)
+            scores, ids = self._index.search(normalize_rows(query)[np.newaxis, :], k)
+            found = ids[0] >= 0
+            similarities[ids[0][found]] = scores[0][found]
+            return similarities
+        
+        for length, indices, matrix in self._db_groups:
+            min_len = min(len(query), length)
+            if min_len == 0:
+                continue
+            
+            query_norm = normalize_rows(query[:min_len])
+            if min_len < length:
+                # Query is shorter than these encodings: compare over the common prefix
+                similarities[indices] = prefix_cosine(matrix, query_norm)
+                continue
+            
+            # One matmul; multithreaded BLAS already spreads large scans across cores
+            similarities[indices] = matrix @ query_norm
+        
+        return similarities
+    
+    def read_frames(self, cap, frames, stop_event):
+        """Producer loop that keeps only the newest camera frame in the queue"""
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                frame = None
+            
+            # Latest frame wins: drop the stale one if the consumer is behind
+            if frames.full():
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    pass
+            frames.put(frame)
+            
+            if frame is None:
+                break
+    
+    def match_face_from_webcam(self, duration_seconds=10, headless=False):
+        """Capture from webcam and try to match face
+        
+        With headless=True no preview window is opened, which makes the call
+        safe from a server thread without a display.
+        """
         try:
             print("[INFO] Starting webcam for face matching...")
             
@@ -342,115 +662,102 @@ class DatabaseFaceMatcher:
             
             best_match = None
             best_confidence = 0.0
-            frame_count = 0
-            max_frames = duration_seconds * 30  # Assume 30 FPS
+            faces = []
+            
+            # Read frames on a separate thread so camera I/O never stalls detection
+            frames = queue.Queue(maxsize=1)
+            stop_event = threading.Event()
+            reader = threading.Thread(target=self.read_frames, args=(cap, frames, stop_event), daemon=True)
+            reader.start()
             
             print(f"[INFO] Face matching started. Looking for faces for {duration_seconds} seconds...")
             
-            while frame_count < max_frames:
-                ret, frame = cap.read()
-                if not ret:
+            # Detection and display are throttled by wall-clock time, not by camera frame rate
+            deadline = time.monotonic() + duration_seconds
+            last_detect_t = 0.0
+            last_draw_t = 0.0
+            
+            while time.monotonic() < deadline:
+                try:
+                    frame = frames.get(timeout=1.0)
+                except queue.Empty:
+                    frame = None
+                
+                if frame is None:
                     print("[WARNING] Failed to read frame from camera")
                     break
                 
                 # Check if frame is valid
-                if frame is None or frame.size == 0:
+                if frame.size == 0:
                     print("[WARNING] Invalid frame received")
                     continue
                 
-                frame_count += 1
+                now = time.monotonic()
                 
-                # Process every 5th frame for better performance
-                if frame_count % 5 != 0:
-                    # Display frame with current best match
+                if now - last_detect_t >= self.DETECTION_INTERVAL:
+                    last_detect_t = now
+                    
+                    # Detect faces
                     try:
-                        display_frame = frame.copy()
-                        
-                        if best_match:
-                            cv2.putText(display_frame, f"Best Match: {best_match} ({best_confidence:.2f})", 
-                                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                        else:
-                            cv2.putText(display_frame, "Looking for faces...", 
-                                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                        
-                        cv2.putText(display_frame, f"Time remaining: {duration_seconds - frame_count//30}s", 
-                                   (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                        
-                        cv2.putText(display_frame, "Press 'q' to quit", 
-                                   (10, display_frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                        
-                        cv2.imshow('Face Matching', display_frame)
-                        
-                        if cv2.waitKey(1) & 0xFF == ord('q'):
-                            print("[INFO] User pressed 'q' to quit")
-                            break
+                        faces = self.detect_faces(frame)
+                        print(f"[DEBUG] Detected {len(faces)} faces in frame")
                     except Exception as e:
-                        print(f"[WARNING] Display error: {e}")
-                    continue
-                
-                # Detect faces
-                try:
-                    faces = self.detect_faces(frame)
-                    print(f"[DEBUG] Detected {len(faces)} faces in frame")
-                except Exception as e:
-                    print(f"[ERROR] Face detection failed: {e}")
-                    faces = []
-                
-                for face_bbox in faces:
-                    try:
-                        x, y, w, h = face_bbox
-                        
-                        # Validate bounding box
-                        if w <= 0 or h <= 0:
-                            continue
-                        
-                        # Extract face region with padding
-                        padding = 10
-                        y_start = max(0, y - padding)
-                        y_end = min(frame.shape[0], y + h + padding)
-                        x_start = max(0, x - padding)
-                        x_end = min(frame.shape[1], x + w + padding)
-                        
-                        face_region = frame[y_start:y_end, x_start:x_end]
-                        
-                        if face_region.size == 0:
-                            print("[WARNING] Empty face region extracted")
-                            continue
-                        
-                        # Extract features
-                        features = self.extract_deep_features(face_region)
+                        print(f"[ERROR] Face detection failed: {e}")
+                        faces = []
+                    
+                    for face_bbox in faces:
+                        try:
+                            x, y, w, h = face_bbox
+                            
+                            # Validate bounding box
+                            if w <= 0 or h <= 0:
+                                continue
+                            
+                            # Extract face region with padding
+                            padding = 10
+                            y_start = max(0, y - padding)
+                            y_end = min(frame.shape[0], y + h + padding)
+                            x_start = max(0, x - padding)
+                            x_end = min(frame.shape[1], x + w + padding)
+                            
+                            face_region = frame[y_start:y_end, x_start:x_end]
+                            
+                            if face_region.size == 0:
+                                print("[WARNING] Empty face region extracted")
+                                continue
+                            
+                            # Extract features
+                            features = self.extract_deep_features(face_region)
+                            
+                            if len(features) == 0:
+                                print("[WARNING] No features extracted from face")
+                                continue
+                            
+                            # Compare with all known faces at once
+                            similarities = self.compute_similarities(features)
+                            if len(similarities) == 0:
+                                continue
+                            
+                            best_idx = int(np.argmax(similarities))
+                            similarity = float(similarities[best_idx])
+                            
+                            # Update best match if this is better
+                            if similarity > best_confidence and similarity > 0.6:  # Lower threshold for testing
+                                best_match = self.known_names[best_idx]
+                                best_confidence = similarity
                         
-                        if len(features) == 0:
-                            print("[WARNING] No features extracted from face")
+                        except Exception as e:
+                            print(f"[ERROR] Face processing error: {e}")
                             continue
-                        
-                        # Compare with known faces
-                        for i, known_encoding in enumerate(self.known_encodings):
-                            try:
-                                # Ensure same length
-                                min_len = min(len(features), len(known_encoding))
-                                if min_len == 0:
-                                    continue
-                                    
-                                similarity = cosine_similarity([features[:min_len]], 
-                                                             [known_encoding[:min_len]])[0][0]
-                                
-                                # Update best match if this is better
-                                if similarity > best_confidence and similarity > 0.6:  # Lower threshold for testing
-                                    best_match = self.known_names[i]
-                                    best_confidence = similarity
-                                    
-                            except Exception as e:
-                                print(f"[WARNING] Comparison error: {e}")
-                                continue
-                    
-                    except Exception as e:
-                        print(f"[ERROR] Face processing error: {e}")
-                        continue
                 
-                # Display current frame with detection
+                # Headless mode (API use) skips all drawing and GUI calls
+                if headless or now - last_draw_t < self.DISPLAY_INTERVAL:
+                    continue
+                last_draw_t = now
+                
+                # Display current frame with the latest detections (features are already extracted, draw in place)
                 try:
-                    display_frame = frame.copy()
+                    display_frame = frame
                     
                     # Draw face rectangles
                     for (x, y, w, h) in faces:
@@ -464,7 +771,7 @@ class DatabaseFaceMatcher:
                         cv2.putText(display_frame, "Looking for faces...", 
                                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
                     
-                    cv2.putText(display_frame, f"Time remaining: {duration_seconds - frame_count//30}s", 
+                    cv2.putText(display_frame, f"Time remaining: {max(0, int(deadline - now))}s", 
                                (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
                     
                     cv2.putText(display_frame, "Press 'q' to quit", 
@@ -479,8 +786,11 @@ class DatabaseFaceMatcher:
                 except Exception as e:
                     print(f"[WARNING] Display error: {e}")
             
+            stop_event.set()
+            reader.join(timeout=1.0)
             cap.release()
-            cv2.destroyAllWindows()
+            if not headless:
+                cv2.destroyAllWindows()
             
             if best_match and best_confidence > 0.75:  # Increased threshold for better accuracy
                 return {
@@ -499,9 +809,13 @@ class DatabaseFaceMatcher:
                 
         except Exception as e:
             print(f"[ERROR] Face matching error: {e}")
-            if 'cap' in locals():
+            if 'reader' in locals():
+                stop_event.set()
+                reader.join(timeout=1.0)
+            if 'cap' in locals() and cap is not None:
                 cap.release()
-            cv2.destroyAllWindows()
+            if not headless:
+                cv2.destroyAllWindows()
             return {"success": False, "error": f"Face matching failed: {str(e)}"}
     
     def match_single_frame(self, frame):
@@ -535,25 +849,18 @@ class DatabaseFaceMatcher:
                 # Extract features
                 features = self.extract_deep_features(face_region)
                 
-                # Compare with known faces
-                for i, known_encoding in enumerate(self.known_encodings):
-                    try:
-                        # Ensure same length
-                        min_len = min(len(features), len(known_encoding))
-                        if min_len == 0:
-                            continue
-                            
-                        similarity = cosine_similarity([features[:min_len]], 
-                                                     [known_encoding[:min_len]])[0][0]
-                        
-                        # Update best match if this is better
-                        if similarity > best_confidence:
-                            best_match = self.known_names[i]
-                            best_confidence = similarity
-                            
-                    except Exception as e:
-                        print(f"[WARNING] Comparison error: {e}")
-                        continue
+                # Compare with all known faces at once
+                similarities = self.compute_similarities(features)
+                if len(similarities) == 0:
+                    continue
+                
+                best_idx = int(np.argmax(similarities))
+                similarity = float(similarities[best_idx])
+                
+                # Update best match if this is better
+                if similarity > best_confidence:
+                    best_match = self.known_names[best_idx]
+                    best_confidence = similarity
             
             if best_match and best_confidence > 0.75:  # Increased threshold for better accuracy
                 return {
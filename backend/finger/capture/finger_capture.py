@@ -1,202 +1,57 @@
 # R307 Fingerprint Sensor Capture Module
 # This module captures fingerprint templates from R307 sensor on COM3
 
-import serial
+import sys
 import time
-import struct
 import os
 from datetime import datetime
 
-class R307FingerCapture:
+# Shared R307 protocol lives in backend/finger/r307.py
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from r307 import R307Base
+
+class R307FingerCapture(R307Base):
     """Interface for R307 fingerprint sensor communication"""
     
-    # Command codes
-    CMD_GET_IMAGE = 0x01
-    CMD_IMG_2_TZ = 0x02
-    CMD_UP_CHAR = 0x08
-    
-    # Response codes
-    FINGERPRINT_OK = 0x00
-    FINGERPRINT_PACKETRECIEVEERR = 0x01
-    FINGERPRINT_NOFINGER = 0x02
-    FINGERPRINT_IMAGEFAIL = 0x03
-    FINGERPRINT_IMAGEMESS = 0x06
-    FINGERPRINT_FEATUREFAIL = 0x07
-    FINGERPRINT_INVALIDIMAGE = 0x15
-    
-    # Package identifiers
-    FINGERPRINT_STARTCODE = 0xEF01
-    FINGERPRINT_COMMANDPACKET = 0x01
-    FINGERPRINT_DATAPACKET = 0x02
-    FINGERPRINT_ACKPACKET = 0x07
-    FINGERPRINT_ENDDATAPACKET = 0x08
+    VERBOSE = True
     
-    def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
-        """Initialize connection to R307 sensor"""
-        self.port = port
-        self.baud_rate = baud_rate
-        self.address = address
-        self.serial_conn = None
+    def wait_for_image(self, max_attempts=30):
+        """Poll for a finger with a short adaptive backoff (50 ms doubling to 200 ms)"""
+        print("Place finger on sensor...")
         
-    def connect_sensor(self):
-        """Establish serial connection to sensor"""
+        # get_image's per-poll messages would print up to three lines per attempt;
+        # report progress at most once a second instead
+        verbose = self.VERBOSE
+        self.VERBOSE = False
         try:
-            self.serial_conn = serial.Serial(
-                port=self.port,
-                baudrate=self.baud_rate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2
-            )
-            print(f"✅ Connected to R307 sensor on {self.port}")
-            return True
-        except serial.SerialException as e:
-            print(f"❌ Failed to connect to sensor: {e}")
+            delay = 0.05
+            next_report = time.monotonic() + 1.0
+            for attempt in range(max_attempts):
+                if self.get_image():
+                    if verbose:
+                        print("✅ Fingerprint image captured successfully")
+                    return True
+                if time.monotonic() >= next_report:
+                    print(f"Waiting for finger... (attempt {attempt + 1}/{max_attempts})")
+                    next_report += 1.0
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
             return False
-    
-    def disconnect(self):
-        """Close serial connection"""
-        if self.serial_conn and self.serial_conn.is_open:
-            self.serial_conn.close()
-            print("Disconnected from sensor")
-    
-    def _write_packet(self, packet_type, data):
-        """Write packet to sensor with proper header and checksum"""
-        packet = struct.pack('>H', self.FINGERPRINT_STARTCODE)
-        packet += struct.pack('>I', self.address)
-        packet += struct.pack('>B', packet_type)
-        packet += struct.pack('>H', len(data) + 2)
-        packet += data
-        
-        # Calculate checksum
-        checksum = packet_type + len(data) + 2 + sum(data)
-        packet += struct.pack('>H', checksum)
-        
-        self.serial_conn.write(packet)
-        
-    def _read_packet(self):
-        """Read response packet from sensor"""
-        # Read header
-        header = self.serial_conn.read(2)
-        if len(header) != 2:
-            return None, None
-            
-        start_code = struct.unpack('>H', header)[0]
-        if start_code != self.FINGERPRINT_STARTCODE:
-            return None, None
-        
-        # Read address
-        addr_data = self.serial_conn.read(4)
-        if len(addr_data) != 4:
-            return None, None
-        
-        # Read packet identifier
-        pid_data = self.serial_conn.read(1)
-        if len(pid_data) != 1:
-            return None, None
-        packet_type = struct.unpack('>B', pid_data)[0]
-        
-        # Read length
-        len_data = self.serial_conn.read(2)
-        if len(len_data) != 2:
-            return None, None
-        packet_len = struct.unpack('>H', len_data)[0]
-        
-        # Read data and checksum
-        data_and_checksum = self.serial_conn.read(packet_len)
-        if len(data_and_checksum) != packet_len:
-            return None, None
-        
-        data = data_and_checksum[:-2]
-        return packet_type, data
-    
-    def get_image(self):
-        """Capture fingerprint image from sensor"""
-        print("Place finger on sensor...")
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_GET_IMAGE]))
-        
-        packet_type, data = self._read_packet()
-        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
-            response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                print("✅ Fingerprint image captured successfully")
-                return True
-            elif response_code == self.FINGERPRINT_NOFINGER:
-                print("❌ No finger detected on sensor")
-                return False
-            elif response_code == self.FINGERPRINT_IMAGEFAIL:
-                print("❌ Failed to capture clear image")
-                return False
-            else:
-                print(f"❌ Image capture failed with code: {response_code}")
-                return False
-        return False
-    
-    def image_2_template(self, buffer_id=1):
-        """Convert captured image to template in specified buffer"""
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_IMG_2_TZ, buffer_id]))
-        
-        packet_type, data = self._read_packet()
-        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
-            response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                print(f"✅ Template generated in buffer {buffer_id}")
-                return True
-            elif response_code == self.FINGERPRINT_IMAGEMESS:
-                print("❌ Image too messy to generate template")
-                return False
-            elif response_code == self.FINGERPRINT_FEATUREFAIL:
-                print("❌ Could not identify fingerprint features")
-                return False
-            else:
-                print(f"❌ Template generation failed with code: {response_code}")
-                return False
-        return False
-    
-    def upload_template(self, buffer_id=1):
-        """Upload template from sensor buffer to computer"""
-        print(f"💾 Uploading template from buffer {buffer_id}...")
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_UP_CHAR, buffer_id]))
-        
-        # Read ACK packet
-        packet_type, data = self._read_packet()
-        if packet_type != self.FINGERPRINT_ACKPACKET or len(data) == 0 or data[0] != self.FINGERPRINT_OK:
-            print("❌ Failed to initiate template upload")
-            return None
-        
-        # Read template data packets
-        template_data = b''
-        while True:
-            packet_type, data = self._read_packet()
-            if packet_type == self.FINGERPRINT_DATAPACKET:
-                template_data += data
-            elif packet_type == self.FINGERPRINT_ENDDATAPACKET:
-                template_data += data
-                break
-            else:
-                print("❌ Unexpected packet type during template upload")
-                return None
-        
-        print(f"✅ Template uploaded successfully ({len(template_data)} bytes)")
-        return template_data
+        finally:
+            self.VERBOSE = verbose
     
     def capture_fingerprint_template(self, user_name, save_path="../../../dataset"):
         """Capture fingerprint template and save as .bin file"""
-        if not self.connect_sensor():
+        # Reuse an open connection (e.g. inside a with block), otherwise own it
+        owns_connection = not self.is_connected()
+        if owns_connection and not self.connect_sensor():
             return False
             
         try:
             print(f"\n=== Fingerprint Capture for {user_name} ===")
             
             # Step 1: Capture image
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                print(f"Attempt {attempt + 1}/{max_attempts}")
-                if self.get_image():
-                    break
-                time.sleep(0.5)
-            else:
+            if not self.wait_for_image():
                 print("❌ Failed to capture fingerprint image after multiple attempts")
                 return False
             
@@ -215,8 +70,7 @@ class R307FingerCapture:
             user_folder = os.path.join(save_path, user_name)
             
             # Ensure user folder exists
-            if not os.path.exists(user_folder):
-                os.makedirs(user_folder)
+            os.makedirs(user_folder, exist_ok=True)
             
             fingerprint_filename = "fingerprint.bin"
             fingerprint_path = os.path.join(user_folder, fingerprint_filename)
@@ -237,25 +91,21 @@ class R307FingerCapture:
             print(f"❌ Error during fingerprint capture: {e}")
             return False
         finally:
-            if self.serial_conn:
+            if owns_connection:
                 self.disconnect()
     
     def capture_fingerprint_template_data(self, user_name):
         """Capture fingerprint template and return binary data for MongoDB storage"""
-        if not self.connect_sensor():
+        # Reuse an open connection (e.g. inside a with block), otherwise own it
+        owns_connection = not self.is_connected()
+        if owns_connection and not self.connect_sensor():
             return None
             
         try:
             print(f"\n=== Fingerprint Capture for {user_name} ===")
             
             # Step 1: Capture image
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                print(f"Attempt {attempt + 1}/{max_attempts}")
-                if self.get_image():
-                    break
-                time.sleep(0.5)
-            else:
+            if not self.wait_for_image():
                 print("❌ Failed to capture fingerprint image after multiple attempts")
                 return None
             
@@ -277,7 +127,7 @@ class R307FingerCapture:
             print(f"❌ Error during fingerprint capture: {e}")
             return None
         finally:
-            if self.serial_conn:
+            if owns_connection:
                 self.disconnect()
     
     
@@ -286,16 +136,15 @@ class R307FingerCapture:
         user_info_path = os.path.join(user_folder, "user_info.txt")
         
         if os.path.exists(user_info_path):
-            # Read existing content
-            with open(user_info_path, 'r') as f:
-                content = f.read()
-            
-            # Add fingerprint info
-            with open(user_info_path, 'w') as f:
-                f.write(content)
-                f.write(f"Fingerprint: Captured\n")
-                f.write(f"Fingerprint Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Sensor: R307 on {self.port}\n")
+            captured_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Append fingerprint info without rewriting the existing content
+            with open(user_info_path, 'a') as f:
+                f.write(
+                    f"Fingerprint: Captured\n"
+                    f"Fingerprint Date: {captured_at}\n"
+                    f"Sensor: R307 on {self.port}\n"
+                )
 
 def main():
     """Test function for fingerprint capture"""
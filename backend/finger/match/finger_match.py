@@ -8,124 +8,41 @@ Hardware: R307 Fingerprint Sensor connected to COM3
 Author: Created for user authentication via fingerprint matching
 """
 
+import sys
 import serial
 import time
-import struct
+import asyncio
 import os
 from datetime import datetime
+from functools import lru_cache
 
-class R307FingerMatcher:
+try:
+    import serial_asyncio  # pyserial-asyncio, only needed by R307FingerMatcherAsync
+except ImportError:
+    serial_asyncio = None
+
+# Shared R307 protocol lives in backend/finger/r307.py
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from r307 import R307Base, _HEADER, _CHECKSUM
+
+@lru_cache(maxsize=64)
+def _read_template_file(filename, mtime):
+    """Read a template file; mtime is part of the cache key so re-enrollment invalidates it"""
+    with open(filename, 'rb') as f:
+        return f.read()
+
+class R307FingerMatcher(R307Base):
     """Interface for R307 fingerprint sensor real-time matching"""
     
-    # Command codes
-    CMD_GET_IMAGE = 0x01
-    CMD_IMG_2_TZ = 0x02
-    CMD_MATCH = 0x03
-    CMD_UP_CHAR = 0x08
-    CMD_DOWN_CHAR = 0x09
-    
-    # Response codes
-    FINGERPRINT_OK = 0x00
-    FINGERPRINT_PACKETRECIEVEERR = 0x01
-    FINGERPRINT_NOFINGER = 0x02
-    FINGERPRINT_IMAGEFAIL = 0x03
-    FINGERPRINT_IMAGEMESS = 0x06
-    FINGERPRINT_FEATUREFAIL = 0x07
-    FINGERPRINT_NOMATCH = 0x08
-    FINGERPRINT_INVALIDIMAGE = 0x15
-    
-    # Package identifiers
-    FINGERPRINT_STARTCODE = 0xEF01
-    FINGERPRINT_COMMANDPACKET = 0x01
-    FINGERPRINT_DATAPACKET = 0x02
-    FINGERPRINT_ACKPACKET = 0x07
-    FINGERPRINT_ENDDATAPACKET = 0x08
-    
-    def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
-        """Initialize connection to R307 sensor"""
-        self.port = port
-        self.baud_rate = baud_rate
-        self.address = address
-        self.serial_conn = None
-        
-    def connect(self):
-        """Establish serial connection to sensor"""
-        try:
-            self.serial_conn = serial.Serial(
-                port=self.port,
-                baudrate=self.baud_rate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2
-            )
-            print(f"✅ Connected to R307 sensor on {self.port}")
-            return True
-        except serial.SerialException as e:
-            print(f"❌ Failed to connect to sensor: {e}")
-            return False
-    
-    def disconnect(self):
-        """Close serial connection"""
-        if self.serial_conn and self.serial_conn.is_open:
-            self.serial_conn.close()
-            print("Disconnected from sensor")
-    
-    def _write_packet(self, packet_type, data):
-        """Write packet to sensor with proper header and checksum"""
-        packet = struct.pack('>H', self.FINGERPRINT_STARTCODE)
-        packet += struct.pack('>I', self.address)
-        packet += struct.pack('>B', packet_type)
-        packet += struct.pack('>H', len(data) + 2)
-        packet += data
-        
-        # Calculate checksum
-        checksum = packet_type + len(data) + 2 + sum(data)
-        packet += struct.pack('>H', checksum)
-        
-        self.serial_conn.write(packet)
-        
-    def _read_packet(self):
-        """Read response packet from sensor"""
-        # Read header
-        header = self.serial_conn.read(2)
-        if len(header) != 2:
-            return None, None
-            
-        start_code = struct.unpack('>H', header)[0]
-        if start_code != self.FINGERPRINT_STARTCODE:
-            return None, None
-        
-        # Read address
-        addr_data = self.serial_conn.read(4)
-        if len(addr_data) != 4:
-            return None, None
-        
-        # Read packet identifier
-        pid_data = self.serial_conn.read(1)
-        if len(pid_data) != 1:
-            return None, None
-        packet_type = struct.unpack('>B', pid_data)[0]
-        
-        # Read length
-        len_data = self.serial_conn.read(2)
-        if len(len_data) != 2:
-            return None, None
-        packet_len = struct.unpack('>H', len_data)[0]
-        
-        # Read data and checksum
-        data_and_checksum = self.serial_conn.read(packet_len)
-        if len(data_and_checksum) != packet_len:
-            return None, None
-        
-        data = data_and_checksum[:-2]
-        return packet_type, data
+    # Framed download streams keyed by (address, template), so re-authenticating
+    # the same user skips re-chunking and checksumming the template
+    _TEMPLATE_STREAMS = {}
+    TEMPLATE_STREAM_CACHE_SIZE = 64
     
     def load_template_file(self, filename):
         """Load template data from .bin file"""
         try:
-            with open(filename, 'rb') as f:
-                template_data = f.read()
+            template_data = _read_template_file(filename, os.path.getmtime(filename))
             print(f"✅ Loaded template: {filename} ({len(template_data)} bytes)")
             return template_data
         except FileNotFoundError:
@@ -140,7 +57,7 @@ class R307FingerMatcher:
         print(f"📥 Downloading template to buffer {buffer_id}...")
         
         # Send download command
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_DOWN_CHAR, buffer_id]))
+        self._send_command(self.CMD_DOWN_CHAR, buffer_id)
         
         # Read ACK packet
         packet_type, data = self._read_packet()
@@ -148,70 +65,63 @@ class R307FingerMatcher:
             print("❌ Failed to initiate template download")
             return False
         
-        # Send template data in packets
+        # Frame all template data packets and send them in a single write;
+        # the sensor does not acknowledge individual data packets
+        self.serial_conn.write(self._frame_template(template_data))
+        
+        print("✅ Template downloaded successfully")
+        return True
+    
+    def _frame_template(self, template_data):
+        """Framed data packet stream for a template, built once per (address, template)"""
+        key = (self.address, bytes(template_data))
+        stream = self._TEMPLATE_STREAMS.get(key)
+        if stream is None:
+            stream = bytes(self._pack_template(template_data))
+            if len(self._TEMPLATE_STREAMS) >= self.TEMPLATE_STREAM_CACHE_SIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._TEMPLATE_STREAMS[next(iter(self._TEMPLATE_STREAMS))]
+            self._TEMPLATE_STREAMS[key] = stream
+        return stream
+    
+    def _pack_template(self, template_data):
+        """Frame template data as data packets in the send buffer; returns a view of the stream"""
         chunk_size = 128  # Typical data packet size
         data_sent = 0
+        template_view = memoryview(template_data)  # slice chunks without copying
+        
+        # Pack every packet into the reusable send buffer
+        packet_count = -(-len(template_data) // chunk_size)
+        size = len(template_data) + packet_count * (_HEADER.size + _CHECKSUM.size)
+        if len(self._send_buffer) < size:
+            self._send_buffer = bytearray(size)
+        offset = 0
         
         while data_sent < len(template_data):
             chunk_end = min(data_sent + chunk_size, len(template_data))
-            chunk = template_data[data_sent:chunk_end]
+            chunk = template_view[data_sent:chunk_end]
             
             if chunk_end == len(template_data):
                 # Last packet - use end data packet type
-                self._write_packet(self.FINGERPRINT_ENDDATAPACKET, chunk)
+                offset = self._pack_packet(self._send_buffer, offset, self.FINGERPRINT_ENDDATAPACKET, chunk)
             else:
                 # Regular data packet
-                self._write_packet(self.FINGERPRINT_DATAPACKET, chunk)
+                offset = self._pack_packet(self._send_buffer, offset, self.FINGERPRINT_DATAPACKET, chunk)
             
             data_sent = chunk_end
         
-        print("✅ Template downloaded successfully")
-        return True
-    
-    def get_image(self):
-        """Capture fingerprint image from sensor"""
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_GET_IMAGE]))
-        
-        packet_type, data = self._read_packet()
-        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
-            response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                return True
-            elif response_code == self.FINGERPRINT_NOFINGER:
-                return False
-            elif response_code == self.FINGERPRINT_IMAGEFAIL:
-                return False
-            else:
-                return False
-        return False
-    
-    def image_2_template(self, buffer_id=2):
-        """Convert captured image to template in specified buffer"""
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_IMG_2_TZ, buffer_id]))
-        
-        packet_type, data = self._read_packet()
-        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
-            response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                return True
-            elif response_code == self.FINGERPRINT_IMAGEMESS:
-                return False
-            elif response_code == self.FINGERPRINT_FEATUREFAIL:
-                return False
-            else:
-                return False
-        return False
+        return memoryview(self._send_buffer)[:offset]
     
     def match_templates(self):
         """Match templates in buffer 1 and buffer 2"""
-        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_MATCH]))
+        self._send_command(self.CMD_MATCH)
         
         packet_type, data = self._read_packet()
         if packet_type == self.FINGERPRINT_ACKPACKET and len(data) >= 3:
             response_code = data[0]
             if response_code == self.FINGERPRINT_OK:
                 # Extract confidence score
-                confidence = struct.unpack('>H', data[1:3])[0]
+                confidence = int.from_bytes(data[1:3], 'big')
                 return True, confidence
             elif response_code == self.FINGERPRINT_NOMATCH:
                 return False, 0
@@ -221,8 +131,9 @@ class R307FingerMatcher:
     
     def capture_and_get_template(self):
         """Capture fingerprint and return template data for SHA-256 key generation"""
-        # Connect to sensor
-        if not self.connect():
+        # Reuse an open connection (e.g. inside a with block), otherwise own it
+        owns_connection = not self.is_connected()
+        if owns_connection and not self.connect():
             return False, None, "Failed to connect to fingerprint sensor"
         
         try:
@@ -247,65 +158,25 @@ class R307FingerMatcher:
                 
                 # Upload template from buffer 1 to get template data
                 print("📤 Reading template data from sensor...")
+                template_data = self.upload_template(buffer_id=1)
+                if template_data is None:
+                    continue
                 
-                # Send upload command to get template data from buffer 1
-                cmd = struct.pack('>BH', self.CMD_UP_CHAR, 1)  # Buffer 1
-                self._write_packet(self.FINGERPRINT_COMMANDPACKET, cmd)
-                
-                # Read acknowledgment packet first
-                ack_packet = self._read_packet()
-                if ack_packet and len(ack_packet) > 0 and ack_packet[0] == self.FINGERPRINT_OK:
-                    print("✅ Sensor ready to send template data")
-                    
-                    # Now read the actual template data packets
-                    template_data = b''
-                    packet_count = 0
-                    expected_size = 512  # Standard R307 template size
-                    
-                    while packet_count < 20 and len(template_data) < expected_size:  # Safety limit
-                        try:
-                            # Read data packet
-                            data_packet = self._read_packet()
-                            if data_packet is None:
-                                print(f"No more data packets received after {packet_count} packets")
-                                break
-                                
-                            # Add the packet data
-                            if isinstance(data_packet, bytes) and len(data_packet) > 0:
-                                template_data += data_packet
-                                packet_count += 1
-                                print(f"Packet {packet_count}: {len(data_packet)} bytes (total: {len(template_data)})")
-                                
-                                # Check if we have complete template
-                                if len(template_data) >= expected_size:
-                                    print("Template data complete")
-                                    break
-                            else:
-                                print(f"Invalid packet data: {type(data_packet)}")
-                                break
-                                
-                        except Exception as e:
-                            print(f"Error reading packet {packet_count}: {e}")
-                            break
-                    
-                    # Validate and normalize template data
-                    if len(template_data) >= 200:  # Minimum reasonable template size
-                        # Ensure consistent size for SHA-256 key generation
-                        if len(template_data) > expected_size:
-                            template_data = template_data[:expected_size]
-                        elif len(template_data) < expected_size:
-                            # Pad with zeros to ensure consistent size
-                            template_data += b'\x00' * (expected_size - len(template_data))
-                            
-                        print(f"✅ Template captured successfully ({len(template_data)} bytes)")
-                        print(f"Template preview: {template_data[:20].hex()}...")
-                        return True, template_data, "Template captured successfully"
-                    else:
-                        print(f"❌ Template data too small: {len(template_data)} bytes")
-                        continue
+                # Validate and normalize template data
+                expected_size = 512  # Standard R307 template size
+                if len(template_data) >= 200:  # Minimum reasonable template size
+                    # Ensure consistent size for SHA-256 key generation
+                    if len(template_data) > expected_size:
+                        template_data = template_data[:expected_size]
+                    elif len(template_data) < expected_size:
+                        # Pad with zeros to ensure consistent size
+                        template_data += bytes(expected_size - len(template_data))
+                        
+                    print(f"✅ Template captured successfully ({len(template_data)} bytes)")
+                    print(f"Template preview: {template_data[:20].hex()}...")
+                    return True, template_data, "Template captured successfully"
                 else:
-                    error_code = ack_packet[0] if ack_packet and len(ack_packet) > 0 else "unknown"
-                    print(f"❌ Template upload failed with error code: {error_code}")
+                    print(f"❌ Template data too small: {len(template_data)} bytes")
                     continue
             
             return False, None, f"Failed to capture template after {max_attempts} attempts"
@@ -314,12 +185,14 @@ class R307FingerMatcher:
             print(f"❌ Template capture error: {e}")
             return False, None, f"Template capture error: {str(e)}"
         finally:
-            self.disconnect()
+            if owns_connection:
+                self.disconnect()
     
     def authenticate_user_with_template(self, username, template_data):
         """Authenticate user by matching live fingerprint with provided template data"""
-        # Connect to sensor
-        if not self.connect():
+        # Reuse an open connection (e.g. inside a with block), otherwise own it
+        owns_connection = not self.is_connected()
+        if owns_connection and not self.connect():
             return False, 0, "Failed to connect to fingerprint sensor"
         
         try:
@@ -360,7 +233,180 @@ class R307FingerMatcher:
         except Exception as e:
             return False, 0, f"Error during authentication: {str(e)}"
         finally:
-            self.disconnect()
+            if owns_connection:
+                self.disconnect()
+
+class R307FingerMatcherAsync(R307FingerMatcher):
+    """asyncio variant of R307FingerMatcher so sensor waits do not block the event loop
+    
+    Packet framing is shared with R307FingerMatcher; only the serial I/O and the
+    retry sleeps are awaited. Requires pyserial-asyncio.
+    """
+    
+    READ_TIMEOUT = 2  # seconds, same as the synchronous serial timeout
+    
+    def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
+        super().__init__(port, baud_rate, address)
+        self._reader = None
+        self._writer = None
+    
+    async def connect(self):
+        """Open the serial port as an asyncio stream pair (no-op if already open)"""
+        if self.is_connected():
+            return True
+        if serial_asyncio is None:
+            print("❌ pyserial-asyncio is not installed")
+            return False
+        
+        try:
+            self._reader, self._writer = await serial_asyncio.open_serial_connection(
+                url=self.port,
+                baudrate=self.baud_rate,
+                bytesize=serial.EIGHTBITS,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE
+            )
+            print(f"✅ Connected to R307 sensor on {self.port}")
+            return True
+        except serial.SerialException as e:
+            print(f"❌ Failed to connect to sensor: {e}")
+            return False
+    
+    def is_connected(self):
+        """Check whether the stream pair is open"""
+        return self._writer is not None and not self._writer.is_closing()
+    
+    async def __aenter__(self):
+        if not await self.connect():
+            raise serial.SerialException(f"Could not open R307 sensor on {self.port}")
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+        return False
+    
+    async def disconnect(self):
+        """Close the serial stream"""
+        if self.is_connected():
+            self._writer.close()
+            print("Disconnected from sensor")
+        self._reader = self._writer = None
+    
+    async def _write(self, data):
+        """Queue data on the transport and wait until it has been flushed"""
+        self._writer.write(data)
+        await self._writer.drain()
+    
+    async def _send_command(self, *payload):
+        """Send a command packet, reusing pre-framed bytes for repeated commands"""
+        key = (self.address, payload)
+        packet = self._COMMAND_PACKETS.get(key)
+        if packet is None:
+            packet = bytes(self._build_packet(self.FINGERPRINT_COMMANDPACKET, bytes(payload)))
+            self._COMMAND_PACKETS[key] = packet
+        await self._write(packet)
+    
+    async def _read_packet(self):
+        """Read response packet from sensor"""
+        try:
+            # One timeout bounds the whole packet
+            return await asyncio.wait_for(self._read_packet_unbounded(), self.READ_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return None, None
+    
+    async def _read_packet_unbounded(self):
+        """Read one packet, waiting as long as it takes"""
+        header = await self._reader.readexactly(_HEADER.size)
+        start_code, _, packet_type, packet_len = _HEADER.unpack(header)
+        if start_code != self.FINGERPRINT_STARTCODE:
+            return None, None
+        
+        data_and_checksum = await self._reader.readexactly(packet_len)
+        return packet_type, data_and_checksum[:-2]
+    
+    async def _command_ok(self, *payload):
+        """Send a command and report whether the sensor acknowledged it with FINGERPRINT_OK"""
+        await self._send_command(*payload)
+        packet_type, data = await self._read_packet()
+        return packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0 and data[0] == self.FINGERPRINT_OK
+    
+    async def download_template(self, template_data, buffer_id=1):
+        """Download template data to sensor buffer"""
+        print(f"📥 Downloading template to buffer {buffer_id}...")
+        
+        if not await self._command_ok(self.CMD_DOWN_CHAR, buffer_id):
+            print("❌ Failed to initiate template download")
+            return False
+        
+        await self._write(self._frame_template(template_data))
+        
+        print("✅ Template downloaded successfully")
+        return True
+    
+    async def get_image(self):
+        """Capture fingerprint image from sensor"""
+        return await self._command_ok(self.CMD_GET_IMAGE)
+    
+    async def image_2_template(self, buffer_id=2):
+        """Convert captured image to template in specified buffer"""
+        return await self._command_ok(self.CMD_IMG_2_TZ, buffer_id)
+    
+    async def match_templates(self):
+        """Match templates in buffer 1 and buffer 2"""
+        await self._send_command(self.CMD_MATCH)
+        
+        packet_type, data = await self._read_packet()
+        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) >= 3 and data[0] == self.FINGERPRINT_OK:
+            return True, int.from_bytes(data[1:3], 'big')
+        return False, 0
+    
+    async def authenticate_user_with_template(self, username, template_data):
+        """Authenticate user by matching live fingerprint with provided template data"""
+        # Reuse an open connection (e.g. inside an async with block), otherwise own it
+        owns_connection = not self.is_connected()
+        if owns_connection and not await self.connect():
+            return False, 0, "Failed to connect to fingerprint sensor"
+        
+        try:
+            # Download stored template to buffer 1
+            if not await self.download_template(template_data, buffer_id=1):
+                return False, 0, "Failed to download template to sensor"
+            
+            print("👆 Place your finger on the sensor for authentication...")
+            
+            # Try to capture and match fingerprint (with retries)
+            max_attempts = 5
+            for attempt in range(max_attempts):
+                print(f"Attempt {attempt + 1}/{max_attempts}")
+                
+                # Capture live fingerprint
+                if not await self.get_image():
+                    print("❌ No finger detected, please place finger on sensor")
+                    await asyncio.sleep(1)
+                    continue
+                
+                # Convert live image to template in buffer 2 (temporary, not stored)
+                if not await self.image_2_template(buffer_id=2):
+                    print("❌ Failed to generate template from live image")
+                    await asyncio.sleep(1)
+                    continue
+                
+                # Perform matching inside the sensor
+                match_result, confidence = await self.match_templates()
+                
+                if match_result:
+                    return True, confidence, f"Authentication successful! Confidence: {confidence}"
+                else:
+                    print(f"❌ No match (attempt {attempt + 1})")
+                    await asyncio.sleep(1)
+            
+            return False, 0, "Authentication failed after multiple attempts"
+            
+        except Exception as e:
+            return False, 0, f"Error during authentication: {str(e)}"
+        finally:
+            if owns_connection:
+                await self.disconnect()
 
 def get_registered_users(dataset_path="../../../dataset"):
     """Get list of registered users from dataset folder"""
@@ -369,13 +415,14 @@ def get_registered_users(dataset_path="../../../dataset"):
             return []
         
         users = []
-        for item in os.listdir(dataset_path):
-            user_path = os.path.join(dataset_path, item)
-            if os.path.isdir(user_path):
-                # Check if user has fingerprint file
-                fingerprint_file = os.path.join(user_path, "fingerprint.bin")
-                if os.path.exists(fingerprint_file):
-                    users.append(item)
+        with os.scandir(dataset_path) as entries:
+            for entry in entries:
+                # DirEntry.is_dir() uses the directory listing, no extra stat
+                if entry.is_dir():
+                    # Check if user has fingerprint file
+                    fingerprint_file = os.path.join(entry.path, "fingerprint.bin")
+                    if os.path.exists(fingerprint_file):
+                        users.append(entry.name)
         
         return users
     except Exception as e:
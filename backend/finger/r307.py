@@ -0,0 +1,291 @@
+# R307 Fingerprint Sensor Protocol
+# Serial connection, packet framing and the commands shared by capture and matching
+
+import serial
+import time
+import struct
+import logging
+import numpy as np
+
+# Per-packet tracing goes through logging so it costs nothing unless enabled
+logger = logging.getLogger(__name__)
+
+# Packet layout: start code, address, packet type, length (data + checksum)
+_HEADER = struct.Struct('>HIBH')
+_CHECKSUM = struct.Struct('>H')
+
+# Data packets are summed with NumPy; tiny command payloads stay on the builtin sum
+_VECTOR_SUM_MIN_BYTES = 64
+
+def _byte_sum(data):
+    """Sum of the byte values in data"""
+    if len(data) >= _VECTOR_SUM_MIN_BYTES:
+        return int(np.frombuffer(data, dtype=np.uint8).sum(dtype=np.uint32))
+    return sum(data)
+
+class R307Base:
+    """Serial protocol for the R307 fingerprint sensor, shared by capture and matching"""
+    
+    # Command codes
+    CMD_GET_IMAGE = 0x01
+    CMD_IMG_2_TZ = 0x02
+    CMD_MATCH = 0x03
+    CMD_UP_CHAR = 0x08
+    CMD_DOWN_CHAR = 0x09
+    CMD_TEMPLATE_NUM = 0x1D
+    
+    # Response codes
+    FINGERPRINT_OK = 0x00
+    FINGERPRINT_PACKETRECIEVEERR = 0x01
+    FINGERPRINT_NOFINGER = 0x02
+    FINGERPRINT_IMAGEFAIL = 0x03
+    FINGERPRINT_IMAGEMESS = 0x06
+    FINGERPRINT_FEATUREFAIL = 0x07
+    FINGERPRINT_NOMATCH = 0x08
+    FINGERPRINT_INVALIDIMAGE = 0x15
+    
+    # Package identifiers
+    FINGERPRINT_STARTCODE = 0xEF01
+    FINGERPRINT_COMMANDPACKET = 0x01
+    FINGERPRINT_DATAPACKET = 0x02
+    FINGERPRINT_ACKPACKET = 0x07
+    FINGERPRINT_ENDDATAPACKET = 0x08
+    
+    # Framed command packets keyed by (address, payload), built once per process
+    _COMMAND_PACKETS = {}
+    
+    # Print per-step progress from get_image / image_2_template / upload_template
+    VERBOSE = False
+    
+    # Rates tried on connect: the factory default and the fast rate test/real_time_match.py can set
+    # (the sensor keeps its baud setting across power cycles)
+    PROBE_BAUD_RATES = (57600, 115200)
+    PROBE_TIMEOUT = 0.5  # seconds to wait for the sensor at each probed rate
+    
+    def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
+        """Initialize connection to R307 sensor"""
+        self.port = port
+        self.baud_rate = baud_rate
+        self.address = address
+        self.serial_conn = None
+        self._send_buffer = bytearray(64)  # reused by _write_packet, grown on demand
+        
+    def connect(self):
+        """Establish serial connection to sensor (no-op if already open)"""
+        if self.is_connected():
+            return True
+        
+        try:
+            self.serial_conn = serial.Serial(
+                port=self.port,
+                baudrate=self.baud_rate,
+                bytesize=serial.EIGHTBITS,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                timeout=2
+            )
+            
+            # Windows only: larger driver buffers so whole template uploads are queued
+            if hasattr(self.serial_conn, 'set_buffer_size'):
+                self.serial_conn.set_buffer_size(rx_size=65536, tx_size=4096)
+            
+            if not self._probe_baud():
+                print(f"⚠️ Sensor on {self.port} did not answer at {self.PROBE_BAUD_RATES} baud")
+            print(f"✅ Connected to R307 sensor on {self.port} ({self.baud_rate} baud)")
+            return True
+        except serial.SerialException as e:
+            print(f"❌ Failed to connect to sensor: {e}")
+            return False
+    
+    def _probe_baud(self):
+        """Switch the open port to the rate the sensor answers at, trying the configured one first"""
+        rates = [self.baud_rate] + [rate for rate in self.PROBE_BAUD_RATES if rate != self.baud_rate]
+        timeout = self.serial_conn.timeout
+        self.serial_conn.timeout = self.PROBE_TIMEOUT
+        try:
+            for rate in rates:
+                self.serial_conn.baudrate = rate
+                self.serial_conn.reset_input_buffer()
+                self._send_command(self.CMD_TEMPLATE_NUM)
+                packet_type, data = self._read_packet()
+                if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0 and data[0] == self.FINGERPRINT_OK:
+                    self.baud_rate = rate
+                    return True
+            
+            # Nothing answered (sensor unplugged or busy); keep the configured rate
+            self.serial_conn.baudrate = self.baud_rate
+            return False
+        finally:
+            self.serial_conn.timeout = timeout
+    
+    def connect_sensor(self):
+        """Alias of connect() kept for the capture API"""
+        return self.connect()
+    
+    def is_connected(self):
+        """Check whether the serial port is open"""
+        return self.serial_conn is not None and self.serial_conn.is_open
+    
+    def __enter__(self):
+        """Open the sensor once for a sequence of operations"""
+        if not self.connect():
+            raise serial.SerialException(f"Could not open R307 sensor on {self.port}")
+        self.serial_conn.reset_input_buffer()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+        return False
+    
+    def disconnect(self):
+        """Close serial connection"""
+        if self.serial_conn and self.serial_conn.is_open:
+            self.serial_conn.close()
+            print("Disconnected from sensor")
+    
+    def _write_packet(self, packet_type, data):
+        """Write packet to sensor with proper header and checksum"""
+        size = _HEADER.size + len(data) + _CHECKSUM.size
+        if len(self._send_buffer) < size:
+            self._send_buffer = bytearray(size)
+        
+        self._pack_packet(self._send_buffer, 0, packet_type, data)
+        self.serial_conn.write(memoryview(self._send_buffer)[:size])
+    
+    def _build_packet(self, packet_type, data):
+        """Frame data with header and checksum"""
+        packet = bytearray(_HEADER.size + len(data) + _CHECKSUM.size)
+        self._pack_packet(packet, 0, packet_type, data)
+        return packet
+    
+    def _pack_packet(self, buffer, offset, packet_type, data):
+        """Frame data into buffer at offset; returns the offset just past the packet"""
+        length = len(data) + 2
+        _HEADER.pack_into(buffer, offset, self.FINGERPRINT_STARTCODE, self.address, packet_type, length)
+        start = offset + _HEADER.size
+        buffer[start:start + len(data)] = data
+        
+        # Calculate checksum
+        checksum = (packet_type + length + _byte_sum(data)) & 0xFFFF
+        _CHECKSUM.pack_into(buffer, start + len(data), checksum)
+        
+        return start + length
+        
+    def _read_exact(self, size, deadline):
+        """Read size bytes in one call once buffered; returns a short read if the deadline passes"""
+        while self.serial_conn.in_waiting < size and time.monotonic() < deadline:
+            time.sleep(0.001)
+        
+        # Never block past the deadline: take only what has arrived
+        return self.serial_conn.read(min(size, self.serial_conn.in_waiting))
+    
+    def _send_command(self, *payload):
+        """Send a command packet, reusing pre-framed bytes for repeated commands"""
+        key = (self.address, payload)
+        packet = self._COMMAND_PACKETS.get(key)
+        if packet is None:
+            packet = bytes(self._build_packet(self.FINGERPRINT_COMMANDPACKET, bytes(payload)))
+            self._COMMAND_PACKETS[key] = packet
+        self.serial_conn.write(packet)
+    
+    def _read_packet(self):
+        """Read response packet from sensor"""
+        # One deadline bounds the whole packet instead of one timeout per read
+        deadline = time.monotonic() + self.serial_conn.timeout
+        
+        # Read the fixed-size header (start code, address, type, length) in one call
+        header = self._read_exact(_HEADER.size, deadline)
+        if len(header) != _HEADER.size:
+            return None, None
+        
+        start_code, _, packet_type, packet_len = _HEADER.unpack(header)
+        if start_code != self.FINGERPRINT_STARTCODE:
+            return None, None
+        
+        # Read data and checksum
+        data_and_checksum = self._read_exact(packet_len, deadline)
+        if len(data_and_checksum) != packet_len:
+            return None, None
+        
+        data = data_and_checksum[:-2]
+        return packet_type, data
+    
+    def get_image(self):
+        """Capture fingerprint image from sensor"""
+        if self.VERBOSE:
+            print("Place finger on sensor...")
+        self._send_command(self.CMD_GET_IMAGE)
+        
+        packet_type, data = self._read_packet()
+        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
+            response_code = data[0]
+            if response_code == self.FINGERPRINT_OK:
+                if self.VERBOSE:
+                    print("✅ Fingerprint image captured successfully")
+                return True
+            if self.VERBOSE:
+                if response_code == self.FINGERPRINT_NOFINGER:
+                    print("❌ No finger detected on sensor")
+                elif response_code == self.FINGERPRINT_IMAGEFAIL:
+                    print("❌ Failed to capture clear image")
+                else:
+                    print(f"❌ Image capture failed with code: {response_code}")
+        return False
+    
+    def image_2_template(self, buffer_id=1):
+        """Convert captured image to template in specified buffer"""
+        self._send_command(self.CMD_IMG_2_TZ, buffer_id)
+        
+        packet_type, data = self._read_packet()
+        if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
+            response_code = data[0]
+            if response_code == self.FINGERPRINT_OK:
+                if self.VERBOSE:
+                    print(f"✅ Template generated in buffer {buffer_id}")
+                return True
+            if self.VERBOSE:
+                if response_code == self.FINGERPRINT_IMAGEMESS:
+                    print("❌ Image too messy to generate template")
+                elif response_code == self.FINGERPRINT_FEATUREFAIL:
+                    print("❌ Could not identify fingerprint features")
+                else:
+                    print(f"❌ Template generation failed with code: {response_code}")
+        return False
+    
+    def upload_template(self, buffer_id=1):
+        """Upload template from sensor buffer to computer"""
+        if self.VERBOSE:
+            print(f"💾 Uploading template from buffer {buffer_id}...")
+        self._send_command(self.CMD_UP_CHAR, buffer_id)
+        
+        # Read ACK packet
+        packet_type, data = self._read_packet()
+        if packet_type != self.FINGERPRINT_ACKPACKET or len(data) == 0 or data[0] != self.FINGERPRINT_OK:
+            error_code = data[0] if data else "unknown"
+            print(f"❌ Template upload failed with error code: {error_code}")
+            return None
+        
+        # Read template data packets into a growable buffer
+        template_data = bytearray()
+        packet_count = 0
+        started = time.perf_counter()
+        while True:
+            packet_type, data = self._read_packet()
+            if packet_type == self.FINGERPRINT_DATAPACKET:
+                template_data.extend(data)
+            elif packet_type == self.FINGERPRINT_ENDDATAPACKET:
+                template_data.extend(data)
+                packet_count += 1
+                break
+            else:
+                print("❌ Unexpected packet type during template upload")
+                return None
+            packet_count += 1
+            logger.debug("Packet %d: %d bytes", packet_count, len(data))
+        
+        logger.info("Template %d B in %d packets in %.1f ms",
+                    len(template_data), packet_count, (time.perf_counter() - started) * 1000)
+        
+        if self.VERBOSE:
+            print(f"✅ Template uploaded successfully ({len(template_data)} bytes)")
+        return bytes(template_data)
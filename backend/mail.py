@@ -5,10 +5,106 @@ Handles email notifications using Mailjet API for registration and login events
 """
 
 import os
+import re
+import gzip
+import base64
+import logging
+import sqlite3
 import sys
+import time
+import asyncio
+import threading
+from string import Template
+from html.parser import HTMLParser
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
+from contextlib import closing
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import json
 
+try:
+    import aiohttp  # optional, only needed by EmailService.asend_email
+except ImportError:
+    aiohttp = None
+
+try:
+    import orjson  # optional, faster JSON encoding of the HTML-heavy payloads
+except ImportError:
+    orjson = None
+
+def _dumps(payload):
+    """Serialize a request payload to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+def _compress(body):
+    """Gzip a request body; level 1 already shrinks the repetitive HTML/CSS by ~70%"""
+    return gzip.compress(body, compresslevel=1)
+
+# Headers for the JSON request bodies posted to Mailjet
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+_JSON_GZIP_HEADERS = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+
+# Gzip request bodies only when MAILJET_GZIP=1: not every endpoint accepts compressed
+# uploads, and a rejected body (4xx) is not retried
+MAILJET_GZIP = os.environ.get('MAILJET_GZIP') == '1'
+
+def _request_body(payload):
+    """Encode a request payload; returns (body, headers)"""
+    body = _dumps(payload)
+    if MAILJET_GZIP:
+        return _compress(body), _JSON_GZIP_HEADERS
+    return body, _JSON_HEADERS
+
+def _loads(content):
+    """Parse a JSON response body"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+try:
+    from email_validator import validate_email, EmailNotValidError  # optional
+except ImportError:
+    validate_email = None
+
+# Fallback syntax check when email_validator is not installed
+_EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+@lru_cache(maxsize=1024)
+def _is_valid_address(address):
+    """Local syntax check of an email address, so bad input never costs a Mailjet request"""
+    if not isinstance(address, str):
+        return False
+    if validate_email is not None:
+        try:
+            validate_email(address, check_deliverability=False)
+            return True
+        except EmailNotValidError:
+            return False
+    return _EMAIL_PATTERN.match(address) is not None
+
+def _is_connection_error(error):
+    """True for failures to reach Mailjet at all (safe to resend), e.g. refused connections or connect timeouts"""
+    try:
+        import requests
+    except ImportError:
+        return False
+    # ConnectTimeout subclasses ConnectionError; ReadTimeout does not
+    return isinstance(error, requests.exceptions.ConnectionError)
+
+def _invalid_address_result(recipients):
+    """Failure result for the first invalid recipient, or None if all are valid"""
+    for address, _ in recipients:
+        if not _is_valid_address(address):
+            print(f"[ERROR] Invalid email address: {address}")
+            return {
+                "success": False,
+                "error": f"Invalid address: {address}"
+            }
+    return None
+
 # Import email configuration
 try:
     from email_config import (
@@ -35,17 +131,410 @@ except ImportError:
     EMAIL_FAIL_SILENTLY = True
     print("[WARN] Email configuration not found. Using default settings.")
 
+def _minify_html(html):
+    """Drop source indentation and line breaks from an HTML template"""
+    # Whitespace that spans a line break between two tags is only layout
+    html = re.sub(r'>\s*\n\s*<', '><', html)
+    # Any other run of whitespace renders as a single space
+    return re.sub(r'\s+', ' ', html).strip()
+
+# Notification bodies, compiled once at import; send methods only substitute values
+_REGISTRATION_HTML = Template(_minify_html("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
+        .feature { background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea; }
+        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
+        .button { display: inline-block; background: #667eea; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; margin: 10px 0; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🔐 Welcome to Biometric Authentication!</h1>
+            <p>Your secure account has been created successfully</p>
+        </div>
+        
+        <div class="content">
+            <h2>Hello ${user_name}! 👋</h2>
+            
+            <p>Congratulations! Your biometric authentication account has been successfully created on <strong>${formatted_time}</strong>.</p>
+            
+            <div class="feature">
+                <h3>🎯 What's Next?</h3>
+                <p>Complete your biometric enrollment to unlock full security features:</p>
+                <ul>
+                    <li><strong>📷 Face Recognition:</strong> Enroll your face for automatic identification</li>
+                    <li><strong>👆 Fingerprint:</strong> Register your fingerprint with our R307 sensor</li>
+                    <li><strong>🔒 Dual Authentication:</strong> Enjoy maximum security with combined biometrics</li>
+                </ul>
+            </div>
+            
+            <div class="feature">
+                <h3>🛡️ Security Features</h3>
+                <ul>
+                    <li>Advanced face recognition with 6000+ feature points</li>
+                    <li>Professional R307 fingerprint sensor integration</li>
+                    <li>Cloud-secure MongoDB Atlas database</li>
+                    <li>Real-time biometric processing</li>
+                </ul>
+            </div>
+            
+            <div class="feature">
+                <h3>📊 Your Account Details</h3>
+                <p><strong>Name:</strong> ${user_name}</p>
+                <p><strong>Email:</strong> ${user_email}</p>
+                <p><strong>Registration Date:</strong> ${formatted_time}</p>
+                <p><strong>Status:</strong> Active (Enrollment Pending)</p>
+            </div>
+            
+            <p>Thank you for choosing our advanced biometric authentication system. Your security is our priority!</p>
+        </div>
+        
+        <div class="footer">
+            <p>This email was sent from Biometric Authentication System</p>
+            <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""))
+
+_LOGIN_HTML = Template(_minify_html("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
+        .alert-box { background: #e8f5e8; border: 1px solid #4caf50; padding: 20px; border-radius: 8px; margin: 20px 0; }
+        .info-box { background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #4facfe; }
+        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
+        .success { color: #4caf50; font-weight: bold; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🔐 Login Notification</h1>
+            <p>Secure access to your biometric account</p>
+        </div>
+        
+        <div class="content">
+            <div class="alert-box">
+                <h2 class="success">✅ Successful Login Detected</h2>
+                <p>Hello <strong>${user_name}</strong>! We detected a successful login to your biometric authentication account.</p>
+            </div>
+            
+            <div class="info-box">
+                <h3>📊 Login Details</h3>
+                <p><strong>User:</strong> ${user_name}</p>
+                <p><strong>Email:</strong> ${user_email}</p>
+                <p><strong>Login Time:</strong> ${formatted_time}</p>
+                <p><strong>Authentication Method:</strong> ${login_method}${confidence_text}</p>
+                <p><strong>Status:</strong> <span class="success">Authentication Successful</span></p>
+            </div>
+            
+            <div class="info-box">
+                <h3>🛡️ Security Information</h3>
+                <p>Your account was accessed using our advanced biometric authentication system:</p>
+                <ul>
+                    <li>Face recognition with advanced feature matching</li>
+                    <li>R307 fingerprint sensor verification</li>
+                    <li>Real-time biometric processing</li>
+                    <li>Secure cloud database authentication</li>
+                </ul>
+            </div>
+            
+            <div class="info-box">
+                <h3>⚠️ Security Notice</h3>
+                <p>If this login was not initiated by you, please contact system administrator immediately. Our biometric system provides high-security authentication, but we recommend monitoring your account activity.</p>
+            </div>
+            
+            <p>Thank you for using our secure biometric authentication system!</p>
+        </div>
+        
+        <div class="footer">
+            <p>This is an automated security notification from Biometric Authentication System</p>
+            <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""))
+
+_ENROLLMENT_HTML = Template(_minify_html("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
+        .success-box { background: #e8f5e8; border: 1px solid #4caf50; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center; }
+        .info-box { background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #11998e; }
+        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
+        .success { color: #4caf50; font-weight: bold; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎉 Enrollment Complete!</h1>
+            <p>Your biometric security is now active</p>
+        </div>
+        
+        <div class="content">
+            <div class="success-box">
+                <h2 class="success">✅ ${enrollment_type} Enrollment Successful!</h2>
+                <p>Congratulations <strong>${user_name}</strong>! Your biometric enrollment has been completed successfully.</p>
+            </div>
+            
+            <div class="info-box">
+                <h3>📊 Enrollment Details</h3>
+                <p><strong>User:</strong> ${user_name}</p>
+                <p><strong>Email:</strong> ${user_email}</p>
+                <p><strong>Completion Time:</strong> ${formatted_time}</p>
+                <p><strong>Enrollment Type:</strong> ${enrollment_type}</p>
+                <p><strong>Security Level:</strong> <span class="success">High Security Active</span></p>
+            </div>
+            
+            <div class="info-box">
+                <h3>🔐 Your Security Features</h3>
+                <ul>
+                    <li><strong>Advanced Face Recognition:</strong> 6000+ feature point matching</li>
+                    <li><strong>Fingerprint Authentication:</strong> R307 sensor with template matching</li>
+                    <li><strong>Dual Biometric Verification:</strong> Maximum security protection</li>
+                    <li><strong>Real-time Processing:</strong> Instant authentication</li>
+                    <li><strong>Cloud Security:</strong> Encrypted MongoDB Atlas storage</li>
+                </ul>
+            </div>
+            
+            <div class="info-box">
+                <h3>🚀 Ready to Login</h3>
+                <p>Your account is now ready for secure biometric login:</p>
+                <ol>
+                    <li>Click "Login" on the application</li>
+                    <li>Look at the camera for face recognition</li>
+                    <li>Confirm your identity</li>
+                    <li>Place finger on R307 sensor</li>
+                    <li>Access your secure dashboard</li>
+                </ol>
+            </div>
+            
+            <p>Welcome to the future of secure authentication!</p>
+        </div>
+        
+        <div class="footer">
+            <p>Biometric Authentication System - Your Security, Our Priority</p>
+            <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""))
+
+_MONTHS = ("January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December")
+
+def _format_time(moment):
+    """Same output as moment.strftime("%B %d, %Y at %I:%M %p"), without parsing a format string"""
+    hour = (moment.hour - 1) % 12 + 1
+    meridiem = "AM" if moment.hour < 12 else "PM"
+    return f"{_MONTHS[moment.month - 1]} {moment.day:02d}, {moment.year} at {hour:02d}:{moment.minute:02d} {meridiem}"
+
+_RENDER_CACHE_SIZE = 256
+
+class _TextExtractor(HTMLParser):
+    """Collects the readable text of an HTML email, one block element per line"""
+    
+    # Line break before these elements; a blank line before sections and headings
+    LINE_TAGS = {'br', 'li', 'ol', 'p', 'ul'}
+    PARAGRAPH_TAGS = {'div', 'h1', 'h2', 'h3'}
+    SKIP_TAGS = {'head', 'script', 'style'}
+    
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip_depth = 0
+        self._pending_break = 0
+    
+    def _break(self, lines):
+        self._pending_break = max(self._pending_break, lines)
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in self.LINE_TAGS:
+            self._break(1)
+            if tag == 'li':
+                self.parts.append(('- ', self._pending_break))
+                self._pending_break = 0
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth -= 1
+        elif tag == 'div':
+            self._break(2)
+        elif tag in self.PARAGRAPH_TAGS or tag in self.LINE_TAGS:
+            self._break(1)
+    
+    def handle_data(self, data):
+        if self._skip_depth or (self._pending_break and not data.strip()):
+            return
+        self.parts.append((data, self._pending_break))
+        self._pending_break = 0
+    
+    def text(self):
+        """Collected text with block breaks applied"""
+        chunks = []
+        for data, breaks in self.parts:
+            if chunks and breaks:
+                chunks.append('\n' * breaks)
+            chunks.append(data)
+        # Collapse whitespace within each line
+        return '\n'.join(' '.join(line.split()) for line in ''.join(chunks).split('\n')).strip() + '\n'
+
+@lru_cache(maxsize=_RENDER_CACHE_SIZE)
+def _html_to_text(html_content):
+    """Plain-text alternative for an HTML email body"""
+    extractor = _TextExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return extractor.text()
+
+def _with_text(html_content):
+    """(html, text) pair with the text part derived from the HTML"""
+    return html_content, _html_to_text(html_content)
+
+# Rendered (html, text) bodies are memoized: repeat notifications for the same
+# user within the same minute render to identical strings
+@lru_cache(maxsize=_RENDER_CACHE_SIZE)
+def _render_registration(user_name, user_email, formatted_time):
+    """Registration email (html, text) bodies"""
+    values = dict(user_name=user_name, user_email=user_email, formatted_time=formatted_time)
+    return _with_text(_REGISTRATION_HTML.substitute(values))
+
+@lru_cache(maxsize=_RENDER_CACHE_SIZE)
+def _render_login(user_name, user_email, formatted_time, login_method, confidence_text):
+    """Login notification (html, text) bodies"""
+    values = dict(user_name=user_name, user_email=user_email, formatted_time=formatted_time,
+                  login_method=login_method, confidence_text=confidence_text)
+    return _with_text(_LOGIN_HTML.substitute(values))
+
+@lru_cache(maxsize=_RENDER_CACHE_SIZE)
+def _render_enrollment(user_name, user_email, formatted_time, enrollment_type):
+    """Enrollment completion (html, text) bodies"""
+    values = dict(user_name=user_name, user_email=user_email, formatted_time=formatted_time,
+                  enrollment_type=enrollment_type)
+    return _with_text(_ENROLLMENT_HTML.substitute(values))
+
+class _TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, count=1):
+        """Take count tokens and return how many seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # The balance may go negative: later callers queue up behind this one
+            self._tokens -= count
+            return max(0.0, -self._tokens / self.rate)
+    
+    def consume(self, count=1):
+        """Take count tokens, sleeping until they are available"""
+        delay = self.reserve(count)
+        if delay > 0:
+            time.sleep(delay)
+
+# Per-send debug/info output goes through logging rather than print, so it is
+# formatted and written only when a handler is enabled for it
+logger = logging.getLogger(__name__)
+
+# "From" entry shared by every message; built once and never mutated
+_SENDER = {"Email": SENDER_EMAIL, "Name": SENDER_NAME}
+
+# Emails that failed on a transient error are kept here and resent by a
+# background worker, so a Mailjet outage does not lose notifications
+RETRY_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.email_retries.sqlite3')
+RETRY_POLL_INTERVAL = 5  # seconds
+MAX_RETRY_ATTEMPTS = 5
+
+# Mailjet v3.1 send endpoint, posted to directly over a shared keep-alive session
+MAILJET_SEND_URL = "https://api.mailjet.com/v3.1/send"
+MAILJET_TIMEOUT = 30  # seconds
+
 class EmailService:
+    # Threads that deliver notifications queued with send_in_background; sends are
+    # network-bound, so independent emails go out concurrently
+    BACKGROUND_WORKERS = 8
+    
+    # Cap on submitted-but-unfinished background sends so a burst cannot run far
+    # ahead of Mailjet's rate limit; further submits wait for a free slot
+    MAX_PENDING_SENDS = 32
+    
+    # Client-side rate limit, in messages, so bursts are paced instead of bounced with 429s
+    SEND_RATE_PER_SECOND = 10
+    SEND_BURST = 20
+    
+    # Mailjet v3.1 accepts at most 50 messages per send request
+    MAX_BATCH_MESSAGES = 50
+    BATCH_FLUSH_INTERVAL = 0.2  # seconds
+    
     def __init__(self):
         """Initialize Mailjet email service"""
         self.api_key = MAILJET_API_KEY
         self.secret_key = MAILJET_SECRET_KEY
         self.sender_email = SENDER_EMAIL
         self.sender_name = SENDER_NAME
-        self.mailjet = None
+        self._mailjet = None
+        self._mailjet_ready = False
+        self._mailjet_lock = threading.Lock()
+        self._session = None
+        self._aio_session = None
+        self._auth_header = None
+        
+        # Background sender so API handlers don't wait on the Mailjet round trip
+        self._executor = ThreadPoolExecutor(max_workers=self.BACKGROUND_WORKERS, thread_name_prefix="mail")
+        self._send_slots = threading.BoundedSemaphore(self.MAX_PENDING_SENDS)
+        self._bucket = _TokenBucket(self.SEND_RATE_PER_SECOND, self.SEND_BURST)
         
-        # Initialize Mailjet client
-        self._init_mailjet()
+        # Emails waiting to be sent together by queue_email
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+        
+        # Retry worker for the persistent retry queue, started on demand
+        self._retry_thread = None
+        self._retry_lock = threading.Lock()
+    
+    @property
+    def mailjet(self):
+        """Mailjet client, initialized on first use; None if unavailable"""
+        if not self._mailjet_ready:
+            with self._mailjet_lock:
+                if not self._mailjet_ready:
+                    self._init_mailjet()
+                    self._mailjet_ready = True
+        return self._mailjet
     
     def _init_mailjet(self):
         """Initialize Mailjet client"""
@@ -53,16 +542,61 @@ class EmailService:
             from mailjet_rest import Client
             
             # Initialize Mailjet client
-            self.mailjet = Client(auth=(self.api_key, self.secret_key), version='v3.1')
+            self._mailjet = Client(auth=(self.api_key, self.secret_key), version='v3.1')
+            
+            # Basic auth header encoded once instead of on every request
+            credentials = f"{self.api_key}:{self.secret_key}".encode('utf-8')
+            self._auth_header = "Basic " + base64.b64encode(credentials).decode('ascii')
+            
+            # One keep-alive HTTPS session for every send, so only the first pays the TLS handshake
+            self._session = self._create_session()
+            
+            # Resume retries left over from a previous run
+            if os.path.exists(RETRY_DB_PATH):
+                self._start_retry_worker()
             print("[INFO] Mailjet email service initialized successfully")
             
         except ImportError:
             print("[WARNING] Mailjet package not installed. Email functionality disabled.")
             print("[INFO] Install with: pip install mailjet-rest")
-            self.mailjet = None
+            self._mailjet = None
         except Exception as e:
             print(f"[ERROR] Failed to initialize Mailjet: {e}")
-            self.mailjet = None
+            self._mailjet = None
+    
+    def _create_session(self):
+        """HTTP session with a pooled, keep-alive HTTPS adapter for the Mailjet API"""
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        session = requests.Session()
+        session.headers['Authorization'] = self._auth_header
+        
+        # Retry only connection failures: a POST that reached Mailjet is never resent
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        session.mount("https://", adapter)
+        return session
+    
+    def _post_messages(self, messages):
+        """POST a Mailjet v3.1 Messages array over the shared session"""
+        body, headers = _request_body({'Messages': messages})
+        return self._session.post(
+            MAILJET_SEND_URL,
+            data=body,
+            headers=headers,
+            timeout=MAILJET_TIMEOUT
+        )
+    
+    def __del__(self):
+        """Close pooled HTTPS connections"""
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
     
     def send_email(self, to_email, to_name, subject, html_content, text_content=None):
         """
@@ -84,77 +618,180 @@ class EmailService:
                 "error": "Mailjet not initialized. Email service unavailable."
             }
         
-        try:
-            # Prepare email data (following Mailjet v3.1 format)
-            email_data = {
-                'Messages': [
-                    {
-                        "From": {
-                            "Email": self.sender_email,
-                            "Name": self.sender_name
-                        },
-                        "To": [
-                            {
-                                "Email": to_email,
-                                "Name": to_name
-                            }
-                        ],
-                        "Subject": subject,
-                        "HTMLPart": html_content
-                    }
-                ]
+        return self._send_message([(to_email, to_name)], subject, html_content, text_content)
+    
+    def send_email_bulk(self, recipients, subject, html_content, text_content=None):
+        """
+        Send one email to several recipients with a single Mailjet message
+        
+        Args:
+            recipients: List of (email, name) tuples, all listed in "To"
+            subject: Email subject
+            html_content: HTML email content
+            text_content: Plain text email content (optional)
+        
+        Returns:
+            dict: Email sending result
+        """
+        if not self.mailjet:
+            return {
+                "success": False,
+                "error": "Mailjet not initialized. Email service unavailable."
             }
+        
+        return self._send_message(recipients, subject, html_content, text_content)
+    
+    def _send_message(self, recipients, subject, html_content, text_content):
+        """Send one Mailjet message to recipients and interpret the response"""
+        invalid = _invalid_address_result(recipients)
+        if invalid:
+            return invalid
+        
+        to_email = ", ".join(email for email, _ in recipients)
+        message = None
+        try:
+            # Derive the plain-text part when only HTML is given
+            if text_content is None:
+                text_content = _html_to_text(html_content)
             
-            # Add text content if provided
-            if text_content:
-                email_data['Messages'][0]["TextPart"] = text_content
+            # Prepare email data (following Mailjet v3.1 format)
+            message = self._build_message(recipients, subject, html_content, text_content)
             
             # Send email
-            result = self.mailjet.send.create(data=email_data)
+            self._bucket.consume(1)
+            result = self._post_messages([message])
             
-            print(f"[DEBUG] Mailjet Response Status: {result.status_code}")
-            print(f"[DEBUG] Mailjet Response: {result.json()}")
+            if EMAIL_DEBUG:
+                logger.debug("Mailjet response %s: %s", result.status_code, result.text)
             
-            if result.status_code == 200:
-                response_data = result.json()
-                messages = response_data.get('Messages', [])
-                if messages and len(messages) > 0:
-                    message_info = messages[0]
-                    status = message_info.get('Status', 'unknown')
-                    
-                    if status == 'success':
-                        print(f"[INFO] Email sent successfully to {to_email}")
-                        return {
-                            "success": True,
-                            "message": f"Email sent to {to_email}",
-                            "status": status,
-                            "message_id": message_info.get('To', [{}])[0].get('MessageID') if message_info.get('To') else None
-                        }
-                    else:
-                        error_info = message_info.get('Errors', [])
-                        error_msg = error_info[0].get('ErrorMessage', 'Unknown error') if error_info else 'Email rejected'
-                        print(f"[ERROR] Email rejected: {error_msg}")
-                        return {
-                            "success": False,
-                            "error": f"Email rejected: {error_msg}",
-                            "status": status,
-                            "details": error_info
-                        }
-                else:
-                    print(f"[ERROR] No message data in response")
-                    return {
-                        "success": False,
-                        "error": "No message data in response",
-                        "details": response_data
-                    }
-            else:
-                print(f"[ERROR] Failed to send email: {result.status_code} - {result.text}")
-                return {
-                    "success": False,
-                    "error": f"Email sending failed: {result.status_code}",
-                    "details": result.text
-                }
+            send_result = self._send_result(result.status_code, result.text, lambda: _loads(result.content), to_email)
+            if result.status_code >= 500:
+                # Mailjet-side failure: retry later instead of losing the email
+                send_result["retry_queued"] = self._enqueue_retry(message)
+            return send_result
                 
+        except Exception as e:
+            print(f"[ERROR] Email sending exception: {e}")
+            return {
+                "success": False,
+                "error": f"Email sending failed: {str(e)}",
+                # Only resend when the request never reached Mailjet: after a read timeout or an
+                # unparseable 2xx reply the email was probably delivered, and a retry would duplicate it
+                "retry_queued": message is not None and _is_connection_error(e) and self._enqueue_retry(message)
+            }
+    
+    def _retry_db(self):
+        """Open the retry queue database, creating the table on first use"""
+        conn = sqlite3.connect(RETRY_DB_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS email_retries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " message TEXT NOT NULL,"
+            " attempt INTEGER NOT NULL,"
+            " next_at REAL NOT NULL)"
+        )
+        return conn
+    
+    def _enqueue_retry(self, message, attempt=1):
+        """Persist a failed message for the retry worker; returns True if queued"""
+        try:
+            with closing(self._retry_db()) as conn, conn:
+                conn.execute(
+                    "INSERT INTO email_retries (message, attempt, next_at) VALUES (?, ?, ?)",
+                    (json.dumps(message), attempt, time.time() + 2 ** attempt)
+                )
+        except sqlite3.Error as e:
+            print(f"[ERROR] Could not queue email for retry: {e}")
+            return False
+        
+        self._start_retry_worker()
+        print(f"[INFO] Email to {', '.join(to['Email'] for to in message['To'])} queued for retry")
+        return True
+    
+    def _start_retry_worker(self):
+        """Start the daemon thread that drains the retry queue (once per service)"""
+        with self._retry_lock:
+            if self._retry_thread is None:
+                self._retry_thread = threading.Thread(target=self._retry_loop, name="mail-retry", daemon=True)
+                self._retry_thread.start()
+    
+    def _retry_loop(self):
+        """Resend due messages with exponential backoff, giving up after MAX_RETRY_ATTEMPTS"""
+        while True:
+            time.sleep(RETRY_POLL_INTERVAL)
+            try:
+                with closing(self._retry_db()) as conn:
+                    due = conn.execute(
+                        "SELECT id, message, attempt FROM email_retries WHERE next_at <= ? ORDER BY next_at",
+                        (time.time(),)
+                    ).fetchall()
+                    for row_id, message_json, attempt in due:
+                        self._retry_message(conn, row_id, json.loads(message_json), attempt)
+            except Exception as e:
+                print(f"[ERROR] Email retry worker error: {e}")
+    
+    def _retry_message(self, conn, row_id, message, attempt):
+        """Resend one queued message and update or remove its row"""
+        to_email = ", ".join(to['Email'] for to in message['To'])
+        try:
+            self._bucket.consume(1)
+            result = self._post_messages([message])
+            delivered = self._send_result(result.status_code, result.text, lambda: _loads(result.content), to_email)["success"]
+            transient = result.status_code >= 500
+        except Exception as e:
+            print(f"[WARN] Email retry to {to_email} failed: {e}")
+            delivered, transient = False, _is_connection_error(e)
+        
+        with conn:
+            if delivered or not transient or attempt >= MAX_RETRY_ATTEMPTS:
+                if not delivered:
+                    print(f"[ERROR] Giving up on email to {to_email} after {attempt} retries")
+                conn.execute("DELETE FROM email_retries WHERE id = ?", (row_id,))
+            else:
+                conn.execute(
+                    "UPDATE email_retries SET attempt = ?, next_at = ? WHERE id = ?",
+                    (attempt + 1, time.time() + 2 ** (attempt + 1), row_id)
+                )
+    
+    async def asend_email(self, to_email, to_name, subject, html_content, text_content=None):
+        """
+        Send email using Mailjet API without blocking the event loop (requires aiohttp)
+        
+        Several sends can run concurrently, e.g. await asyncio.gather(service.asend_email(...), ...)
+        
+        Returns:
+            dict: Email sending result, same as send_email
+        """
+        if not self.mailjet:
+            return {
+                "success": False,
+                "error": "Mailjet not initialized. Email service unavailable."
+            }
+        if aiohttp is None:
+            return {
+                "success": False,
+                "error": "aiohttp not installed. Async email sending unavailable."
+            }
+        
+        invalid = _invalid_address_result([(to_email, to_name)])
+        if invalid:
+            return invalid
+        
+        try:
+            message = self._build_message([(to_email, to_name)], subject, html_content, text_content)
+            session = self._get_aio_session()
+            delay = self._bucket.reserve(1)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body, headers = _request_body({'Messages': [message]})
+            async with session.post(MAILJET_SEND_URL, data=body, headers=headers) as result:
+                response_text = await result.text()
+            
+            if EMAIL_DEBUG:
+                logger.debug("Mailjet response %s: %s", result.status, response_text)
+            return self._send_result(result.status, response_text, lambda: _loads(response_text), to_email)
+            
         except Exception as e:
             print(f"[ERROR] Email sending exception: {e}")
             return {
@@ -162,6 +799,227 @@ class EmailService:
                 "error": f"Email sending failed: {str(e)}"
             }
     
+    def _get_aio_session(self):
+        """aiohttp session for asend_email, created on first use inside the running loop"""
+        if self._aio_session is None or self._aio_session.closed:
+            self._aio_session = aiohttp.ClientSession(
+                headers={'Authorization': self._auth_header},
+                connector=aiohttp.TCPConnector(limit=50),
+                timeout=aiohttp.ClientTimeout(total=MAILJET_TIMEOUT)
+            )
+        return self._aio_session
+    
+    async def aclose(self):
+        """Close the aiohttp session used by asend_email"""
+        if self._aio_session is not None and not self._aio_session.closed:
+            await self._aio_session.close()
+        self._aio_session = None
+    
+    def _send_result(self, status_code, response_text, load_json, to_email):
+        """Interpret a single-message Mailjet send response"""
+        if status_code == 200:
+            response_data = load_json()
+            messages = response_data.get('Messages', [])
+            if messages and len(messages) > 0:
+                return self._message_result(messages[0], to_email)
+            else:
+                print(f"[ERROR] No message data in response")
+                return {
+                    "success": False,
+                    "error": "No message data in response",
+                    "details": response_data
+                }
+        else:
+            print(f"[ERROR] Failed to send email: {status_code} - {response_text}")
+            return {
+                "success": False,
+                "error": f"Email sending failed: {status_code}",
+                "details": response_text
+            }
+    
+    def _build_message(self, recipients, subject, html_content, text_content=None):
+        """Build one entry of the Mailjet v3.1 Messages array for (email, name) recipients"""
+        message = {
+            "From": _SENDER,
+            "To": [
+                {
+                    "Email": email,
+                    "Name": name
+                }
+                for email, name in recipients
+            ],
+            "Subject": subject,
+            "HTMLPart": html_content
+        }
+        
+        # Add text content if provided
+        if text_content:
+            message["TextPart"] = text_content
+        
+        return message
+    
+    def _message_result(self, message_info, to_email):
+        """Convert one Mailjet response message into a send result dict"""
+        status = message_info.get('Status', 'unknown')
+        
+        if status == 'success':
+            logger.info("Email sent successfully to %s", to_email)
+            return {
+                "success": True,
+                "message": f"Email sent to {to_email}",
+                "status": status,
+                "message_id": message_info.get('To', [{}])[0].get('MessageID') if message_info.get('To') else None
+            }
+        else:
+            error_info = message_info.get('Errors', [])
+            error_msg = error_info[0].get('ErrorMessage', 'Unknown error') if error_info else 'Email rejected'
+            print(f"[ERROR] Email rejected: {error_msg}")
+            return {
+                "success": False,
+                "error": f"Email rejected: {error_msg}",
+                "status": status,
+                "details": error_info
+            }
+    
+    def queue_email(self, to_email, to_name, subject, html_content, text_content=None):
+        """
+        Queue an email to be sent with others in a single Mailjet request
+        
+        Pending emails are flushed every BATCH_FLUSH_INTERVAL seconds, or as soon
+        as MAX_BATCH_MESSAGES are waiting.
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the same result dict as send_email
+        """
+        future = Future()
+        if not self.mailjet:
+            future.set_result({
+                "success": False,
+                "error": "Mailjet not initialized. Email service unavailable."
+            })
+            return future
+        
+        invalid = _invalid_address_result([(to_email, to_name)])
+        if invalid:
+            future.set_result(invalid)
+            return future
+        
+        message = self._build_message([(to_email, to_name)], subject, html_content, text_content)
+        with self._pending_lock:
+            self._pending.append((message, future))
+            if len(self._pending) >= self.MAX_BATCH_MESSAGES:
+                # Full batch: send it now instead of waiting for the timer
+                self._executor.submit(self._send_batch, self._take_batch())
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.BATCH_FLUSH_INTERVAL, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        
+        return future
+    
+    def _take_batch(self):
+        """Pop up to MAX_BATCH_MESSAGES pending emails (caller holds _pending_lock)"""
+        count = min(len(self._pending), self.MAX_BATCH_MESSAGES)
+        return [self._pending.popleft() for _ in range(count)]
+    
+    def _flush(self):
+        """Timer callback: send everything that is pending"""
+        with self._pending_lock:
+            self._flush_timer = None
+            batches = []
+            while self._pending:
+                batches.append(self._take_batch())
+        
+        for batch in batches:
+            self._send_batch(batch)
+    
+    def _send_batch(self, batch):
+        """Send queued (message, future) pairs in one request and resolve each future"""
+        try:
+            self._bucket.consume(len(batch))
+            result = self._post_messages([message for message, _ in batch])
+            response_data = _loads(result.content)
+        except Exception as e:
+            print(f"[ERROR] Batch email sending exception: {e}")
+            for _, future in batch:
+                future.set_result({
+                    "success": False,
+                    "error": f"Email sending failed: {str(e)}"
+                })
+            return
+        
+        if EMAIL_DEBUG:
+            logger.debug("Mailjet batch of %d - response %s", len(batch), result.status_code)
+        
+        # Mailjet reports a status per message, in request order
+        messages = response_data.get('Messages', []) if isinstance(response_data, dict) else []
+        for index, (message, future) in enumerate(batch):
+            to_email = message["To"][0]["Email"]
+            if index < len(messages):
+                future.set_result(self._message_result(messages[index], to_email))
+            else:
+                future.set_result({
+                    "success": False,
+                    "error": f"Email sending failed: {result.status_code}",
+                    "details": response_data
+                })
+    
+    def send_in_background(self, send_method, *args, **kwargs):
+        """
+        Run a send method on the background sender and return immediately
+        
+        Args:
+            send_method: Bound send method, e.g. self.send_login_notification
+            *args, **kwargs: Arguments for send_method
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the send method's result dict
+        """
+        self._send_slots.acquire()
+        try:
+            future = self._executor.submit(send_method, *args, **kwargs)
+        except Exception:
+            self._send_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._send_slots.release())
+        future.add_done_callback(self._report_background_result)
+        return future
+    
+    def send_email_async(self, to_email, to_name, subject, html_content, text_content=None):
+        """
+        Send email on the background sender
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the send_email result dict
+        """
+        return self.send_in_background(self.send_email, to_email, to_name, subject, html_content, text_content)
+    
+    def send_all(self, emails):
+        """
+        Send several independent emails concurrently and wait for all of them
+        
+        Args:
+            emails: Iterable of (to_email, to_name, subject, html_content[, text_content]) tuples
+        
+        Returns:
+            list: send_email result dicts, in the same order as emails
+        """
+        futures = [self.send_email_async(*email) for email in emails]
+        wait(futures)
+        return [future.result() for future in futures]
+    
+    @staticmethod
+    def _report_background_result(future):
+        """Log failures of background sends, since no caller waits on them"""
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"[ERROR] Background email failed: {e}")
+            return
+        
+        if not result.get("success"):
+            print(f"[ERROR] Background email failed: {result.get('error', 'Unknown error')}")
+    
     def send_registration_email(self, user_name, user_email, registration_time=None):
         """
         Send welcome email after successful registration
@@ -180,98 +1038,11 @@ class EmailService:
         if not registration_time:
             registration_time = datetime.now()
         
-        formatted_time = registration_time.strftime("%B %d, %Y at %I:%M %p")
+        formatted_time = _format_time(registration_time)
         
         subject = "🎉 Welcome to Biometric Authentication System!"
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .feature {{ background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                .button {{ display: inline-block; background: #667eea; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; margin: 10px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 Welcome to Biometric Authentication!</h1>
-                    <p>Your secure account has been created successfully</p>
-                </div>
-                
-                <div class="content">
-                    <h2>Hello {user_name}! 👋</h2>
-                    
-                    <p>Congratulations! Your biometric authentication account has been successfully created on <strong>{formatted_time}</strong>.</p>
-                    
-                    <div class="feature">
-                        <h3>🎯 What's Next?</h3>
-                        <p>Complete your biometric enrollment to unlock full security features:</p>
-                        <ul>
-                            <li><strong>📷 Face Recognition:</strong> Enroll your face for automatic identification</li>
-                            <li><strong>👆 Fingerprint:</strong> Register your fingerprint with our R307 sensor</li>
-                            <li><strong>🔒 Dual Authentication:</strong> Enjoy maximum security with combined biometrics</li>
-                        </ul>
-                    </div>
-                    
-                    <div class="feature">
-                        <h3>🛡️ Security Features</h3>
-                        <ul>
-                            <li>Advanced face recognition with 6000+ feature points</li>
-                            <li>Professional R307 fingerprint sensor integration</li>
-                            <li>Cloud-secure MongoDB Atlas database</li>
-                            <li>Real-time biometric processing</li>
-                        </ul>
-                    </div>
-                    
-                    <div class="feature">
-                        <h3>📊 Your Account Details</h3>
-                        <p><strong>Name:</strong> {user_name}</p>
-                        <p><strong>Email:</strong> {user_email}</p>
-                        <p><strong>Registration Date:</strong> {formatted_time}</p>
-                        <p><strong>Status:</strong> Active (Enrollment Pending)</p>
-                    </div>
-                    
-                    <p>Thank you for choosing our advanced biometric authentication system. Your security is our priority!</p>
-                </div>
-                
-                <div class="footer">
-                    <p>This email was sent from Biometric Authentication System</p>
-                    <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Welcome to Biometric Authentication System!
-        
-        Hello {user_name}!
-        
-        Your biometric authentication account has been successfully created on {formatted_time}.
-        
-        What's Next:
-        - Complete face recognition enrollment
-        - Register your fingerprint with R307 sensor
-        - Enjoy dual biometric authentication
-        
-        Account Details:
-        Name: {user_name}
-        Email: {user_email}
-        Registration: {formatted_time}
-        Status: Active (Enrollment Pending)
-        
-        Thank you for choosing our advanced biometric authentication system!
-        
-        © 2025 Advanced Biometric Security
-        """
+        html_content, text_content = _render_registration(user_name, user_email, formatted_time)
         
         return self.send_email(user_email, user_name, subject, html_content, text_content)
     
@@ -295,100 +1066,12 @@ class EmailService:
         if not login_time:
             login_time = datetime.now()
         
-        formatted_time = login_time.strftime("%B %d, %Y at %I:%M %p")
+        formatted_time = _format_time(login_time)
         confidence_text = f" (Confidence: {confidence_score:.1%})" if confidence_score else ""
         
         subject = f"🔐 Login Alert - {user_name}"
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .alert-box {{ background: #e8f5e8; border: 1px solid #4caf50; padding: 20px; border-radius: 8px; margin: 20px 0; }}
-                .info-box {{ background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #4facfe; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                .success {{ color: #4caf50; font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 Login Notification</h1>
-                    <p>Secure access to your biometric account</p>
-                </div>
-                
-                <div class="content">
-                    <div class="alert-box">
-                        <h2 class="success">✅ Successful Login Detected</h2>
-                        <p>Hello <strong>{user_name}</strong>! We detected a successful login to your biometric authentication account.</p>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>📊 Login Details</h3>
-                        <p><strong>User:</strong> {user_name}</p>
-                        <p><strong>Email:</strong> {user_email}</p>
-                        <p><strong>Login Time:</strong> {formatted_time}</p>
-                        <p><strong>Authentication Method:</strong> {login_method}{confidence_text}</p>
-                        <p><strong>Status:</strong> <span class="success">Authentication Successful</span></p>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>🛡️ Security Information</h3>
-                        <p>Your account was accessed using our advanced biometric authentication system:</p>
-                        <ul>
-                            <li>Face recognition with advanced feature matching</li>
-                            <li>R307 fingerprint sensor verification</li>
-                            <li>Real-time biometric processing</li>
-                            <li>Secure cloud database authentication</li>
-                        </ul>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>⚠️ Security Notice</h3>
-                        <p>If this login was not initiated by you, please contact system administrator immediately. Our biometric system provides high-security authentication, but we recommend monitoring your account activity.</p>
-                    </div>
-                    
-                    <p>Thank you for using our secure biometric authentication system!</p>
-                </div>
-                
-                <div class="footer">
-                    <p>This is an automated security notification from Biometric Authentication System</p>
-                    <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Biometric Authentication - Login Notification
-        
-        Hello {user_name}!
-        
-        We detected a successful login to your biometric authentication account.
-        
-        Login Details:
-        User: {user_name}
-        Email: {user_email}
-        Time: {formatted_time}
-        Method: {login_method}{confidence_text}
-        Status: Authentication Successful
-        
-        Security Features Used:
-        - Advanced face recognition
-        - R307 fingerprint verification
-        - Real-time biometric processing
-        - Secure cloud authentication
-        
-        If this login was not initiated by you, please contact system administrator.
-        
-        © 2025 Advanced Biometric Security
-        """
+        html_content, text_content = _render_login(user_name, user_email, formatted_time, login_method, confidence_text)
         
         return self.send_email(user_email, user_name, subject, html_content, text_content)
     
@@ -407,109 +1090,11 @@ class EmailService:
         if not ENABLE_ENROLLMENT_EMAILS:
             return {"success": True, "message": "Enrollment emails disabled"}
         
-        formatted_time = datetime.now().strftime("%B %d, %Y at %I:%M %p")
+        formatted_time = _format_time(datetime.now())
         
         subject = f"🎉 Biometric Enrollment {enrollment_type} - {user_name}"
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .success-box {{ background: #e8f5e8; border: 1px solid #4caf50; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center; }}
-                .info-box {{ background: white; margin: 15px 0; padding: 20px; border-radius: 8px; border-left: 4px solid #11998e; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                .success {{ color: #4caf50; font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎉 Enrollment Complete!</h1>
-                    <p>Your biometric security is now active</p>
-                </div>
-                
-                <div class="content">
-                    <div class="success-box">
-                        <h2 class="success">✅ {enrollment_type} Enrollment Successful!</h2>
-                        <p>Congratulations <strong>{user_name}</strong>! Your biometric enrollment has been completed successfully.</p>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>📊 Enrollment Details</h3>
-                        <p><strong>User:</strong> {user_name}</p>
-                        <p><strong>Email:</strong> {user_email}</p>
-                        <p><strong>Completion Time:</strong> {formatted_time}</p>
-                        <p><strong>Enrollment Type:</strong> {enrollment_type}</p>
-                        <p><strong>Security Level:</strong> <span class="success">High Security Active</span></p>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>🔐 Your Security Features</h3>
-                        <ul>
-                            <li><strong>Advanced Face Recognition:</strong> 6000+ feature point matching</li>
-                            <li><strong>Fingerprint Authentication:</strong> R307 sensor with template matching</li>
-                            <li><strong>Dual Biometric Verification:</strong> Maximum security protection</li>
-                            <li><strong>Real-time Processing:</strong> Instant authentication</li>
-                            <li><strong>Cloud Security:</strong> Encrypted MongoDB Atlas storage</li>
-                        </ul>
-                    </div>
-                    
-                    <div class="info-box">
-                        <h3>🚀 Ready to Login</h3>
-                        <p>Your account is now ready for secure biometric login:</p>
-                        <ol>
-                            <li>Click "Login" on the application</li>
-                            <li>Look at the camera for face recognition</li>
-                            <li>Confirm your identity</li>
-                            <li>Place finger on R307 sensor</li>
-                            <li>Access your secure dashboard</li>
-                        </ol>
-                    </div>
-                    
-                    <p>Welcome to the future of secure authentication!</p>
-                </div>
-                
-                <div class="footer">
-                    <p>Biometric Authentication System - Your Security, Our Priority</p>
-                    <p>© 2025 Advanced Biometric Security. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Biometric Enrollment Complete!
-        
-        Congratulations {user_name}!
-        
-        Your {enrollment_type} biometric enrollment has been completed successfully on {formatted_time}.
-        
-        Security Features Active:
-        - Advanced Face Recognition (6000+ features)
-        - Fingerprint Authentication (R307 sensor)
-        - Dual Biometric Verification
-        - Real-time Processing
-        - Cloud Security (MongoDB Atlas)
-        
-        Your account is now ready for secure biometric login!
-        
-        Login Process:
-        1. Click "Login" on the application
-        2. Look at camera for face recognition
-        3. Confirm your identity
-        4. Place finger on R307 sensor
-        5. Access your secure dashboard
-        
-        Welcome to the future of secure authentication!
-        
-        © 2025 Advanced Biometric Security
-        """
+        html_content, text_content = _render_enrollment(user_name, user_email, formatted_time, enrollment_type)
         
         return self.send_email(user_email, user_name, subject, html_content, text_content)
     
@@ -560,12 +1145,19 @@ class EmailService:
         
         return self.send_email(test_email, test_name, subject, html_content, text_content)
 
-# Global email service instance
-email_service = EmailService()
+# Global email service instance, created on first use so importing this module
+# does not load mailjet_rest or start sender threads
+_email_service = None
+_email_service_lock = threading.Lock()
 
 def get_email_service():
     """Get global email service instance"""
-    return email_service
+    global _email_service
+    if _email_service is None:
+        with _email_service_lock:
+            if _email_service is None:
+                _email_service = EmailService()
+    return _email_service
 
 def main():
     """Test email service functionality"""
@@ -7,41 +7,213 @@ Handles user registration, face image storage, and fingerprint template storage
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 import gridfs
-import base64
+import binascii
 import hashlib
+import hmac
 import os
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from bson import ObjectId
+from bson.binary import Binary
 import io
-from steganography import BiometricSteganography
+from steganography import BiometricSteganography, image_mimetype
+
+try:
+    import certifi  # CA bundle for verifying Atlas certificates
+except ImportError:
+    certifi = None
+
+# SIMD base64 decoder for legacy string templates when installed, stdlib otherwise
+try:
+    import pybase64
+    _b64decode = pybase64.b64decode
+except ImportError:
+    _b64decode = binascii.a2b_base64  # single C call, no base64-module wrapper
+
+# MongoDB Atlas connection string (replace with your actual connection string)
+MONGO_CONNECTION_STRING = ""
+
+# How long a get_user result may be reused; writes through this class invalidate sooner
+USER_CACHE_TTL = 2.0
+USER_CACHE_MAX_ENTRIES = 1024
+
+# Decoded fingerprint templates kept in memory (invalidated on writes, no TTL)
+TEMPLATE_CACHE_MAX_ENTRIES = 128
+
+# Face images up to this size are stored inline in the user document instead of GridFS
+INLINE_IMAGE_MAX_BYTES = 1_000_000
+
+# Bound once; SHA-256 keys are derived on every enrollment and authentication
+_sha256 = hashlib.sha256
+
+# Users with a stored face image: a GridFS id, or an inline blob (face_image_id is None then)
+HAS_FACE_IMAGE_FILTER = {"$or": [{"face_image_id": {"$ne": None}}, {"face_image_inline": True}]}
+HAS_FACE_IMAGE_EXPR = {"$or": [
+    {"$ne": [{"$ifNull": ["$face_image_id", None]}, None]},
+    {"$eq": ["$face_image_inline", True]}
+]}
+
+def has_face_image(user):
+    """True if a user document has a face image, stored inline or in GridFS"""
+    return bool(user.get("face_image_id") or user.get("face_image_inline"))
+
+# Document helpers shared with the asyncio client (mongodb_client_async.py)
+FINGERPRINT_KEY_FIELDS = ("fingerprint_key", "fingerprint_template", "fingerprint_algorithm")
+
+def new_user_document(email, phone):
+    """Fields of a newly registered user, without the name"""
+    return {
+        "email": email,
+        "phone": phone,
+        "created_at": datetime.now(),
+        "face_image_id": None,
+        "fingerprint_template": None,
+        "registration_complete": False
+    }
+
+def _is_hex_key(value):
+    """True for a 64-character hex SHA-256 key (old SHA-256 records stored one as the template)"""
+    return isinstance(value, str) and len(value) == 64 and all(c in '0123456789abcdef' for c in value.lower())
+
+def stored_fingerprint_key(user):
+    """SHA-256 key of a user document (None for legacy users or if there is no such user)"""
+    if user and user.get("fingerprint_algorithm") == "sha256":
+        # Older records kept the key in fingerprint_template
+        return user.get("fingerprint_key") or user.get("fingerprint_template")
+    return None
+
+def decode_fingerprint_template(user):
+    """Raw template bytes from a user document: BSON binary or legacy base64 (None if unavailable)"""
+    template_data = user.get("fingerprint_template") if user else None
+    if not template_data:
+        return None
+    if isinstance(template_data, bytes):
+        return bytes(template_data)
+    if user.get("fingerprint_algorithm") == "sha256" and _is_hex_key(template_data):
+        return None  # only the key was stored; there is no template
+    return _b64decode(template_data)
+
+def fingerprint_key_matches(user, new_template_data):
+    """Constant-time comparison of a template's SHA-256 key with a user's stored key"""
+    new_key_bytes = _sha256(memoryview(new_template_data)).digest()
+    try:
+        return hmac.compare_digest(new_key_bytes, bytes.fromhex(stored_fingerprint_key(user)))
+    except (TypeError, ValueError):
+        return False  # stored value is not a hex key
+
+def fingerprint_template_update(template_data):
+    """Pipeline update storing a template and its SHA-256 key; returns (pipeline, key)
+    
+    registration_complete only flips once a face image exists too, which
+    get_registered_users relies on.
+    """
+    template_view = memoryview(template_data)
+    # Hashed in place, GIL released for large buffers
+    fingerprint_key = _sha256(template_view).hexdigest()
+    pipeline = [{
+        "$set": {
+            "fingerprint_template": {"$literal": Binary(template_view)},  # Original template for matching
+            "fingerprint_key": {"$literal": fingerprint_key},   # SHA-256 key for encryption
+            "fingerprint_algorithm": "sha256",
+            "fingerprint_updated_at": datetime.now(),
+            "registration_complete": {
+                "$cond": [HAS_FACE_IMAGE_EXPR, True, {"$ifNull": ["$registration_complete", False]}]
+            }
+        }
+    }]
+    return pipeline, fingerprint_key
+
+def create_stego_image(user_name, image_data, fingerprint_key):
+    """Copy of a face image with the fingerprint key embedded (None without a valid key)"""
+    if not (isinstance(fingerprint_key, str) and len(fingerprint_key) == 64):
+        return None
+    
+    print(f"[INFO] Found fingerprint key for {user_name}, creating steganographic image...")
+    steg = BiometricSteganography()
+    success, stego_data, message = steg.embed_key_in_image(image_data, fingerprint_key)
+    if not success:
+        print(f"❌ Failed to create steganographic image: {message}")
+        return None
+    # Lossless WebP when it round-trips pixel-exact, PNG otherwise
+    return steg.to_lossless_webp(stego_data) or stego_data
+
+def face_file_metadata(user_name, image_data, upload_date, stego=False):
+    """GridFS metadata for an original or steganographic face image"""
+    if stego:
+        return {
+            "user_name": user_name,
+            "type": "face_image_steganographic",
+            "contentType": image_mimetype(image_data),
+            "has_embedded_key": True,
+            "upload_date": upload_date
+        }
+    return {
+        "user_name": user_name,
+        "type": "face_image_original",
+        "contentType": "image/png",
+        "upload_date": upload_date
+    }
+
+def face_image_update(image_data, original_image_id, stego_image_id, upload_date):
+    """User update recording saved face images; original_image_id None stores the original inline"""
+    inline = original_image_id is None
+    update_data = {
+        "face_image_id": original_image_id,
+        "face_image_inline": inline,
+        "face_updated_at": upload_date
+    }
+    if stego_image_id:
+        update_data["face_stego_image_id"] = stego_image_id
+        update_data["has_steganographic_image"] = True
+    
+    if inline:
+        return {"$set": dict(update_data, face_image_blob=Binary(image_data))}
+    return {"$set": update_data, "$unset": {"face_image_blob": ""}}
 
 class BiometricDatabase:
     def __init__(self):
         """Initialize MongoDB Atlas connection"""
-        # MongoDB Atlas connection string (replace with your actual connection string)
-        self.connection_string = ""
+        self.connection_string = MONGO_CONNECTION_STRING
         self.database_name = "biometric_auth"
         self.client = None
         self.db = None
         self.fs = None
+        self.fs_bucket = None
+        self._user_cache = {}  # name -> (fetched_at, user document)
+        self._user_cache_lock = threading.Lock()
+        self._template_cache = {}  # name -> raw template bytes
+        self._io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mongo-prefetch")
         
     def connect(self):
         """Connect to MongoDB Atlas"""
         try:
-            # Add SSL configuration to handle certificate issues
             self.client = MongoClient(
                 self.connection_string,
-                tlsAllowInvalidCertificates=True,  # Allow invalid certificates for development
+                appname="biometric_auth",         # Identifies this app's pool in Atlas monitoring
+                **self._tls_options(),
                 serverSelectionTimeoutMS=5000,    # Reduce timeout for faster failure
                 connectTimeoutMS=5000,            # Reduce connection timeout
-                socketTimeoutMS=5000              # Reduce socket timeout
+                socketTimeoutMS=5000,             # Reduce socket timeout
+                maxPoolSize=50,                   # One client per process, shared by all request threads
+                minPoolSize=5,                    # Keep warm TLS connections ready
+                maxIdleTimeMS=60000,
+                waitQueueTimeoutMS=5000,          # Fail fast instead of queueing forever for a connection
+                compressors="zstd,snappy,zlib",   # Wire compression; codecs whose package is missing are skipped
+                retryWrites=True
             )
             self.db = self.client[self.database_name]
             self.fs = gridfs.GridFS(self.db)
+            self.fs_bucket = gridfs.GridFSBucket(self.db)
             
             # Test connection
             self.client.admin.command('ping')
             print("✅ Connected to MongoDB Atlas successfully!")
+            
+            self._ensure_indexes()
+            self._fix_registration_flags()
             return True
         except ConnectionFailure as e:
             print(f"❌ Failed to connect to MongoDB Atlas: {e}")
@@ -50,6 +222,55 @@ class BiometricDatabase:
             print(f"❌ Connection error: {e}")
             return False
     
+    def _ensure_indexes(self):
+        """Create the indexes user lookups rely on (idempotent)"""
+        try:
+            self.db.users.create_index("name", unique=True)
+        except Exception as e:
+            # e.g. existing duplicate names; lookups still work, just without the index
+            print(f"[WARNING] Could not create users.name index: {e}")
+        
+        try:
+            # Covers get_registered_users: filter and projection both served from the index
+            self.db.users.create_index(
+                [("registration_complete", 1), ("name", 1)],
+                name="reg_name_cov"
+            )
+        except Exception as e:
+            print(f"[WARNING] Could not create registered-users index: {e}")
+    
+    def _fix_registration_flags(self):
+        """Clear registration_complete on users missing a face image or template (idempotent)
+        
+        Older save_fingerprint_template versions set the flag unconditionally, and
+        get_registered_users trusts it alone.
+        """
+        try:
+            result = self.db.users.update_many(
+                {
+                    "registration_complete": True,
+                    "$or": [
+                        {"face_image_id": None, "face_image_inline": {"$ne": True}},
+                        {"fingerprint_template": None}
+                    ]
+                },
+                {"$set": {"registration_complete": False}}
+            )
+            if result.modified_count:
+                print(f"[INFO] Cleared registration_complete on {result.modified_count} incomplete user(s)")
+        except Exception as e:
+            print(f"[WARNING] Could not check registration flags: {e}")
+    
+    def _tls_options(self):
+        """TLS settings: verified certificates unless MONGO_INSECURE=1 is set for development"""
+        if os.environ.get("MONGO_INSECURE") == "1":
+            return {"tlsAllowInvalidCertificates": True}
+        
+        # Atlas (mongodb+srv) uses TLS; verify against certifi's CA bundle when available
+        if certifi is not None and self.connection_string.startswith("mongodb+srv://"):
+            return {"tlsCAFile": certifi.where()}
+        return {}
+    
     def disconnect(self):
         """Close MongoDB connection"""
         if self.client:
@@ -61,17 +282,10 @@ class BiometricDatabase:
         try:
             users_collection = self.db.users
             
-            user_data = {
-                "name": name,
-                "email": email,
-                "phone": phone,
-                "created_at": datetime.now(),
-                "face_image_id": None,
-                "fingerprint_template": None,
-                "registration_complete": False
-            }
+            user_data = dict(new_user_document(email, phone), name=name)
             
             result = users_collection.insert_one(user_data)
+            self.invalidate_user(name)
             print(f"✅ User created: {name} (ID: {result.inserted_id})")
             return str(result.inserted_id)
             
@@ -82,6 +296,34 @@ class BiometricDatabase:
             print(f"❌ Error creating user: {e}")
             return None
     
+    def create_user_if_absent(self, name, email, phone):
+        """Create a user unless one with this name exists, in a single upsert
+        
+        Returns (user_id, True) if created, (None, False) if the name is taken,
+        and (None, None) on a database error.
+        """
+        try:
+            result = self.db.users.update_one(
+                {"name": name},
+                {"$setOnInsert": new_user_document(email, phone)},
+                upsert=True
+            )
+            if result.upserted_id is None:
+                print(f"❌ User already exists: {name}")
+                return None, False
+            
+            self.invalidate_user(name)
+            print(f"✅ User created: {name} (ID: {result.upserted_id})")
+            return str(result.upserted_id), True
+            
+        except DuplicateKeyError:
+            # Lost a race with a concurrent upsert of the same name (unique index on name)
+            print(f"❌ User already exists: {name}")
+            return None, False
+        except Exception as e:
+            print(f"❌ Error creating user: {e}")
+            return None, None
+    
     def user_exists(self, name):
         """Check if user already exists"""
         try:
@@ -92,76 +334,58 @@ class BiometricDatabase:
             print(f"❌ Error checking user existence: {e}")
             return False
     
-    def save_face_image(self, user_name, image_data, filename="face_001.jpg"):
-        """Save both original face image and steganographic version (if applicable) to GridFS"""
+    def save_face_image(self, user_name, image_data, filename="face_001.jpg", *, fingerprint_key=None):
+        """Save both original face image and steganographic version (if applicable) to GridFS
+        
+        Pass fingerprint_key when the caller already has it to skip the user lookup.
+        GridFS can't take part in transactions, so the files are uploaded first and
+        deleted again if the user update fails or matches no user.
+        """
         try:
-            users_collection = self.db.users
-            
-            # Save original image first
-            original_image_id = self.fs.put(
-                image_data,
-                filename=f"{user_name}_original_{filename}",
-                content_type="image/png",
-                metadata={
-                    "user_name": user_name, 
-                    "type": "face_image_original",
-                    "upload_date": datetime.now()
-                }
-            )
-            print(f"✅ Original face image saved for {user_name}")
-            
-            # Get user info to check for fingerprint key
-            user = self.get_user(user_name)
-            fingerprint_key = None
-            stego_image_id = None
-            
-            # Check if user has a fingerprint key to embed
-            if user and user.get("fingerprint_algorithm") == "sha256":
-                fingerprint_key = user.get("fingerprint_key") or user.get("fingerprint_template")
-                if fingerprint_key and len(fingerprint_key) == 64:
-                    print(f"[INFO] Found fingerprint key for {user_name}, creating steganographic image...")
-                    
-                    # Use steganography to embed the key
-                    steg = BiometricSteganography()
-                    success, stego_image_data, message = steg.embed_key_in_image(image_data, fingerprint_key)
-                    
-                    if success:
-                        # Save steganographic image separately
-                        stego_image_id = self.fs.put(
-                            stego_image_data,
-                            filename=f"{user_name}_steganographic_{filename}",
-                            content_type="image/png",
-                            metadata={
-                                "user_name": user_name, 
-                                "type": "face_image_steganographic",
-                                "has_embedded_key": True,
-                                "upload_date": datetime.now()
-                            }
-                        )
-                        print(f"✅ Steganographic image saved for {user_name} (with embedded fingerprint key)")
-                    else:
-                        print(f"❌ Failed to create steganographic image: {message}")
-            
-            # Update user record with both image IDs
-            update_data = {
-                "face_image_id": original_image_id,
-                "face_updated_at": datetime.now()
-            }
+            if fingerprint_key is None:
+                fingerprint_key = stored_fingerprint_key(self._find_user_fields(user_name, *FINGERPRINT_KEY_FIELDS))
             
-            if stego_image_id:
-                update_data["face_stego_image_id"] = stego_image_id
-                update_data["has_steganographic_image"] = True
+            # Embed the key before touching the database so the writes go out back to back
+            stego_image_data = create_stego_image(user_name, image_data, fingerprint_key)
             
-            result = users_collection.update_one(
-                {"name": user_name},
-                {"$set": update_data}
-            )
+            upload_date = datetime.now()
+            uploaded_ids = []  # GridFS files to remove if the user update doesn't land
+            try:
+                if len(image_data) <= INLINE_IMAGE_MAX_BYTES:
+                    # Small images live in the user document: one write now, one read later
+                    original_image_id = None
+                else:
+                    original_image_id = self.fs_bucket.upload_from_stream(
+                        f"{user_name}_original_{filename}",
+                        image_data,
+                        metadata=face_file_metadata(user_name, image_data, upload_date)
+                    )
+                    uploaded_ids.append(original_image_id)
+                
+                stego_image_id = None
+                if stego_image_data is not None:
+                    stego_image_id = self.fs_bucket.upload_from_stream(
+                        f"{user_name}_steganographic_{filename}",
+                        stego_image_data,
+                        metadata=face_file_metadata(user_name, stego_image_data, upload_date, stego=True)
+                    )
+                    uploaded_ids.append(stego_image_id)
+                
+                # Both image ids land in the user record with a single update
+                update = face_image_update(image_data, original_image_id, stego_image_id, upload_date)
+                result = self.db.users.update_one({"name": user_name}, update)
+            except Exception:
+                self._delete_grid_files(uploaded_ids)
+                raise
+            self.invalidate_user(user_name)
             
             if result.modified_count > 0:
                 status = "with steganographic version" if stego_image_id else "original only"
                 print(f"✅ Face image(s) saved for user: {user_name} ({status})")
                 return True
             else:
+                # No such user: the files were written but nothing references them
+                self._delete_grid_files(uploaded_ids)
                 print(f"❌ Failed to update user record for: {user_name}")
                 return False
                 
@@ -169,30 +393,38 @@ class BiometricDatabase:
             print(f"❌ Error saving face image: {e}")
             return False
     
+    def _delete_grid_files(self, file_ids):
+        """Best-effort removal of GridFS files that ended up unreferenced"""
+        for file_id in file_ids:
+            try:
+                self.fs_bucket.delete(file_id)
+            except Exception as e:
+                print(f"[WARNING] Could not delete orphaned GridFS file {file_id}: {e}")
+    
+    @staticmethod
+    def _bulk_sha256(templates, common_prefix=b''):
+        """Yield SHA-256 keys (hex) for many templates, hashing a shared prefix only once"""
+        seed = _sha256(common_prefix)
+        for template_data in templates:
+            hasher = seed.copy()
+            hasher.update(template_data)
+            yield hasher.hexdigest()
+    
     def save_fingerprint_template(self, user_name, template_data):
-        """Save fingerprint template as SHA-256 derived key AND store raw template for authentication"""
+        """Save fingerprint template as SHA-256 derived key AND store raw template for authentication
+        
+        template_data may be bytes, bytearray or a memoryview (e.g. a slice of a sensor buffer).
+        """
         try:
             users_collection = self.db.users
             
             # Generate SHA-256 key from fingerprint template
-            fingerprint_key = hashlib.sha256(template_data).hexdigest()
+            pipeline, fingerprint_key = fingerprint_template_update(template_data)
             print(f"[INFO] Generated SHA-256 key from fingerprint template for {user_name}")
             
-            # Store both SHA-256 key and raw template data (base64 encoded)
-            template_b64 = base64.b64encode(template_data).decode('utf-8')
-            
-            result = users_collection.update_one(
-                {"name": user_name},
-                {
-                    "$set": {
-                        "fingerprint_template": template_b64,  # Store original template for matching
-                        "fingerprint_key": fingerprint_key,   # Store SHA-256 key for encryption  
-                        "fingerprint_algorithm": "sha256",
-                        "fingerprint_updated_at": datetime.now(),
-                        "registration_complete": True
-                    }
-                }
-            )
+            # Store both SHA-256 key and raw template data (BSON binary, no base64 inflation)
+            result = users_collection.update_one({"name": user_name}, pipeline)
+            self.invalidate_user(user_name)
             
             if result.modified_count > 0:
                 print(f"✅ Fingerprint SHA-256 key saved for user: {user_name}")
@@ -207,14 +439,43 @@ class BiometricDatabase:
             return False
     
     def get_user(self, name):
-        """Get user data by name"""
+        """Get user data by name (reuses a fetch from the last USER_CACHE_TTL seconds)"""
+        now = time.monotonic()
+        with self._user_cache_lock:
+            hit = self._user_cache.get(name)
+        if hit and now - hit[0] < USER_CACHE_TTL:
+            return dict(hit[1])
+        
         try:
             users_collection = self.db.users
-            user = users_collection.find_one({"name": name})
-            return user
+            # Inline image bytes are fetched only by get_face_image
+            user = users_collection.find_one({"name": name}, {"face_image_blob": 0})
         except Exception as e:
             print(f"❌ Error getting user: {e}")
             return None
+        
+        if user is not None:
+            with self._user_cache_lock:
+                if len(self._user_cache) >= USER_CACHE_MAX_ENTRIES:
+                    self._user_cache = {
+                        key: entry for key, entry in self._user_cache.items()
+                        if now - entry[0] < USER_CACHE_TTL
+                    }
+                self._user_cache[name] = (now, user)
+            return dict(user)
+        return None
+    
+    def invalidate_user(self, name):
+        """Drop cached get_user/template results; call after writing to that user's document"""
+        with self._user_cache_lock:
+            self._user_cache.pop(name, None)
+            self._template_cache.pop(name, None)
+    
+    def _find_user_fields(self, name, *fields):
+        """Fetch only the given fields of a user document (None if no such user)"""
+        projection = {field: 1 for field in fields}
+        projection["_id"] = 0
+        return self.db.users.find_one({"name": name}, projection)
     
     def get_user_info(self, name):
         """Get user information (alias for get_user for compatibility)"""
@@ -224,12 +485,10 @@ class BiometricDatabase:
         """Get list of users with complete registration (both face and fingerprint)"""
         try:
             users_collection = self.db.users
+            # registration_complete is only set once both face and fingerprint are stored
+            # (save_fingerprint_template and update_registration_status check both)
             users = users_collection.find(
-                {
-                    "registration_complete": True,
-                    "face_image_id": {"$ne": None},
-                    "fingerprint_template": {"$ne": None}
-                },
+                {"registration_complete": True},
                 {"name": 1, "_id": 0}
             )
             
@@ -244,21 +503,70 @@ class BiometricDatabase:
     def get_face_image(self, user_name):
         """Get original face image for a user"""
         try:
-            user = self.get_user(user_name)
-            if not user or not user.get("face_image_id"):
+            user = self._find_user_fields(user_name, "face_image_id", "face_image_blob")
+            if not user:
+                return None
+            
+            if user.get("face_image_blob") is not None:
+                return bytes(user["face_image_blob"])
+            if not user.get("face_image_id"):
+                return None
+            
+            return self._read_grid_file(user["face_image_id"])
+            
+        except Exception as e:
+            print(f"❌ Error getting face image: {e}")
+            return None
+    
+    def prefetch_face_image(self, user_name):
+        """Start fetching a face image in the background; returns a Future for get_face_image's result
+        
+        PyMongo releases the GIL while waiting on the socket, so fetches overlap
+        with each other and with the caller's own work.
+        """
+        return self._io_pool.submit(self.get_face_image, user_name)
+    
+    def iter_face_image(self, user_name):
+        """Get original face image for a user as an iterator of GridFS chunks (None if missing)"""
+        try:
+            user = self._find_user_fields(user_name, "face_image_id", "face_image_blob")
+            if not user:
+                return None
+            
+            if user.get("face_image_blob") is not None:
+                return iter((bytes(user["face_image_blob"]),))
+            if not user.get("face_image_id"):
                 return None
             
-            image_file = self.fs.get(user["face_image_id"])
-            return image_file.read()
+            # Open eagerly so a missing file is reported here rather than mid-response
+            grid_out = self.fs_bucket.open_download_stream(user["face_image_id"])
+            return self._iter_grid_chunks(grid_out)
             
         except Exception as e:
             print(f"❌ Error getting face image: {e}")
             return None
     
+    def _read_grid_file(self, file_id):
+        """Read a GridFS file chunk by chunk into a single bytes object"""
+        grid_out = self.fs_bucket.open_download_stream(file_id)
+        return b"".join(self._iter_grid_chunks(grid_out))
+    
+    @staticmethod
+    def _iter_grid_chunks(grid_out):
+        """Yield a GridFS file one stored chunk at a time"""
+        try:
+            while True:
+                chunk = grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            grid_out.close()
+    
     def get_steganographic_image(self, user_name):
         """Get steganographic face image (with embedded key) for a user"""
         try:
-            user = self.get_user(user_name)
+            user = self._find_user_fields(user_name, "face_stego_image_id")
             if not user:
                 return None
             
@@ -267,49 +575,83 @@ class BiometricDatabase:
                 print(f"[INFO] No steganographic image found for {user_name}")
                 return None
             
-            stego_image_file = self.fs.get(user["face_stego_image_id"])
+            stego_image_data = self._read_grid_file(user["face_stego_image_id"])
             print(f"✅ Retrieved steganographic image for {user_name}")
-            return stego_image_file.read()
+            return stego_image_data
             
         except Exception as e:
             print(f"❌ Error getting steganographic image: {e}")
             return None
     
     def get_fingerprint_template(self, user_name):
-        """Get fingerprint template data for a user"""
+        """Get fingerprint template data for a user (decoded bytes are cached until the next write)"""
+        with self._user_cache_lock:
+            template_binary = self._template_cache.get(user_name)
+        if template_binary is not None:
+            return template_binary
+        
+        template_binary = self._load_fingerprint_template(user_name)
+        if template_binary is not None:
+            with self._user_cache_lock:
+                if len(self._template_cache) >= TEMPLATE_CACHE_MAX_ENTRIES:
+                    self._template_cache.pop(next(iter(self._template_cache)))  # oldest entry
+                self._template_cache[user_name] = template_binary
+        return template_binary
+    
+    def _load_fingerprint_template(self, user_name):
+        """Fetch and decode a user's fingerprint template from the database"""
         try:
-            user = self.get_user(user_name)
-            if not user or not user.get("fingerprint_template"):
-                return None
+            user = self._find_user_fields(user_name, "fingerprint_template", "fingerprint_algorithm")
             
-            # Check if this is SHA-256 user with old or new format
-            if user.get("fingerprint_algorithm") == "sha256":
-                template_data = user["fingerprint_template"]
-                
-                # Check if it's old format (SHA-256 key) or new format (base64 template)
-                if len(template_data) == 64 and all(c in '0123456789abcdef' for c in template_data.lower()):
+            # BSON binary, or a base64 string in older records
+            template_binary = decode_fingerprint_template(user)
+            if template_binary is None:
+                if user and user.get("fingerprint_algorithm") == "sha256" and _is_hex_key(user.get("fingerprint_template")):
                     # Old format: SHA-256 key stored as fingerprint_template
                     print(f"[WARNING] User {user_name} uses old SHA-256 format - cannot extract template for matching")
-                    return None
-                else:
-                    # New format: base64-encoded template data
-                    template_binary = base64.b64decode(template_data)
-                    print(f"[INFO] Retrieved template for SHA-256 user {user_name}: {len(template_binary)} bytes")
-                    return template_binary
-            else:
-                # Legacy base64-encoded template - convert back to binary
-                template_data = base64.b64decode(user["fingerprint_template"])
-                print(f"[INFO] Retrieved legacy template for {user_name}: {len(template_data)} bytes")
-                return template_data
+                return None
+            
+            print(f"[INFO] Retrieved template for {user_name}: {len(template_binary)} bytes")
+            return template_binary
                 
         except Exception as e:
             print(f"❌ Error getting fingerprint template: {e}")
             return None
     
+    def migrate_fingerprint_templates(self):
+        """Rewrite base64-string fingerprint templates as BSON binary (one-off migration)"""
+        try:
+            users_collection = self.db.users
+            migrated = 0
+            
+            for user in users_collection.find(
+                {"fingerprint_template": {"$type": "string"}},
+                {"name": 1, "fingerprint_template": 1, "fingerprint_algorithm": 1}
+            ):
+                template_data = user["fingerprint_template"]
+                
+                # Old SHA-256 records stored only the key here; there is no template to convert
+                if user.get("fingerprint_algorithm") == "sha256" and _is_hex_key(template_data):
+                    continue
+                
+                users_collection.update_one(
+                    {"_id": user["_id"]},
+                    {"$set": {"fingerprint_template": Binary(_b64decode(template_data))}}
+                )
+                self.invalidate_user(user["name"])
+                migrated += 1
+            
+            print(f"✅ Migrated {migrated} fingerprint template(s) to binary storage")
+            return migrated
+            
+        except Exception as e:
+            print(f"❌ Error migrating fingerprint templates: {e}")
+            return 0
+    
     def get_fingerprint_key(self, user_name):
         """Get SHA-256 fingerprint key for a user (for SHA-256 users only)"""
         try:
-            user = self.get_user(user_name)
+            user = self._find_user_fields(user_name, *FINGERPRINT_KEY_FIELDS)
             if not user:
                 return None
             
@@ -331,36 +673,19 @@ class BiometricDatabase:
     def authenticate_fingerprint(self, user_name, new_template_data):
         """Authenticate user by comparing SHA-256 keys with tolerance for sensor variations"""
         try:
-            user = self.get_user(user_name)
+            user = self._find_user_fields(user_name, *FINGERPRINT_KEY_FIELDS)
             if not user:
                 print(f"[ERROR] User {user_name} not found")
                 return False
             
             # Check if user has SHA-256 based fingerprint
             if user.get("fingerprint_algorithm") == "sha256":
-                # Generate SHA-256 key from new template
-                new_fingerprint_key = hashlib.sha256(new_template_data).hexdigest()
-                
-                # Get stored key
-                stored_key = user["fingerprint_template"]
-                
-                # Direct key comparison
-                keys_match = new_fingerprint_key == stored_key
-                
-                print(f"[DEBUG] Fingerprint authentication for {user_name}:")
-                print(f"   - New template size: {len(new_template_data)} bytes")
-                print(f"   - New key: {new_fingerprint_key}")
-                print(f"   - Stored key: {stored_key}")
-                print(f"   - Keys match: {keys_match}")
-                
-                if keys_match:
+                # Constant-time comparison of the new template's key with the stored one
+                if fingerprint_key_matches(user, new_template_data):
                     print(f"✅ SHA-256 fingerprint authentication successful for {user_name}")
                     return True
                 else:
                     print(f"❌ SHA-256 fingerprint authentication failed for {user_name}")
-                    
-                    # Additional debugging: Check if template data is consistent
-                    print(f"   - Template data preview: {new_template_data[:20].hex()}...")
                     return False
             else:
                 # Legacy comparison for backward compatibility
@@ -368,8 +693,7 @@ class BiometricDatabase:
                 stored_template = self.get_fingerprint_template(user_name)
                 if stored_template is None:
                     return False
-                # Simple byte comparison
-                return stored_template == new_template_data
+                return hmac.compare_digest(stored_template, bytes(new_template_data))
                 
         except Exception as e:
             print(f"❌ Error during fingerprint authentication: {e}")
@@ -386,19 +710,18 @@ class BiometricDatabase:
             if fingerprint_complete:
                 update_data["fingerprint_complete"] = True
             
-            # Check if both are complete
-            user = self.get_user(user_name)
-            if user:
-                face_done = user.get("face_image_id") is not None or face_complete
-                finger_done = user.get("fingerprint_template") is not None or fingerprint_complete
-                
-                if face_done and finger_done:
-                    update_data["registration_complete"] = True
+            # Mark registration complete server-side, atomically, once both biometrics are present
+            face_done = {"$or": [face_complete, HAS_FACE_IMAGE_EXPR]}
+            finger_done = {"$or": [fingerprint_complete, {"$ne": [{"$ifNull": ["$fingerprint_template", None]}, None]}]}
+            update_data["registration_complete"] = {
+                "$cond": [{"$and": [face_done, finger_done]}, True, "$registration_complete"]
+            }
             
             result = users_collection.update_one(
                 {"name": user_name},
-                {"$set": update_data}
+                [{"$set": update_data}]
             )
+            self.invalidate_user(user_name)
             
             return result.modified_count > 0
             
@@ -406,11 +729,17 @@ class BiometricDatabase:
             print(f"❌ Error updating registration status: {e}")
             return False
 
-# Global database instance
-db_instance = BiometricDatabase()
+@lru_cache(maxsize=None)
+def _database_for_process(pid):
+    """One BiometricDatabase (and so one MongoClient pool) per process.
+    
+    MongoClient is not fork-safe, so forked workers each get their own.
+    """
+    return BiometricDatabase()
 
 def get_database():
     """Get database instance (singleton pattern)"""
+    db_instance = _database_for_process(os.getpid())
     if not db_instance.client:
         db_instance.connect()
     return db_instance
@@ -464,6 +793,13 @@ def main():
     users = db.get_registered_users()
     print(f"Registered users: {users}")
     
+    print("\n6. Testing bulk SHA-256 key derivation...")
+    header = test_fingerprint[:16]  # Simulated templates sharing a sensor header
+    batch = [secrets.token_bytes(240) for _ in range(100)]
+    bulk_keys = list(db._bulk_sha256(batch, common_prefix=header))
+    expected_keys = [hashlib.sha256(header + body).hexdigest() for body in batch]
+    print(f"Bulk keys match per-template keys: {'✅ YES' if bulk_keys == expected_keys else '❌ NO'}")
+    
     # Cleanup
     db.disconnect()
     print("\n✅ Database test with SHA-256 keys completed!")
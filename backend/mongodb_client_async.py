@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Asyncio (Motor) variant of the MongoDB Atlas integration
+For async servers, where blocking PyMongo calls would stall the event loop
+"""
+
+import asyncio
+import hmac
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+from mongodb_client import (
+    BiometricDatabase, FINGERPRINT_KEY_FIELDS, INLINE_IMAGE_MAX_BYTES, MONGO_CONNECTION_STRING,
+    create_stego_image, decode_fingerprint_template, face_file_metadata, face_image_update,
+    fingerprint_key_matches, fingerprint_template_update, new_user_document, stored_fingerprint_key
+)
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+except ImportError:
+    AsyncIOMotorClient = None
+    AsyncIOMotorGridFSBucket = None
+
+class AsyncBiometricDatabase:
+    # Same connection settings as the synchronous client
+    _tls_options = BiometricDatabase._tls_options
+    _bulk_sha256 = staticmethod(BiometricDatabase._bulk_sha256)
+
+    def __init__(self, connection_string=None):
+        """Initialize MongoDB Atlas connection settings"""
+        self.connection_string = connection_string if connection_string is not None else MONGO_CONNECTION_STRING
+        self.database_name = "biometric_auth"
+        self.client = None
+        self.db = None
+        self.fs_bucket = None
+
+    async def connect(self):
+        """Connect to MongoDB Atlas"""
+        if AsyncIOMotorClient is None:
+            print("❌ motor is not installed; run: pip install motor")
+            return False
+
+        try:
+            self.client = AsyncIOMotorClient(
+                self.connection_string,
+                appname="biometric_auth_async",
+                **self._tls_options(),
+                serverSelectionTimeoutMS=5000,
+                connectTimeoutMS=5000,
+                socketTimeoutMS=5000,
+                maxPoolSize=50,
+                compressors="zstd,snappy,zlib",
+                retryWrites=True
+            )
+            self.db = self.client[self.database_name]
+            self.fs_bucket = AsyncIOMotorGridFSBucket(self.db)
+
+            await self.client.admin.command('ping')
+            print("✅ Connected to MongoDB Atlas (async) successfully!")
+            return True
+        except Exception as e:
+            print(f"❌ Connection error: {e}")
+            self.client = None
+            return False
+
+    def disconnect(self):
+        """Close MongoDB connection"""
+        if self.client:
+            self.client.close()
+            print("Disconnected from MongoDB Atlas")
+
+    async def create_user(self, name, email, phone):
+        """Create a new user in the database"""
+        try:
+            result = await self.db.users.insert_one(dict(new_user_document(email, phone), name=name))
+            print(f"✅ User created: {name} (ID: {result.inserted_id})")
+            return str(result.inserted_id)
+        except DuplicateKeyError:
+            print(f"❌ User already exists: {name}")
+            return None
+        except Exception as e:
+            print(f"❌ Error creating user: {e}")
+            return None
+
+    async def user_exists(self, name):
+        """Check if user already exists"""
+        try:
+            return await self.db.users.find_one({"name": name}, {"_id": 1}) is not None
+        except Exception as e:
+            print(f"❌ Error checking user: {e}")
+            return False
+
+    async def get_user(self, name):
+        """Get user data by name"""
+        try:
+            return await self.db.users.find_one({"name": name}, {"face_image_blob": 0})
+        except Exception as e:
+            print(f"❌ Error getting user: {e}")
+            return None
+
+    async def _find_user_fields(self, name, *fields):
+        """Fetch only the given fields of a user document (None if no such user)"""
+        projection = {field: 1 for field in fields}
+        projection["_id"] = 0
+        return await self.db.users.find_one({"name": name}, projection)
+
+    async def save_face_image(self, user_name, image_data, filename="face_001.jpg", *, fingerprint_key=None):
+        """Save original and steganographic face images, uploading both concurrently"""
+        try:
+            if fingerprint_key is None:
+                fingerprint_key = stored_fingerprint_key(await self._find_user_fields(user_name, *FINGERPRINT_KEY_FIELDS))
+
+            # Embedding is CPU work; keep it off the event loop
+            stego_image_data = await asyncio.to_thread(create_stego_image, user_name, image_data, fingerprint_key)
+
+            upload_date = datetime.now()
+            inline = len(image_data) <= INLINE_IMAGE_MAX_BYTES
+            uploads = []
+            if not inline:
+                uploads.append(self.fs_bucket.upload_from_stream(
+                    f"{user_name}_original_{filename}", image_data,
+                    metadata=face_file_metadata(user_name, image_data, upload_date)
+                ))
+            if stego_image_data is not None:
+                uploads.append(self.fs_bucket.upload_from_stream(
+                    f"{user_name}_steganographic_{filename}", stego_image_data,
+                    metadata=face_file_metadata(user_name, stego_image_data, upload_date, stego=True)
+                ))
+            results = await asyncio.gather(*uploads, return_exceptions=True)
+            file_ids = [r for r in results if not isinstance(r, BaseException)]
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                # One upload failed after another finished; don't leave the finished one orphaned
+                await self._delete_grid_files(file_ids)
+                print(f"❌ Error saving face image: {errors[0]}")
+                return False
+            # Same layout as the sync client: small originals live inline, face_image_id None
+            original_image_id = None if inline else file_ids[0]
+            stego_image_id = file_ids[-1] if stego_image_data is not None else None
+
+            update = face_image_update(image_data, original_image_id, stego_image_id, upload_date)
+            try:
+                result = await self.db.users.update_one({"name": user_name}, update)
+            except Exception:
+                await self._delete_grid_files(file_ids)
+                raise
+            if result.modified_count > 0:
+                status = "with steganographic version" if stego_image_id else "original only"
+                print(f"✅ Face image(s) saved for user: {user_name} ({status})")
+                return True
+
+            # GridFS uploads can't share a transaction; remove the files instead of orphaning them
+            await self._delete_grid_files(file_ids)
+            print(f"❌ Failed to update user record for: {user_name}")
+            return False
+
+        except Exception as e:
+            print(f"❌ Error saving face image: {e}")
+            return False
+
+    async def _delete_grid_files(self, file_ids):
+        """Best-effort removal of GridFS files that ended up unreferenced"""
+        results = await asyncio.gather(*(self.fs_bucket.delete(file_id) for file_id in file_ids),
+                                       return_exceptions=True)
+        for file_id, result in zip(file_ids, results):
+            if isinstance(result, Exception):
+                print(f"[WARNING] Could not delete orphaned GridFS file {file_id}: {result}")
+
+    async def save_fingerprint_template(self, user_name, template_data):
+        """Save fingerprint template and its SHA-256 key"""
+        try:
+            pipeline, _ = fingerprint_template_update(template_data)
+            result = await self.db.users.update_one({"name": user_name}, pipeline)
+            if result.modified_count > 0:
+                print(f"✅ Fingerprint SHA-256 key saved for user: {user_name}")
+                return True
+            print(f"❌ Failed to save fingerprint for user: {user_name}")
+            return False
+        except Exception as e:
+            print(f"❌ Error saving fingerprint template: {e}")
+            return False
+
+    async def _read_grid_file(self, file_id):
+        """Read a GridFS file into a single bytes object"""
+        grid_out = await self.fs_bucket.open_download_stream(file_id)
+        return await grid_out.read()
+
+    async def get_face_image(self, user_name):
+        """Get original face image for a user"""
+        try:
+            user = await self._find_user_fields(user_name, "face_image_id", "face_image_blob")
+            if not user:
+                return None
+            if user.get("face_image_blob") is not None:
+                return bytes(user["face_image_blob"])
+            if not user.get("face_image_id"):
+                return None
+            return await self._read_grid_file(user["face_image_id"])
+        except Exception as e:
+            print(f"❌ Error getting face image: {e}")
+            return None
+
+    async def get_steganographic_image(self, user_name):
+        """Get steganographic face image (with embedded key) for a user"""
+        try:
+            user = await self._find_user_fields(user_name, "face_stego_image_id")
+            if not user or not user.get("face_stego_image_id"):
+                return None
+            return await self._read_grid_file(user["face_stego_image_id"])
+        except Exception as e:
+            print(f"❌ Error getting steganographic image: {e}")
+            return None
+
+    async def get_fingerprint_template(self, user_name):
+        """Get fingerprint template data for a user"""
+        try:
+            user = await self._find_user_fields(user_name, "fingerprint_template", "fingerprint_algorithm")
+            return decode_fingerprint_template(user)
+        except Exception as e:
+            print(f"❌ Error getting fingerprint template: {e}")
+            return None
+
+    async def authenticate_fingerprint(self, user_name, new_template_data):
+        """Authenticate user by comparing SHA-256 keys"""
+        try:
+            user = await self._find_user_fields(user_name, *FINGERPRINT_KEY_FIELDS)
+            if not user:
+                print(f"[ERROR] User {user_name} not found")
+                return False
+
+            if user.get("fingerprint_algorithm") == "sha256":
+                return fingerprint_key_matches(user, new_template_data)
+
+            stored_template = await self.get_fingerprint_template(user_name)
+            if stored_template is None:
+                return False
+            return hmac.compare_digest(stored_template, bytes(new_template_data))
+        except Exception as e:
+            print(f"❌ Error during fingerprint authentication: {e}")
+            return False
+
+    async def get_registered_users(self):
+        """Get list of users with complete registration (both face and fingerprint)"""
+        try:
+            cursor = self.db.users.find({"registration_complete": True}, {"name": 1, "_id": 0})
+            return [user["name"] async for user in cursor]
+        except Exception as e:
+            print(f"❌ Error getting registered users: {e}")
+            return []
+
+def run_sync(method_name, *args, **kwargs):
+    """Call an AsyncBiometricDatabase method from synchronous code.
+
+    Motor clients are bound to one event loop, so each call connects on a fresh loop;
+    long-running synchronous code should keep using BiometricDatabase instead.
+    """
+    async def call():
+        db = AsyncBiometricDatabase()
+        if not await db.connect():
+            return None
+        try:
+            return await getattr(db, method_name)(*args, **kwargs)
+        finally:
+            db.disconnect()
+
+    return asyncio.run(call())
@@ -6,15 +6,80 @@ Embeds SHA-256 fingerprint keys into face images using LSB (Least Significant Bi
 
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, features
 import io
 import base64
+import os
+import re
+import struct
+import zlib
+
+try:
+    from numba import njit  # JIT-compiled LSB kernels when installed
+except ImportError:
+    njit = None
+
+# A SHA-256 key as extracted from the image: exactly 64 hex characters
+_HEX_KEY_RE = re.compile(rb'[0-9a-fA-F]{64}')
+
+# Hidden payload layout: magic | key length (uint16 LE) | key bytes
+_MAGIC = b'BIOK'
+_PAYLOAD_HEADER = struct.Struct('<4sH')
+_HEADER_BITS = _PAYLOAD_HEADER.size * 8
+
+# Metadata carriers for the key: a private ancillary PNG chunk, or a JPEG APP15 segment
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_KEY_CHUNK = b'stEG'
+_JPEG_KEY_MARKER = 0xEF
+
+# STEGO_METADATA_CHUNK=1 stores new keys in image metadata instead of pixel LSBs (no decode/re-encode)
+USE_METADATA_CHUNK = os.environ.get("STEGO_METADATA_CHUNK") == "1"
+
+def _embed_lsb_numpy(flat_img, bits):
+    """Write bits into the LSBs of flat_img[:len(bits)] (in place)"""
+    n = bits.size
+    flat_img[:n] = (flat_img[:n] & np.uint8(0xFE)) | bits
+
+def _extract_lsb_numpy(flat_img, start, n_bytes):
+    """Pack the LSBs of flat_img[start:start + 8*n_bytes] into n_bytes bytes (MSB first)"""
+    return np.packbits(flat_img[start:start + n_bytes * 8] & 1)
+
+if njit is not None:
+    @njit(cache=True)
+    def _embed_lsb(flat_img, bits):
+        for i in range(bits.size):
+            flat_img[i] = (flat_img[i] & 0xFE) | bits[i]
+
+    @njit(cache=True)
+    def _extract_lsb(flat_img, start, n_bytes):
+        n_bytes = min(n_bytes, (flat_img.size - start) // 8)
+        out = np.empty(n_bytes, dtype=np.uint8)
+        for j in range(n_bytes):
+            value = 0
+            base = start + j * 8
+            for k in range(8):
+                value = (value << 1) | (flat_img[base + k] & 1)
+            out[j] = value
+        return out
+
+    # Compile (or load from cache) at import so the first login doesn't pay for it
+    _embed_lsb(np.zeros(8, dtype=np.uint8), np.zeros(8, dtype=np.uint8))
+    _extract_lsb(np.zeros(8, dtype=np.uint8), 0, 1)
+else:
+    _embed_lsb = _embed_lsb_numpy
+    _extract_lsb = _extract_lsb_numpy
+
+def _decode_bgr(image_data):
+    """Decode JPEG/PNG/WebP bytes to OpenCV's BGR uint8 array (None if undecodable)"""
+    return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
 
 class BiometricSteganography:
     """Class for embedding and extracting biometric keys in/from images"""
     
-    def __init__(self):
-        self.delimiter = "|||END_OF_KEY|||"  # Delimiter to mark end of hidden data
+    def __init__(self, use_metadata_chunk=None):
+        self.use_metadata_chunk = USE_METADATA_CHUNK if use_metadata_chunk is None else use_metadata_chunk
+        self.delimiter = "|||END_OF_KEY|||"  # End marker used by images embedded before the length header
+        self._delimiter_bytes = self.delimiter.encode('ascii')
     
     def string_to_binary(self, text):
         """Convert string to binary representation"""
@@ -36,46 +101,40 @@ class BiometricSteganography:
         Returns:
             tuple: (success, modified_image_data, message)
         """
+        if self.use_metadata_chunk:
+            success, modified_image_data, message = self.embed_key_as_metadata(image_data, fingerprint_key)
+            if success:
+                return success, modified_image_data, message
+            # Neither PNG nor JPEG: fall through to LSB embedding
+        
         try:
-            # Convert binary data to PIL Image
-            image_buffer = io.BytesIO(image_data)
-            image = Image.open(image_buffer)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Convert to numpy array
-            img_array = np.array(image)
+            # Decode straight to a numpy array; bits go into OpenCV's native BGR order, no colour conversion
+            img_array = _decode_bgr(image_data)
+            if img_array is None:
+                return False, None, "Could not decode image"
             height, width, channels = img_array.shape
             
-            # Prepare data to hide: key + delimiter
-            data_to_hide = fingerprint_key + self.delimiter
-            binary_data = self.string_to_binary(data_to_hide)
+            # Prepare data to hide: header + key, as bits (MSB first, same order as string_to_binary)
+            key_bytes = fingerprint_key.encode('ascii')
+            payload = _PAYLOAD_HEADER.pack(_MAGIC, len(key_bytes)) + key_bytes
+            bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
             
             # Check if image can hold the data
             max_capacity = height * width * channels
-            if len(binary_data) > max_capacity:
+            if bits.size > max_capacity:
                 return False, None, "Image too small to hold the fingerprint key"
             
-            # Flatten image array
-            flat_img = img_array.flatten()
-            
-            # Embed data using LSB
-            for i, bit in enumerate(binary_data):
-                # Modify the least significant bit
-                flat_img[i] = (flat_img[i] & 0xFE) | int(bit)
+            # Flat view of the image (shares storage, no copy)
+            flat_img = img_array.reshape(-1)
             
-            # Reshape back to original dimensions
-            modified_img = flat_img.reshape(height, width, channels)
+            # Embed data using LSB, directly in img_array
+            _embed_lsb(flat_img, bits)
             
-            # Convert back to PIL Image
-            result_image = Image.fromarray(modified_img.astype(np.uint8))
-            
-            # Save to bytes
-            output_buffer = io.BytesIO()
-            result_image.save(output_buffer, format='PNG', quality=95)
-            modified_image_data = output_buffer.getvalue()
+            # Encode to PNG with fast deflate: LSB data must stay lossless, but max compression isn't worth the CPU
+            ok, encoded = cv2.imencode('.png', img_array, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if not ok:
+                return False, None, "Could not encode image"
+            modified_image_data = encoded.tobytes()
             
             print(f"✅ Successfully embedded {len(fingerprint_key)} character key into image")
             print(f"   - Original image size: {len(image_data)} bytes")
@@ -99,49 +158,35 @@ class BiometricSteganography:
             tuple: (success, extracted_key, message)
         """
         try:
-            # Convert binary data to PIL Image
-            image_buffer = io.BytesIO(image_data)
-            image = Image.open(image_buffer)
+            # Keys stored in image metadata need no pixel decode
+            key_bytes = _find_metadata_payload(image_data)
+            if key_bytes is not None:
+                if _HEX_KEY_RE.fullmatch(key_bytes):
+                    fingerprint_key = key_bytes.decode('ascii')
+                    print(f"✅ Successfully extracted fingerprint key from image metadata")
+                    return True, fingerprint_key.lower(), "Fingerprint key successfully extracted"
+                return False, None, "No valid fingerprint key found in image"
             
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Convert to numpy array and flatten
-            img_array = np.array(image)
-            flat_img = img_array.flatten()
-            
-            # Extract binary data from LSB
-            binary_data = ''
-            
-            # Read enough bits to find the delimiter
-            max_bits = len(flat_img)
-            delimiter_binary = self.string_to_binary(self.delimiter)
-            
-            for i in range(max_bits):
-                binary_data += str(flat_img[i] & 1)  # Extract LSB
-                
-                # Check for delimiter every 8 bits (after each potential character)
-                if len(binary_data) % 8 == 0 and len(binary_data) >= len(delimiter_binary):
-                    try:
-                        # Convert current binary to string
-                        current_text = self.binary_to_string(binary_data)
-                        
-                        # Check if delimiter is present
-                        if self.delimiter in current_text:
-                            # Extract the key part (before delimiter)
-                            parts = current_text.split(self.delimiter)
-                            if len(parts) > 1:
-                                fingerprint_key = parts[0]
-                                
-                                # Validate key format (64 character hex)
-                                if len(fingerprint_key) == 64 and all(c in '0123456789abcdefABCDEF' for c in fingerprint_key):
-                                    print(f"✅ Successfully extracted fingerprint key from image")
-                                    print(f"   - Key preview: {fingerprint_key[:16]}...{fingerprint_key[-16:]}")
-                                    return True, fingerprint_key.lower(), "Fingerprint key successfully extracted"
-                    except (UnicodeDecodeError, ValueError):
-                        # Continue if we can't decode properly yet
-                        continue
+            # Decode straight to a numpy array (BGR, the order keys are embedded in)
+            img_array = _decode_bgr(image_data)
+            if img_array is None:
+                return False, None, "Could not decode image"
+            
+            # Read the fixed header, then exactly the key's bits
+            key_bytes = self._read_header_key(img_array.reshape(-1))
+            if key_bytes is None:
+                # Older images were embedded in RGB order, some with the trailing delimiter
+                rgb_flat = img_array[..., ::-1].reshape(-1)
+                key_bytes = self._read_header_key(rgb_flat)
+                if key_bytes is None:
+                    key_bytes = self._find_delimited_key(rgb_flat)
+            
+            # Validate key format (64 character hex)
+            if key_bytes is not None and _HEX_KEY_RE.fullmatch(key_bytes):
+                fingerprint_key = key_bytes.decode('ascii')
+                print(f"✅ Successfully extracted fingerprint key from image")
+                print(f"   - Key preview: {fingerprint_key[:16]}...{fingerprint_key[-16:]}")
+                return True, fingerprint_key.lower(), "Fingerprint key successfully extracted"
             
             return False, None, "No valid fingerprint key found in image"
             
@@ -149,6 +194,55 @@ class BiometricSteganography:
             print(f"❌ Error extracting key from image: {e}")
             return False, None, f"Extraction error: {str(e)}"
     
+    def embed_key_as_metadata(self, image_data, fingerprint_key):
+        """
+        Store the key in a private PNG chunk (stEG) or JPEG APP15 segment, leaving pixels untouched
+        
+        Returns:
+            tuple: (success, modified_image_data, message)
+        """
+        key_bytes = fingerprint_key.encode('ascii')
+        payload = _PAYLOAD_HEADER.pack(_MAGIC, len(key_bytes)) + key_bytes
+        
+        if image_data[:8] == _PNG_SIGNATURE:
+            # Insert right after IHDR, which is always the first chunk
+            ihdr_length = struct.unpack('>I', image_data[8:12])[0]
+            insert_at = 8 + 12 + ihdr_length
+            chunk = (struct.pack('>I', len(payload)) + _PNG_KEY_CHUNK + payload +
+                     struct.pack('>I', zlib.crc32(_PNG_KEY_CHUNK + payload)))
+            return True, image_data[:insert_at] + chunk + image_data[insert_at:], "Fingerprint key stored in PNG metadata"
+        
+        if image_data[:2] == b'\xff\xd8':
+            segment = bytes((0xFF, _JPEG_KEY_MARKER)) + struct.pack('>H', len(payload) + 2) + payload
+            return True, image_data[:2] + segment + image_data[2:], "Fingerprint key stored in JPEG metadata"
+        
+        return False, None, "Metadata embedding supports PNG and JPEG only"
+    
+    def _read_header_key(self, flat_img):
+        """Magic + length layout: return the key bytes, or None if the header isn't there"""
+        header = _extract_lsb(flat_img, 0, _PAYLOAD_HEADER.size).tobytes()
+        if len(header) != _PAYLOAD_HEADER.size or header[:4] != _MAGIC:
+            return None
+        _, key_length = _PAYLOAD_HEADER.unpack(header)
+        if _HEADER_BITS + key_length * 8 > flat_img.size:
+            return None
+        return _extract_lsb(flat_img, _HEADER_BITS, key_length).tobytes()
+    
+    def _find_delimited_key(self, flat_img):
+        """Legacy layout (key + delimiter): return the bytes before the delimiter, or None"""
+        # Pack the LSBs of a prefix into bytes and look for the delimiter;
+        # grow the prefix only if the delimiter isn't inside it yet
+        delimiter_bytes = self._delimiter_bytes
+        probe = min(flat_img.size, (64 + len(delimiter_bytes) + 32) * 8)
+        while True:
+            packed = np.packbits(flat_img[:probe] & 1).tobytes()
+            idx = packed.find(delimiter_bytes)
+            if idx != -1:
+                return packed[:idx]
+            if probe >= flat_img.size:
+                return None
+            probe = min(flat_img.size, probe * 2)
+    
     def verify_key_in_image(self, image_data, expected_key):
         """
         Verify that a specific key is embedded in the image
@@ -169,6 +263,82 @@ class BiometricSteganography:
             print(f"❌ Key verification failed - keys do not match")
             return False
 
+    def to_lossless_webp(self, image_data):
+        """
+        Re-encode a steganographic image as lossless WebP (typically much smaller than PNG)
+        
+        Returns:
+            bytes or None: WebP data, or None when WebP is unavailable, the pixels
+            (and so the embedded key) would not survive exactly, or it isn't smaller
+        """
+        try:
+            if not features.check('webp') or _find_metadata_payload(image_data) is not None:
+                return None  # no WebP support, or the key lives in metadata WebP would drop
+            
+            image = Image.open(io.BytesIO(image_data))
+            if image.mode != 'RGB':
+                return None  # embed_key_in_image always produces RGB
+            
+            output_buffer = io.BytesIO()
+            image.save(output_buffer, format='WEBP', lossless=True, quality=100, method=6, exact=True)
+            webp_data = output_buffer.getvalue()
+            if len(webp_data) >= len(image_data):
+                return None
+            
+            # Only use WebP if every LSB round-trips unchanged
+            decoded = Image.open(io.BytesIO(webp_data)).convert('RGB')
+            if not np.array_equal(np.asarray(decoded), np.asarray(image)):
+                return None
+            return webp_data
+            
+        except Exception as e:
+            print(f"[WARNING] Lossless WebP re-encode failed, keeping PNG: {e}")
+            return None
+
+def _find_metadata_payload(image_data):
+    """Key bytes from a stEG PNG chunk or APP15 JPEG segment, or None if the image has neither"""
+    if image_data[:8] == _PNG_SIGNATURE:
+        offset = 8
+        while offset + 8 <= len(image_data):
+            length, chunk_type = struct.unpack('>I4s', image_data[offset:offset + 8])
+            if chunk_type == _PNG_KEY_CHUNK:
+                return _unpack_payload(image_data[offset + 8:offset + 8 + length])
+            if chunk_type == b'IDAT':
+                return None  # our chunk always precedes the image data
+            offset += 12 + length
+        return None
+    
+    if image_data[:2] == b'\xff\xd8':
+        offset = 2
+        while offset + 4 <= len(image_data) and image_data[offset] == 0xFF:
+            marker = image_data[offset + 1]
+            if marker == 0xDA:
+                return None  # start of scan: no more header segments
+            length = struct.unpack('>H', image_data[offset + 2:offset + 4])[0]
+            if marker == _JPEG_KEY_MARKER:
+                payload = _unpack_payload(image_data[offset + 4:offset + 2 + length])
+                if payload is not None:
+                    return payload
+            offset += 2 + length
+    return None
+
+def _unpack_payload(payload):
+    """Key bytes from a magic + length payload, or None if it isn't one"""
+    if len(payload) < _PAYLOAD_HEADER.size:
+        return None
+    magic, key_length = _PAYLOAD_HEADER.unpack_from(payload)
+    if magic != _MAGIC:
+        return None
+    return bytes(payload[_PAYLOAD_HEADER.size:_PAYLOAD_HEADER.size + key_length])
+
+def image_mimetype(image_data):
+    """MIME type of a stored face image (WebP, JPEG or PNG)"""
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_data[:2] == b'\xff\xd8':
+        return 'image/jpeg'
+    return 'image/png'
+
 def test_steganography():
     """Test function for steganography operations"""
     print("=== Biometric Steganography Test ===")
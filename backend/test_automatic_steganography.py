@@ -9,7 +9,10 @@ import sys
 import os
 sys.path.append(os.path.dirname(__file__))
 
-from mongodb_client import get_database
+from mongodb_client import get_database, has_face_image
+
+# Names listed per category; the counts always cover every user
+DISPLAY_LIMIT = 50
 
 def test_automatic_steganography():
     """Test that steganographic images are created automatically"""
@@ -24,31 +27,39 @@ def test_automatic_steganography():
     
     users_collection = db.db.users
     
-    # Get all users
-    all_users = list(users_collection.find({}, {"name": 1, "face_image_id": 1, 
-                                                  "fingerprint_key": 1, "fingerprint_algorithm": 1,
-                                                  "has_steganographic_image": 1, 
-                                                  "face_stego_image_id": 1}))
-    
-    print(f"\n📊 Total users in database: {len(all_users)}\n")
+    # Stream all users (projected) in batches instead of loading the whole collection
+    cursor = users_collection.find({}, {"name": 1, "face_image_id": 1, "face_image_inline": 1,
+                                        "fingerprint_key": 1, "fingerprint_algorithm": 1,
+                                        "has_steganographic_image": 1, 
+                                        "face_stego_image_id": 1, "_id": 0}).batch_size(500)
     
-    # Categorize users
+    # Categorize users (counts for all, names for the first DISPLAY_LIMIT of each)
+    total = complete_count = pending_count = incomplete_count = 0
     complete_users = []      # Has face + fingerprint + stego
     pending_users = []       # Has face + fingerprint, but no stego
     incomplete_users = []    # Missing face or fingerprint
     
-    for user in all_users:
+    for user in cursor:
+        total += 1
         name = user['name']
-        has_face = user.get('face_image_id') is not None
+        has_face = has_face_image(user)
         has_fingerprint = (user.get('fingerprint_key') or user.get('fingerprint_algorithm')) is not None
         has_stego = user.get('has_steganographic_image', False) and user.get('face_stego_image_id') is not None
         
         if has_face and has_fingerprint and has_stego:
-            complete_users.append(name)
+            complete_count += 1
+            if len(complete_users) < DISPLAY_LIMIT:
+                complete_users.append(name)
         elif has_face and has_fingerprint and not has_stego:
-            pending_users.append(name)
+            pending_count += 1
+            if len(pending_users) < DISPLAY_LIMIT:
+                pending_users.append(name)
         else:
-            incomplete_users.append((name, has_face, has_fingerprint))
+            incomplete_count += 1
+            if len(incomplete_users) < DISPLAY_LIMIT:
+                incomplete_users.append((name, has_face, has_fingerprint))
+    
+    print(f"\n📊 Total users in database: {total}\n")
     
     # Display results
     print("✅ COMPLETE USERS (Face + Fingerprint + Steganographic Image):")
@@ -56,6 +67,8 @@ def test_automatic_steganography():
     if complete_users:
         for name in complete_users:
             print(f"  ✓ {name}")
+        if complete_count > len(complete_users):
+            print(f"  ... and {complete_count - len(complete_users)} more")
     else:
         print("  (none)")
     print()
@@ -65,6 +78,8 @@ def test_automatic_steganography():
     if pending_users:
         for name in pending_users:
             print(f"  ⚠️ {name}")
+        if pending_count > len(pending_users):
+            print(f"  ... and {pending_count - len(pending_users)} more")
         print(f"\n  💡 Tip: Run 'python create_steganographic_images.py' to fix these users")
         print(f"  💡 OR: Re-register them to trigger automatic creation")
     else:
@@ -81,6 +96,8 @@ def test_automatic_steganography():
             if not has_fp:
                 status.append("No Fingerprint")
             print(f"  ❌ {name} - {', '.join(status)}")
+        if incomplete_count > len(incomplete_users):
+            print(f"  ... and {incomplete_count - len(incomplete_users)} more")
     else:
         print("  (none)")
     print()
@@ -89,10 +106,11 @@ def test_automatic_steganography():
     print("=" * 70)
     print("📈 SUMMARY")
     print("=" * 70)
-    print(f"Total Users:      {len(all_users)}")
-    print(f"✅ Complete:      {len(complete_users)} ({len(complete_users)/len(all_users)*100:.1f}%)")
-    print(f"⚠️  Pending:       {len(pending_users)} ({len(pending_users)/len(all_users)*100:.1f}%)")
-    print(f"❌ Incomplete:    {len(incomplete_users)} ({len(incomplete_users)/len(all_users)*100:.1f}%)")
+    print(f"Total Users:      {total}")
+    if total:
+        print(f"✅ Complete:      {complete_count} ({complete_count/total*100:.1f}%)")
+        print(f"⚠️  Pending:       {pending_count} ({pending_count/total*100:.1f}%)")
+        print(f"❌ Incomplete:    {incomplete_count} ({incomplete_count/total*100:.1f}%)")
     print("=" * 70)
     
     # Test automatic creation
@@ -112,10 +130,10 @@ def test_automatic_steganography():
     
     # Return statistics
     return {
-        "total": len(all_users),
-        "complete": len(complete_users),
-        "pending": len(pending_users),
-        "incomplete": len(incomplete_users)
+        "total": total,
+        "complete": complete_count,
+        "pending": pending_count,
+        "incomplete": incomplete_count
     }
 
 if __name__ == "__main__":
@@ -9,7 +9,7 @@ import os
 # Add current directory to path
 sys.path.append(os.path.dirname(__file__))
 
-from mongodb_client import get_database
+from mongodb_client import get_database, HAS_FACE_IMAGE_EXPR
 
 def test_user_retrieval():
     """Test user data retrieval from MongoDB"""
@@ -27,23 +27,43 @@ def test_user_retrieval():
     # Get all users from the database
     try:
         users_collection = db.db.users
-        all_users = list(users_collection.find({}))
+        # Project only what is printed; the template/image presence checks are evaluated server-side
+        # so the binary fields never leave the database
+        cursor = users_collection.aggregate([
+            {"$project": {
+                "_id": 0,
+                "name": 1,
+                "email": 1,
+                "phone": 1,
+                "created_at": 1,
+                "registration_complete": 1,
+                "has_face_image": HAS_FACE_IMAGE_EXPR,
+                "has_fingerprint": {"$cond": [{"$ifNull": ["$fingerprint_template", False]}, True, False]}
+            }}
+        ], batchSize=100)
         
-        print(f"\n📊 Found {len(all_users)} users in database:")
+        print(f"\n📊 Users in database (about {users_collection.estimated_document_count()}):")
         
-        for user in all_users:
+        # Print as the cursor streams in; keep only a count and the first user
+        user_count = 0
+        first_user = None
+        for user in cursor:
+            user_count += 1
+            if first_user is None:
+                first_user = user
             print(f"\n👤 User: {user.get('name', 'Unknown')}")
             print(f"   📧 Email: {user.get('email', 'No email')}")
             print(f"   📱 Phone: {user.get('phone', 'No phone')}")
             print(f"   📅 Created: {user.get('created_at', 'Unknown')}")
-            print(f"   🖼️  Face Image: {'✅ Yes' if user.get('face_image_id') else '❌ No'}")
-            print(f"   👆 Fingerprint: {'✅ Yes' if user.get('fingerprint_template') else '❌ No'}")
+            print(f"   🖼️  Face Image: {'✅ Yes' if user.get('has_face_image') else '❌ No'}")
+            print(f"   👆 Fingerprint: {'✅ Yes' if user.get('has_fingerprint') else '❌ No'}")
             print(f"   ✅ Complete: {'Yes' if user.get('registration_complete') else 'No'}")
         
+        print(f"\n📊 Listed {user_count} users")
+        
         # Test specific user retrieval
-        if all_users:
-            test_user = all_users[0]
-            username = test_user.get('name')
+        if first_user:
+            username = first_user.get('name')
             
             print(f"\n🔍 Testing get_user_info() for: {username}")
             
@@ -195,7 +195,7 @@ function Admin({ onBackToHome }) {
                           <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                             <div className="space-y-1">
                               <div className="flex items-center">
-                                {user.face_image_id ? (
+                                {user.face_image_id || user.face_image_inline ? (
                                   <span className="text-green-600">✅ Face</span>
                                 ) : (
                                   <span className="text-red-600">❌ Face</span>
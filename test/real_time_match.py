@@ -11,9 +11,47 @@ Author: Created for real-time fingerprint matching
 import serial
 import time
 import struct
+import zlib
 import os
+import select
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# R307 packet layout: start code, address, packet identifier, length (then data, 16-bit checksum);
+# pre-compiled once and shared by every packet read/write
+_HDR = struct.Struct('>HIBH')
+_U16 = struct.Struct('>H')
+
+# Factory baud rate of the R307, and the faster rate used with --fast-baud (the sensor's maximum)
+R307_DEFAULT_BAUD = 57600
+FAST_BAUD_RATE = 115200
+
+# Rates tried on connect; the sensor keeps its baud setting, e.g. after an interrupted --fast-baud run
+PROBE_BAUD_RATES = (R307_DEFAULT_BAUD, FAST_BAUD_RATE)
+
+# Serial timeouts: a short per-read timeout, a tight gap limit inside a packet, and a longer
+# wait for a response to start, which covers slow commands such as image capture
+READ_TIMEOUT = 0.3
+INTER_BYTE_TIMEOUT = 0.05
+RESPONSE_TIMEOUT = 2.0
+WRITE_TIMEOUT = 1.0
+
+# Payloads longer than this are summed with NumPy; below it the call overhead outweighs the gain
+NUMPY_SUM_THRESHOLD = 32
+
+def _byte_sum(data):
+    """Sum of a payload's bytes (used for packet checksums)"""
+    if np is not None and len(data) > NUMPY_SUM_THRESHOLD:
+        return int(np.frombuffer(data, dtype=np.uint8).sum(dtype=np.uint64))
+    return sum(memoryview(data))
+
 class R307RealTimeMatcher:
     """Interface for R307 fingerprint sensor real-time matching"""
     
@@ -23,6 +61,11 @@ class R307RealTimeMatcher:
     CMD_MATCH = 0x03
     CMD_UP_CHAR = 0x08
     CMD_DOWN_CHAR = 0x09
+    CMD_SET_SYS_PARA = 0x0E
+    CMD_TEMPLATE_NUM = 0x1D
+    
+    # System parameter numbers (SetSysPara)
+    SYS_PARA_BAUD = 4  # Value N means N x 9600 baud
     
     # Response codes
     FINGERPRINT_OK = 0x00
@@ -41,12 +84,17 @@ class R307RealTimeMatcher:
     FINGERPRINT_ACKPACKET = 0x07
     FINGERPRINT_ENDDATAPACKET = 0x08
     
-    def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
+    def __init__(self, port='COM3', baud_rate=R307_DEFAULT_BAUD, address=0xFFFFFFFF):
         """Initialize connection to R307 sensor"""
         self.port = port
         self.baud_rate = baud_rate
         self.address = address
         self.serial_conn = None
+        self._prebuilt_template = None  # Template whose framed packets are cached below
+        self._prebuilt_download_stream = None
+        self._buffer1_loaded_crc = None  # CRC-32 of the template currently held in sensor buffer 1
+        self._prebuilt_crc = None  # CRC-32 of the prebuilt template, computed once
+        self._template_files = {}  # filename -> (mtime_ns, size, template bytes)
         
     def connect(self):
         """Establish serial connection to sensor"""
@@ -57,9 +105,13 @@ class R307RealTimeMatcher:
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
-                timeout=2
+                timeout=READ_TIMEOUT,
+                inter_byte_timeout=INTER_BYTE_TIMEOUT,
+                write_timeout=WRITE_TIMEOUT
             )
-            print(f"Connected to R307 sensor on {self.port}")
+            self._buffer1_loaded_crc = None
+            self._probe_baud()
+            print(f"Connected to R307 sensor on {self.port} ({self.baud_rate} baud)")
             return True
         except serial.SerialException as e:
             print(f"Failed to connect to sensor: {e}")
@@ -71,61 +123,127 @@ class R307RealTimeMatcher:
             self.serial_conn.close()
             print("Disconnected from sensor")
     
-    def _write_packet(self, packet_type, data):
-        """Write packet to sensor with proper header and checksum"""
-        packet = struct.pack('>H', self.FINGERPRINT_STARTCODE)
-        packet += struct.pack('>I', self.address)
-        packet += struct.pack('>B', packet_type)
-        packet += struct.pack('>H', len(data) + 2)
-        packet += data
+    def set_baud(self, baud_rate):
+        """Switch sensor and serial port to a new baud rate (a multiple of 9600, up to 115200)"""
+        if baud_rate % 9600 or not 1 <= baud_rate // 9600 <= 12:
+            print(f"Unsupported baud rate: {baud_rate}")
+            return False
+        if baud_rate == self.baud_rate:
+            return True
+        
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET,
+                           bytes([self.CMD_SET_SYS_PARA, self.SYS_PARA_BAUD, baud_rate // 9600]))
+        packet_type, data = self._read_packet()
+        if packet_type != self.FINGERPRINT_ACKPACKET or len(data) == 0 or data[0] != self.FINGERPRINT_OK:
+            print(f"Sensor rejected baud rate {baud_rate}")
+            return False
+        
+        # The sensor acknowledged, so it should now be at the new rate; confirm before trusting it
+        old_rate = self.baud_rate
+        if self._probe_baud((baud_rate, old_rate)) and self.baud_rate == baud_rate:
+            print(f"Serial link switched to {baud_rate} baud")
+            return True
+        print(f"Sensor did not answer at {baud_rate} baud; serial link at {self.baud_rate}")
+        return False
+    
+    def _probe_baud(self, rates=None):
+        """Find the rate the sensor answers at, trying the current one first
         
-        # Calculate checksum
-        checksum = packet_type + len(data) + 2 + sum(data)
-        packet += struct.pack('>H', checksum)
+        Leaves the port and self.baud_rate at the answering rate and returns True. If the
+        sensor answers at none of them, the port stays at the first rate tried.
+        """
+        rates = rates or (self.baud_rate,) + tuple(r for r in PROBE_BAUD_RATES if r != self.baud_rate)
+        for rate in rates:
+            self.serial_conn.baudrate = rate
+            self.serial_conn.reset_input_buffer()
+            if self._ping():
+                self.baud_rate = rate
+                return True
         
-        self.serial_conn.write(packet)
+        self.serial_conn.baudrate = self.baud_rate = rates[0]
+        return False
+    
+    def _ping(self):
+        """Cheap status query (template count); True if the sensor answers"""
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_TEMPLATE_NUM]))
+        packet_type, data = self._read_packet()
+        return packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0 and data[0] == self.FINGERPRINT_OK
+    
+    def _write_packet(self, packet_type, data):
+        """Write packet to sensor with proper header and checksum"""
+        self.serial_conn.write(self._build_packet(packet_type, data))
+    
+    def _build_packet(self, packet_type, data):
+        """Frame data as a packet with header and checksum"""
+        header = _HDR.pack(self.FINGERPRINT_STARTCODE, self.address, packet_type, len(data) + 2)
         
+        # Calculate checksum (low 16 bits)
+        checksum = (packet_type + len(data) + 2 + _byte_sum(data)) & 0xFFFF
+        return header + data + _U16.pack(checksum)
+    
     def _read_packet(self):
         """Read response packet from sensor"""
-        # Read header
-        header = self.serial_conn.read(2)
-        if len(header) != 2:
+        # Wait for the response to start, then read the fixed header (start code, address,
+        # identifier, length) in one go
+        if not self._wait_for_response(RESPONSE_TIMEOUT):
             return None, None
-            
-        start_code = struct.unpack('>H', header)[0]
-        if start_code != self.FINGERPRINT_STARTCODE:
-            return None, None
-        
-        # Read address
-        addr_data = self.serial_conn.read(4)
-        if len(addr_data) != 4:
-            return None, None
-        
-        # Read packet identifier
-        pid_data = self.serial_conn.read(1)
-        if len(pid_data) != 1:
+        header = self.serial_conn.read(_HDR.size)
+        if 0 < len(header) < _HDR.size:
+            header += self.serial_conn.read(_HDR.size - len(header))
+        if len(header) != _HDR.size:
             return None, None
-        packet_type = struct.unpack('>B', pid_data)[0]
         
-        # Read length
-        len_data = self.serial_conn.read(2)
-        if len(len_data) != 2:
+        start_code, _, packet_type, packet_len = _HDR.unpack_from(header)
+        if start_code != self.FINGERPRINT_STARTCODE or packet_len < 2:
             return None, None
-        packet_len = struct.unpack('>H', len_data)[0]
         
         # Read data and checksum
         data_and_checksum = self.serial_conn.read(packet_len)
         if len(data_and_checksum) != packet_len:
             return None, None
         
-        data = data_and_checksum[:-2]
+        # Callers only index into the payload, so hand back a view instead of copying it
+        data = memoryview(data_and_checksum)[:-2]
+        checksum = _U16.unpack_from(data_and_checksum, packet_len - 2)[0]
+        if not self._verify_checksum(packet_type, data, checksum):
+            print("Packet checksum mismatch (serial data corrupted)")
+            return None, None
         return packet_type, data
     
+    def _verify_checksum(self, packet_type, data, checksum):
+        """Check a received packet against its 16-bit checksum"""
+        return (packet_type + len(data) + 2 + _byte_sum(data)) & 0xFFFF == checksum
+    
+    def _wait_for_response(self, timeout):
+        """Wait until the sensor has sent something, without a blocking read (False on timeout)"""
+        if self.serial_conn.in_waiting:
+            return True
+        
+        # POSIX serial ports are file descriptors, so select() can sleep until data arrives
+        if os.name == 'posix':
+            readable, _, _ = select.select([self.serial_conn.fileno()], [], [], timeout)
+            return bool(readable)
+        
+        # Elsewhere (Windows) poll the driver's receive count
+        deadline = time.monotonic() + timeout
+        while not self.serial_conn.in_waiting:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+    
     def load_template_file(self, filename):
         """Load template data from .bin file"""
         try:
+            # Reuse the cached bytes while the file is unchanged on disk
+            stat = os.stat(filename)
+            cached = self._template_files.get(filename)
+            if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                return cached[2]
+            
             with open(filename, 'rb') as f:
                 template_data = f.read()
+            self._template_files[filename] = (stat.st_mtime_ns, stat.st_size, template_data)
             return template_data
         except FileNotFoundError:
             print(f"Template file not found: {filename}")
@@ -144,24 +262,44 @@ class R307RealTimeMatcher:
         if packet_type != self.FINGERPRINT_ACKPACKET or len(data) == 0 or data[0] != self.FINGERPRINT_OK:
             return False
         
-        # Send template data in packets
+        # Send all template data packets in one write, reusing the prebuilt stream for the stored template
+        if template_data is self._prebuilt_template or template_data == self._prebuilt_template:
+            stream = self._prebuilt_download_stream
+        else:
+            stream = self._frame_template(template_data)
+        self.serial_conn.write(stream)
+        
+        # Let the driver drain the whole batch once before the next command
+        self.serial_conn.flush()
+        return True
+    
+    def prepare_stored_template(self, template_data):
+        """Frame a template's data packets once so repeated downloads just write the prebuilt bytes"""
+        self._prebuilt_download_stream = self._frame_template(template_data)
+        self._prebuilt_template = template_data
+        self._prebuilt_crc = zlib.crc32(template_data)
+    
+    def _frame_template(self, template_data):
+        """Split template data into framed data packets, returned as one byte stream"""
         chunk_size = 128  # Typical data packet size
         data_sent = 0
+        stream = bytearray()
+        template_view = memoryview(template_data)  # Slicing a view doesn't copy
         
         while data_sent < len(template_data):
             chunk_end = min(data_sent + chunk_size, len(template_data))
-            chunk = template_data[data_sent:chunk_end]
+            chunk = template_view[data_sent:chunk_end]
             
             if chunk_end == len(template_data):
                 # Last packet - use end data packet type
-                self._write_packet(self.FINGERPRINT_ENDDATAPACKET, chunk)
+                stream += self._build_packet(self.FINGERPRINT_ENDDATAPACKET, chunk)
             else:
                 # Regular data packet
-                self._write_packet(self.FINGERPRINT_DATAPACKET, chunk)
+                stream += self._build_packet(self.FINGERPRINT_DATAPACKET, chunk)
             
             data_sent = chunk_end
         
-        return True
+        return bytes(stream)
     
     def get_image(self):
         """Capture fingerprint image from sensor"""
@@ -180,6 +318,17 @@ class R307RealTimeMatcher:
                 return False
         return False
     
+    def wait_for_finger(self, timeout=None, poll_interval=0.05, stop=None):
+        """Poll GET_IMAGE until a finger is captured (False if timeout passes or stop is set first)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.get_image():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            if stop is not None and stop.is_set():
+                return False
+            time.sleep(poll_interval)
+        return True
+    
     def image_2_template(self, buffer_id=2):
         """Convert captured image to template in specified buffer"""
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_IMG_2_TZ, buffer_id]))
@@ -221,12 +370,25 @@ class R307RealTimeMatcher:
         if not template_data:
             return False, 0
         
-        # Download stored template to buffer 1
-        if not self.download_template(template_data, buffer_id=1):
-            return False, 0
+        return self.match_live_with_bytes(template_data)
+    
+    def match_live_with_bytes(self, template_data, stop=None):
+        """Match live fingerprint capture with an already loaded template"""
+        # Download stored template to buffer 1, unless the sensor already holds it
+        # (capture and matching only write buffer 2, so buffer 1 survives between matches)
+        # The matching loop passes the prepared template every time, so its CRC is precomputed
+        if template_data is self._prebuilt_template:
+            template_crc = self._prebuilt_crc
+        else:
+            template_crc = zlib.crc32(template_data)
+        if template_crc != self._buffer1_loaded_crc:
+            self._buffer1_loaded_crc = None
+            if not self.download_template(template_data, buffer_id=1):
+                return False, 0
+            self._buffer1_loaded_crc = template_crc
         
-        # Capture live fingerprint
-        if not self.get_image():
+        # Capture live fingerprint (waits, sleeping between polls, until a finger is present)
+        if not self.wait_for_finger(stop=stop):
             return False, 0
         
         # Convert live image to template in buffer 2 (temporary, not stored)
@@ -236,8 +398,44 @@ class R307RealTimeMatcher:
         # Perform matching inside the sensor
         return self.match_templates()
 
-def main():
-    """Main function to perform real-time fingerprint matching"""
+def _match_continuously(matcher, template_data, stop, label="", fast_baud=False):
+    """Worker: connect one sensor and print its match results until stop is set"""
+    if not matcher.connect():
+        print(f"{label}Cannot proceed without sensor connection")
+        return
+    
+    try:
+        matcher.prepare_stored_template(template_data)
+        
+        # Opt-in: halve wire time for the template download and every command round trip
+        if fast_baud:
+            matcher.set_baud(FAST_BAUD_RATE)
+        
+        # Continuous matching loop; print on a change of result, otherwise at most once per second
+        last_state = None
+        last_print_time = 0.0
+        while not stop.is_set():
+            # Perform real-time matching
+            match_result, confidence = matcher.match_live_with_bytes(template_data, stop=stop)
+            if stop.is_set():
+                break
+            
+            now = time.monotonic()
+            if match_result != last_state or now - last_print_time >= 1.0:
+                if match_result:
+                    print(f"{label}MATCH - Confidence: {confidence}")
+                else:
+                    print(f"{label}NO MATCH")
+                last_state = match_result
+                last_print_time = now
+    finally:
+        # The sensor keeps its baud setting; restore the factory rate so scan.py can still connect
+        if matcher.serial_conn and matcher.serial_conn.is_open and matcher.baud_rate != R307_DEFAULT_BAUD:
+            matcher.set_baud(R307_DEFAULT_BAUD)
+        matcher.disconnect()
+
+def main(ports=None, fast_baud=None):
+    """Main function to perform real-time fingerprint matching on one or more sensors"""
     print("R307 Real-time Fingerprint Matcher")
     print("==================================")
     
@@ -247,35 +445,45 @@ def main():
         print("Please run scan.py first to create finger1.bin template.")
         return
     
-    # Create matcher instance
-    matcher = R307RealTimeMatcher(port='COM3')
+    # One matcher per sensor port (e.g. python real_time_match.py COM3 COM4 [--fast-baud])
+    args = sys.argv[1:]
+    if fast_baud is None:
+        fast_baud = '--fast-baud' in args
+    ports = ports or [arg for arg in args if not arg.startswith('--')] or ['COM3']
+    matchers = [R307RealTimeMatcher(port=port) for port in ports]
     
-    try:
-        # Connect to sensor
-        if not matcher.connect():
-            print("Cannot proceed without sensor connection")
-            return
-        
-        print("Place finger on sensor to start matching...")
-        print("Press Ctrl+C to exit")
-        print()
-        
-        # Continuous matching loop
-        while True:
-            # Perform real-time matching
-            match_result, confidence = matcher.match_live_with_stored('finger1.bin')
-            
-            if match_result:
-                print(f"MATCH - Confidence: {confidence}")
-            else:
-                print("NO MATCH")
+    # Load the stored template once; it doesn't change between matches
+    template_data = matchers[0].load_template_file('finger1.bin')
+    if not template_data:
+        return
     
+    print("Place finger on sensor to start matching...")
+    print("Press Ctrl+C to exit")
+    print()
+    
+    # Each sensor blocks on its own serial port, so they run in parallel threads
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(matchers))
+    futures = [
+        executor.submit(_match_continuously, matcher, template_data, stop,
+                        f"[{matcher.port}] " if len(matchers) > 1 else "", fast_baud)
+        for matcher in matchers
+    ]
+    
+    try:
+        # Wait in short slices so Ctrl+C is handled promptly on every platform
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5)
+            for future in done:
+                future.result()
     except KeyboardInterrupt:
         print("\nProgram stopped")
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        matcher.disconnect()
+        stop.set()
+        executor.shutdown(wait=True)
 
 if __name__ == "__main__":
     main()
@@ -12,8 +12,33 @@ import serial
 import time
 import struct
 import os
+import queue
+import tempfile
+import threading
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# R307 packet layout: start code, address, packet identifier, length (then data, 16-bit checksum);
+# pre-compiled once and shared by every packet read/write
+_HDR = struct.Struct('>HIBH')
+_U16 = struct.Struct('>H')
+
+# Seconds of menu idle time between keep-alive status checks on the serial link
+KEEPALIVE_INTERVAL = 5.0
+
+# Payloads longer than this are summed with NumPy; below it the call overhead outweighs the gain
+NUMPY_SUM_THRESHOLD = 32
+
+def _byte_sum(data):
+    """Sum of a payload's bytes (used for packet checksums)"""
+    if np is not None and len(data) > NUMPY_SUM_THRESHOLD:
+        return int(np.frombuffer(data, dtype=np.uint8).sum(dtype=np.uint64))
+    return sum(memoryview(data))
+
 class R307FingerprintSensor:
     """Interface for R307 fingerprint sensor communication"""
     
@@ -40,12 +65,25 @@ class R307FingerprintSensor:
     FINGERPRINT_ACKPACKET = 0x07
     FINGERPRINT_ENDDATAPACKET = 0x08
     
+    # Response code -> (message, success) for GET_IMAGE and IMG_2_TZ
+    _GET_IMAGE_MESSAGES = {
+        FINGERPRINT_OK: ("Fingerprint image captured successfully", True),
+        FINGERPRINT_NOFINGER: ("No finger detected on sensor", False),
+        FINGERPRINT_IMAGEFAIL: ("Failed to capture clear image", False),
+    }
+    _IMAGE_2_TZ_MESSAGES = {
+        FINGERPRINT_OK: ("Template generated in buffer {buffer_id}", True),
+        FINGERPRINT_IMAGEMESS: ("Image too messy to generate template", False),
+        FINGERPRINT_FEATUREFAIL: ("Could not identify fingerprint features", False),
+    }
+    
     def __init__(self, port='COM3', baud_rate=57600, address=0xFFFFFFFF):
         """Initialize connection to R307 sensor"""
         self.port = port
         self.baud_rate = baud_rate
         self.address = address
         self.serial_conn = None
+        self._rx = bytearray()  # Bytes read from the port but not yet parsed into packets
         
     def connect(self):
         """Establish serial connection to sensor"""
@@ -58,6 +96,7 @@ class R307FingerprintSensor:
                 stopbits=serial.STOPBITS_ONE,
                 timeout=2
             )
+            self._rx.clear()
             print(f"Connected to R307 sensor on {self.port}")
             return True
         except serial.SerialException as e:
@@ -72,54 +111,64 @@ class R307FingerprintSensor:
     
     def _write_packet(self, packet_type, data):
         """Write packet to sensor with proper header and checksum"""
-        packet = struct.pack('>H', self.FINGERPRINT_STARTCODE)
-        packet += struct.pack('>I', self.address)
-        packet += struct.pack('>B', packet_type)
-        packet += struct.pack('>H', len(data) + 2)
-        packet += data
+        data_len = len(data)
+        packet = bytearray(_HDR.size + data_len + _U16.size)
+        _HDR.pack_into(packet, 0, self.FINGERPRINT_STARTCODE, self.address, packet_type, data_len + 2)
+        packet[_HDR.size:_HDR.size + data_len] = data
         
-        # Calculate checksum
-        checksum = packet_type + len(data) + 2 + sum(data)
-        packet += struct.pack('>H', checksum)
+        # Calculate checksum (low 16 bits)
+        checksum = (packet_type + data_len + 2 + _byte_sum(data)) & 0xFFFF
+        _U16.pack_into(packet, _HDR.size + data_len, checksum)
         
         self.serial_conn.write(packet)
         
     def _read_packet(self):
         """Read response packet from sensor"""
-        # Read header
-        header = self.serial_conn.read(2)
-        if len(header) != 2:
-            return None, None
-            
-        start_code = struct.unpack('>H', header)[0]
-        if start_code != self.FINGERPRINT_STARTCODE:
+        # Parse the fixed header (start code, address, identifier, length) from the receive buffer
+        header_size = _HDR.size
+        if not self._fill_rx(header_size):
+            self._rx.clear()
             return None, None
         
-        # Read address
-        addr_data = self.serial_conn.read(4)
-        if len(addr_data) != 4:
+        start_code, _, packet_type, packet_len = _HDR.unpack_from(self._rx)
+        if start_code != self.FINGERPRINT_STARTCODE:
+            self._rx.clear()
             return None, None
         
-        # Read packet identifier
-        pid_data = self.serial_conn.read(1)
-        if len(pid_data) != 1:
+        # Data and checksum follow the header
+        packet_end = header_size + packet_len
+        if not self._fill_rx(packet_end):
+            self._rx.clear()
             return None, None
-        packet_type = struct.unpack('>B', pid_data)[0]
         
-        # Read length
-        len_data = self.serial_conn.read(2)
-        if len(len_data) != 2:
-            return None, None
-        packet_len = struct.unpack('>H', len_data)[0]
+        data = bytes(self._rx[header_size:packet_end - 2])
+        checksum = _U16.unpack_from(self._rx, packet_end - 2)[0]
+        del self._rx[:packet_end]
         
-        # Read data and checksum
-        data_and_checksum = self.serial_conn.read(packet_len)
-        if len(data_and_checksum) != packet_len:
+        if not self._verify_checksum(packet_type, data, checksum):
+            print("Packet checksum mismatch (serial data corrupted)")
             return None, None
-        
-        data = data_and_checksum[:-2]
         return packet_type, data
     
+    def _verify_checksum(self, packet_type, data, checksum):
+        """Check a received packet against its 16-bit checksum"""
+        return (packet_type + len(data) + 2 + _byte_sum(data)) & 0xFFFF == checksum
+    
+    def _fill_rx(self, size):
+        """Buffer at least size bytes, draining whatever else the port already holds (False on timeout)"""
+        while len(self._rx) < size:
+            chunk = self.serial_conn.read(max(size - len(self._rx), self.serial_conn.in_waiting))
+            if not chunk:
+                return False
+            self._rx += chunk
+        return True
+    
+    def keep_alive(self):
+        """Cheap status query (template count) so the serial link doesn't go cold between scans"""
+        self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_TEMPLATE_NUM]))
+        packet_type, data = self._read_packet()
+        return packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0 and data[0] == self.FINGERPRINT_OK
+    
     def get_image(self):
         """Capture fingerprint image from sensor"""
         print("Place finger on sensor...")
@@ -128,18 +177,10 @@ class R307FingerprintSensor:
         packet_type, data = self._read_packet()
         if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
             response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                print("Fingerprint image captured successfully")
-                return True
-            elif response_code == self.FINGERPRINT_NOFINGER:
-                print("No finger detected on sensor")
-                return False
-            elif response_code == self.FINGERPRINT_IMAGEFAIL:
-                print("Failed to capture clear image")
-                return False
-            else:
-                print(f"Image capture failed with code: {response_code}")
-                return False
+            message, ok = self._GET_IMAGE_MESSAGES.get(
+                response_code, (f"Image capture failed with code: {response_code}", False))
+            print(message)
+            return ok
         return False
     
     def image_2_template(self, buffer_id=1):
@@ -149,22 +190,18 @@ class R307FingerprintSensor:
         packet_type, data = self._read_packet()
         if packet_type == self.FINGERPRINT_ACKPACKET and len(data) > 0:
             response_code = data[0]
-            if response_code == self.FINGERPRINT_OK:
-                print(f"Template generated in buffer {buffer_id}")
-                return True
-            elif response_code == self.FINGERPRINT_IMAGEMESS:
-                print("Image too messy to generate template")
-                return False
-            elif response_code == self.FINGERPRINT_FEATUREFAIL:
-                print("Could not identify fingerprint features")
-                return False
-            else:
-                print(f"Template generation failed with code: {response_code}")
-                return False
+            message, ok = self._IMAGE_2_TZ_MESSAGES.get(
+                response_code, (f"Template generation failed with code: {response_code}", False))
+            print(message.format(buffer_id=buffer_id))
+            return ok
         return False
     
-    def upload_template(self, buffer_id=1):
-        """Upload template from sensor buffer to computer"""
+    def upload_template(self, buffer_id=1, sink=None):
+        """Upload template from sensor buffer to computer
+        
+        With a sink (any object with write()), each data packet is written straight to it
+        and the number of bytes written is returned instead of the template bytes.
+        """
         print(f"Uploading template from buffer {buffer_id}...")
         self._write_packet(self.FINGERPRINT_COMMANDPACKET, bytes([self.CMD_UP_CHAR, buffer_id]))
         
@@ -175,20 +212,26 @@ class R307FingerprintSensor:
             return None
         
         # Read template data packets
-        template_data = b''
+        chunks = []
+        total_length = 0
         while True:
             packet_type, data = self._read_packet()
-            if packet_type == self.FINGERPRINT_DATAPACKET:
-                template_data += data
-            elif packet_type == self.FINGERPRINT_ENDDATAPACKET:
-                template_data += data
-                break
+            if packet_type in (self.FINGERPRINT_DATAPACKET, self.FINGERPRINT_ENDDATAPACKET):
+                if sink is not None:
+                    sink.write(data)
+                else:
+                    chunks.append(data)
+                total_length += len(data)
+                if packet_type == self.FINGERPRINT_ENDDATAPACKET:
+                    break
             else:
                 print("Unexpected packet type during template upload")
                 return None
         
-        print(f"Template uploaded successfully ({len(template_data)} bytes)")
-        return template_data
+        print(f"Template uploaded successfully ({total_length} bytes)")
+        if sink is not None:
+            return total_length
+        return b''.join(chunks)
     
     def scan_and_store_template(self, filename=None):
         """Complete workflow: scan finger, generate template, and store to file"""
@@ -203,12 +246,16 @@ class R307FingerprintSensor:
         print("=== Fingerprint Template Capture ===")
         
         # Step 1: Capture image
-        max_attempts = 10
+        # Poll quickly at first so an already-placed finger is caught at once, backing off to 200 ms
+        # (30 attempts keep roughly the old 5 s window for placing the finger)
+        max_attempts = 30
+        delay = 0.03
         for attempt in range(max_attempts):
             print(f"Attempt {attempt + 1}/{max_attempts}")
             if self.get_image():
                 break
-            time.sleep(0.5)
+            time.sleep(delay)
+            delay = min(delay * 1.5, 0.2)
         else:
             print("Failed to capture fingerprint image after multiple attempts")
             return False
@@ -218,22 +265,57 @@ class R307FingerprintSensor:
             print("Failed to generate template from image")
             return False
         
-        # Step 3: Upload template
-        template_data = self.upload_template(buffer_id=1)
-        if not template_data:
-            print("Failed to upload template")
-            return False
-        
-        # Step 4: Save to file
+        # Step 3 & 4: Upload template, streaming each packet straight into a temp file
+        # (unbuffered: each packet is one write() syscall, no BufferedWriter in between).
+        # The temp file only replaces filename once the upload succeeded, so a failed
+        # re-scan keeps the previous template.
+        temp_path = None
         try:
-            with open(filename, 'wb') as f:
-                f.write(template_data)
-            print(f"Template saved to: {filename}")
-            print(f"File size: {len(template_data)} bytes")
-            return True
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                             prefix=os.path.basename(filename) + '.', suffix='.tmp')
+            with os.fdopen(fd, 'wb', buffering=0) as f:
+                template_length = self.upload_template(buffer_id=1, sink=f)
+            if template_length:
+                os.replace(temp_path, filename)
+                temp_path = None
         except Exception as e:
             print(f"Failed to save template to file: {e}")
+            template_length = None
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        if not template_length:
+            print("Failed to upload template")
             return False
+        
+        print(f"Template saved to: {filename}")
+        print(f"File size: {template_length} bytes")
+        return True
+
+def _read_menu_commands(commands, menu_ready):
+    """UI thread: show the menu, read a choice (and filename) and queue it for the main thread"""
+    while True:
+        # Don't prompt again until the previous command has finished printing
+        menu_ready.wait()
+        menu_ready.clear()
+        
+        print("\nOptions:")
+        print("1. Scan and save new fingerprint template")
+        print("2. Scan with custom filename")
+        print("3. Exit")
+        
+        try:
+            choice = input("\nEnter your choice (1-3): ").strip()
+            filename = None
+            if choice == '2':
+                filename = input("Enter filename for template (without .bin extension): ").strip()
+        except EOFError:
+            choice, filename = '3', None
+        
+        commands.put((choice, filename))
+        if choice == '3':
+            return
 
 def main():
     """Main function to demonstrate fingerprint scanning and storage"""
@@ -253,13 +335,19 @@ def main():
         print("This program will scan your fingerprint and save the template locally.")
         print("The template will NOT be stored on the sensor.")
         
+        # Menu input runs on its own thread; the main thread owns the sensor and keeps the link warm while idle
+        commands = queue.Queue()
+        menu_ready = threading.Event()
+        menu_ready.set()
+        threading.Thread(target=_read_menu_commands, args=(commands, menu_ready), daemon=True).start()
+        
         while True:
-            print("\nOptions:")
-            print("1. Scan and save new fingerprint template")
-            print("2. Scan with custom filename")
-            print("3. Exit")
-            
-            choice = input("\nEnter your choice (1-3): ").strip()
+            try:
+                choice, filename = commands.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                if not sensor.keep_alive():
+                    print("\n[WARNING] Sensor did not answer the keep-alive check")
+                continue
             
             if choice == '1':
                 print("\n--- Starting fingerprint scan ---")
@@ -269,7 +357,6 @@ def main():
                     print("✗ Failed to capture and save template")
                     
             elif choice == '2':
-                filename = input("Enter filename for template (without .bin extension): ").strip()
                 if filename:
                     print(f"\n--- Starting fingerprint scan for '{filename}' ---")
                     if sensor.scan_and_store_template(filename):
@@ -285,6 +372,8 @@ def main():
                 
             else:
                 print("Invalid choice. Please enter 1, 2, or 3.")
+            
+            menu_ready.set()
     
     except KeyboardInterrupt:
         print("\n\nProgram interrupted by user")